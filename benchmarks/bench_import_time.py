@@ -0,0 +1,146 @@
+"""
+CLI启动耗时基准（基于 python -X importtime）
+
+用法:
+    python -m benchmarks.bench_import_time [--max-ms 150] [--module main]
+
+检查两项内容，任意一项不满足时以非零状态码退出，可直接用于CI防回退：
+1. 导入入口模块的累计耗时不超过阈值
+2. 仅模板模式生成测试时不会加载网络相关的重型依赖
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 仅模板模式下不允许出现的重型模块
+FORBIDDEN_MODULES = ('openai', 'requests', 'pydantic_settings', 'pydantic', 'httpx')
+
+# 仅模板模式的端到端脚本：生成一个测试模板后输出已加载的受限模块
+TEMPLATE_ONLY_SCRIPT = """
+import sys
+from generator import TestTemplateGenerator
+result = TestTemplateGenerator().generate_test_case(sys.argv[1], 'GetUser', use_llm=False)
+assert result['status'] == 'success', result
+loaded = sorted(m for m in sys.modules if m.split('.')[0] in {forbidden!r})
+print(','.join(loaded))
+"""
+
+SAMPLE_GO_CODE = """package user
+
+// @apitags user
+func GetUser(ctx context.Context, args *service.Args, reply *service.Replies) error {
+    return nil
+}
+"""
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """
+    解析 -X importtime 输出
+    :param stderr: 子进程标准错误输出
+    :return: 模块名到(自身耗时us, 累计耗时us)的映射
+    """
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            continue
+        timings[parts[2].strip()] = (self_us, cumulative_us)
+    return timings
+
+
+def measure_import(module: str, repeat: int = 3) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+    """
+    多次测量模块导入耗时，取最小值以降低噪声
+    :param module: 模块名
+    :param repeat: 重复次数
+    :return: (最小累计耗时us, 对应的完整耗时表)
+    """
+    best_us = None
+    best_timings = {}
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"导入{module}失败:\n{proc.stderr}")
+        timings = parse_importtime(proc.stderr)
+        total_us = timings.get(module, (0, 0))[1]
+        if best_us is None or total_us < best_us:
+            best_us = total_us
+            best_timings = timings
+    return best_us, best_timings
+
+
+def check_template_only_path() -> List[str]:
+    """
+    在子进程中跑一次仅模板模式，返回被加载的受限模块
+    :return: 受限模块列表
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pkg_dir = os.path.join(tmp_dir, 'user')
+        os.makedirs(pkg_dir)
+        go_file = os.path.join(pkg_dir, 'user.go')
+        with open(go_file, 'w', encoding='utf-8') as f:
+            f.write(SAMPLE_GO_CODE)
+        proc = subprocess.run(
+            [sys.executable, '-c', TEMPLATE_ONLY_SCRIPT.format(forbidden=FORBIDDEN_MODULES), go_file],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"仅模板模式执行失败:\n{proc.stderr}")
+        output = proc.stdout.strip().splitlines()
+        return [m for m in (output[-1].split(',') if output else []) if m]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='CLI启动耗时基准')
+    parser.add_argument('--module', type=str, default='main', help='要测量的入口模块')
+    parser.add_argument('--max-ms', type=float, default=150.0, help='累计导入耗时阈值（毫秒）')
+    parser.add_argument('--repeat', type=int, default=3, help='重复测量次数')
+    parser.add_argument('--top', type=int, default=10, help='打印累计耗时最高的模块数')
+    args = parser.parse_args()
+
+    total_us, timings = measure_import(args.module, args.repeat)
+    print(f"导入 {args.module} 累计耗时: {total_us / 1000:.1f}ms (阈值 {args.max_ms:.0f}ms)")
+    for name, (self_us, cumulative_us) in sorted(timings.items(), key=lambda kv: kv[1][1], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f}ms  {self_us / 1000:8.1f}ms  {name}")
+
+    failed = False
+    eager = sorted(m for m in timings if m.split('.')[0] in FORBIDDEN_MODULES)
+    if eager:
+        print(f"导入 {args.module} 时加载了重型模块: {', '.join(eager)}")
+        failed = True
+    if total_us / 1000 > args.max_ms:
+        print("导入耗时超过阈值")
+        failed = True
+
+    loaded = check_template_only_path()
+    if loaded:
+        print(f"仅模板模式加载了重型模块: {', '.join(loaded)}")
+        failed = True
+    else:
+        print("仅模板模式未加载任何网络相关模块")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
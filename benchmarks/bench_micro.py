@@ -0,0 +1,103 @@
+"""
+核心函数微基准
+
+覆盖 GoCodeAnalyzer.analyze_code、_merge_imports、_save_test_file 与 _clean_generated_code。
+
+用法:
+    python -m benchmarks.bench_micro [--handlers 200] [--repeat 5] [--out micro.json]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import time_callable, write_results
+from benchmarks.go_corpus import FILE_HEADER, render_handler
+from code_analyzer import GoCodeAnalyzer
+from generator import TestTemplateGenerator
+
+
+def build_source(handlers: int, body_lines: int, comment_density: float, seed: int = 42) -> str:
+    rng = random.Random(seed)
+    parts = [FILE_HEADER.format(package='bench')]
+    for i in range(handlers):
+        parts.append(render_handler(rng, f"Handler{i:04d}", 'Order', body_lines, comment_density))
+    return "\n\n".join(parts) + "\n"
+
+
+def build_llm_response(template: str, prose_lines: int = 20) -> str:
+    prose = "\n".join(f"说明第{i}行：根据函数逻辑补充了参数。" for i in range(prose_lines))
+    return f"{prose}\n```go\n{template}\n```\n主要变更: 补充失败用例\n测试执行命令:\n```bash\ngo test -run TestX\n```"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='核心函数微基准')
+    parser.add_argument('--handlers', type=int, default=200, help='被分析文件中的handler数')
+    parser.add_argument('--body-lines', type=int, default=40, help='每个handler的业务逻辑行数')
+    parser.add_argument('--comment-density', type=float, default=0.3, help='注释密度')
+    parser.add_argument('--tests', type=int, default=50, help='合并/保存时已存在的测试函数数')
+    parser.add_argument('--repeat', type=int, default=5, help='计时轮数')
+    parser.add_argument('--out', type=str, help='结果文件路径')
+    args = parser.parse_args()
+    if args.tests < 0 or args.tests >= args.handlers:
+        # 已有测试取前--tests个handler，还需要一个handler作为新生成的测试
+        parser.error(f"--tests必须在0到--handlers-1之间（当前--handlers {args.handlers}, --tests {args.tests}）")
+
+    analyzer = GoCodeAnalyzer()
+    generator = TestTemplateGenerator()
+    source = build_source(args.handlers, args.body_lines, args.comment_density)
+    functions = analyzer.analyze_code(source, 'bench/handler.go')
+    templates = [generator.generate_test_case_template(func) for func in functions[:args.tests + 1]]
+
+    existing = generator._generate_test_main('bench')
+    for template in templates[:-1]:
+        existing = generator._merge_imports(existing, template)
+    new_template = templates[-1]
+    llm_response = build_llm_response(new_template)
+
+    results = {}
+    results['analyze_code'] = time_callable(lambda: analyzer.analyze_code(source, 'bench/handler.go'), args.repeat)
+    results['merge_imports'] = time_callable(lambda: generator._merge_imports(existing, new_template), args.repeat, 20)
+    results['clean_generated_code'] = time_callable(lambda: generator._clean_generated_code(llm_response), args.repeat, 50)
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_micro_')
+    try:
+        package_dir = os.path.join(tmp_dir, 'bench')
+        os.makedirs(package_dir)
+        test_file_path = os.path.join(package_dir, 'handler_test.go')
+        new_function = functions[args.tests]['name']
+
+        def save_new_file():
+            if os.path.exists(test_file_path):
+                os.remove(test_file_path)
+            generator._save_test_file(test_file_path, new_template, new_function)
+
+        def save_update():
+            with open(test_file_path, 'w', encoding='utf-8') as f:
+                f.write(existing)
+            generator._save_test_file(test_file_path, new_template, new_function, mode="update")
+
+        results['save_test_file_new'] = time_callable(save_new_file, args.repeat, 20)
+        results['save_test_file_update'] = time_callable(save_update, args.repeat, 20)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    results['analyze_code_bytes_per_sec'] = len(source.encode('utf-8')) / results['analyze_code']['median']
+
+    print(f"源码 {len(source) / 1024:.1f}KB, {len(functions)} 个函数, 已有测试 {args.tests} 个")
+    for name, value in results.items():
+        if isinstance(value, dict):
+            print(f"{name:32s} median {value['median'] * 1000:10.3f}ms  min {value['min'] * 1000:10.3f}ms")
+        else:
+            print(f"{name:32s} {value:14.1f}")
+
+    if args.out:
+        write_results(args.out, 'micro', vars(args) | {'out': None}, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+端到端流水线吞吐基准
+
+在合成语料上分别测量：
+1. 仅模板批量模式（generate_templates_for_directory）的函数吞吐
+2. 启用LLM的单函数流水线（generate_test_case），LLM由进程内模拟后端提供
+
+用法:
+    python -m benchmarks.bench_pipeline [--packages 5] [--llm-functions 20] [--ttft 0.05] [--out pipeline.json]
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import write_results
+from benchmarks.go_corpus import generate_corpus
+from benchmarks.mock_llm import MockLLMBackend
+from core.metrics import metrics
+from generator import TestTemplateGenerator
+
+
+def bench_template_only(corpus_args: dict, workers: int) -> dict:
+    tmp_dir = tempfile.mkdtemp(prefix='bench_corpus_')
+    try:
+        stats = generate_corpus(tmp_dir, **corpus_args)
+        generator = TestTemplateGenerator()
+        start = time.perf_counter()
+        results = generator.generate_templates_for_directory(tmp_dir, workers=workers)
+        elapsed = time.perf_counter() - start
+        return {
+            'template_only_seconds': elapsed,
+            'template_only_functions_per_sec': len(results) / elapsed,
+            'corpus_bytes': stats['bytes'],
+        }
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def bench_llm_pipeline(corpus_args: dict, functions: int, ttft: float, chars_per_second: float, run_go_test: bool) -> dict:
+    from core.config import settings
+    # 模拟后端无需限流，避免共享令牌桶影响测量
+    settings.llm_rate_limit_enabled = False
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_corpus_')
+    try:
+        generate_corpus(tmp_dir, **corpus_args)
+        generator = TestTemplateGenerator()
+        backend = MockLLMBackend(ttft=ttft, chars_per_second=chars_per_second)
+        generator.llm_client._siliconflow_client = backend
+        generator.llm_client._openai_client = None
+        if not run_go_test:
+            # 合成语料依赖的内部包不存在，默认跳过go test只测量Python侧与LLM等待
+            generator._run_go_test = lambda test_dir, function_name: {'success': True, 'output': 'PASS', 'returncode': 0}
+
+        targets = generator.code_analyzer.analyze_directory(tmp_dir, workers=1)[:functions]
+        start = time.perf_counter()
+        statuses = [generator.generate_test_case(func['file_path'], func['name'], True)['status'] for func in targets]
+        elapsed = time.perf_counter() - start
+        stages = metrics.summary()['stages']
+        return {
+            'llm_pipeline_seconds': elapsed,
+            'llm_pipeline_functions_per_sec': len(targets) / elapsed,
+            'llm_calls': backend.calls,
+            'llm_pipeline_success': statuses.count('success'),
+            'llm_stage_p50': stages.get('llm', {}).get('p50', 0.0),
+            'save_stage_p50': stages.get('save', {}).get('p50', 0.0),
+        }
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='端到端流水线吞吐基准')
+    parser.add_argument('--packages', type=int, default=5, help='包数量')
+    parser.add_argument('--files', type=int, default=4, help='每个包的文件数')
+    parser.add_argument('--handlers', type=int, default=6, help='每个文件的handler数')
+    parser.add_argument('--body-lines', type=int, default=30, help='每个handler的业务逻辑行数')
+    parser.add_argument('--comment-density', type=float, default=0.3, help='注释密度')
+    parser.add_argument('--workers', type=int, help='仅模板模式的并行分析进程数')
+    parser.add_argument('--llm-functions', type=int, default=20, help='LLM流水线处理的函数数，为0时跳过')
+    parser.add_argument('--ttft', type=float, default=0.0, help='模拟LLM的首token延迟（秒）')
+    parser.add_argument('--chars-per-second', type=float, default=1e9, help='模拟LLM的输出速率（字符/秒）')
+    parser.add_argument('--go-test', action='store_true', help='真实执行go test（默认跳过）')
+    parser.add_argument('--out', type=str, help='结果文件路径')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    corpus_args = {
+        'packages': args.packages,
+        'files': args.files,
+        'handlers': args.handlers,
+        'body_lines': args.body_lines,
+        'comment_density': args.comment_density,
+    }
+    results = bench_template_only(corpus_args, args.workers)
+    if args.llm_functions:
+        results.update(bench_llm_pipeline(corpus_args, args.llm_functions, args.ttft, args.chars_per_second, args.go_test))
+
+    for name, value in results.items():
+        print(f"{name:36s} {value:14.4f}")
+
+    if args.out:
+        write_results(args.out, 'pipeline', vars(args) | {'out': None}, results)
+
+
+if __name__ == '__main__':
+    main()
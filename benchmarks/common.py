@@ -0,0 +1,67 @@
+"""
+基准测试公共工具：计时、运行环境信息与结果文件读写
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from typing import Any, Callable, Dict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_callable(func: Callable[[], Any], repeat: int = 5, number: int = 1) -> Dict[str, float]:
+    """
+    多轮计时，每轮执行number次
+    :param func: 被测函数
+    :param repeat: 轮数
+    :param number: 每轮执行次数
+    :return: 单次执行耗时的最小值、中位数与最大值（秒）
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {'min': min(samples), 'median': statistics.median(samples), 'max': max(samples)}
+
+
+def environment() -> Dict[str, Any]:
+    """
+    收集运行环境信息，用于判断两次结果是否可比
+    :return: 提交、Python版本、平台与CPU信息
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.time(),
+    }
+
+
+def write_results(path: str, suite: str, params: Dict[str, Any], results: Dict[str, Any]) -> None:
+    """
+    写出基准结果
+    :param path: 结果文件路径
+    :param suite: 基准套件名
+    :param params: 基准参数，参数不同的结果不应直接比较
+    :param results: 指标名到数值或计时字典的映射
+    """
+    payload = {'suite': suite, 'environment': environment(), 'params': params, 'results': results}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入: {path}")
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,70 @@
+"""
+比较两次基准结果
+
+用法:
+    python -m benchmarks.compare base.json head.json [--threshold 10]
+
+计时类指标（time_callable的结果或名称以_seconds、_p50、_p95结尾）取中位数比较、越小越好，
+吞吐类指标（名称以_per_sec结尾）越大越好；调用次数、成功数、语料大小等计数类指标只显示不判定。
+任一计时或吞吐指标退化超过阈值百分比时以非零状态码退出。
+"""
+import argparse
+import sys
+
+from benchmarks.common import load_results
+
+
+def _value(metric):
+    return metric['median'] if isinstance(metric, dict) else metric
+
+
+# 越小越好的计时类指标名后缀
+_TIMING_SUFFIXES = ('_seconds', '_p50', '_p95')
+
+
+def _direction(name, metric):
+    """
+    :return: 1表示越小越好，-1表示越大越好，None表示计数类指标，不判定退化
+    """
+    if name.endswith('_per_sec'):
+        return -1
+    if isinstance(metric, dict) or name.endswith(_TIMING_SUFFIXES):
+        return 1
+    return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='比较两次基准结果')
+    parser.add_argument('base', type=str, help='基准结果文件')
+    parser.add_argument('head', type=str, help='待比较结果文件')
+    parser.add_argument('--threshold', type=float, default=10.0, help='判定退化的百分比阈值')
+    args = parser.parse_args()
+
+    base = load_results(args.base)
+    head = load_results(args.head)
+    if base['suite'] != head['suite']:
+        print(f"套件不同，无法比较: {base['suite']} vs {head['suite']}")
+        return 2
+    if base['params'] != head['params']:
+        print("警告: 两次运行的参数不同，结果仅供参考")
+
+    print(f"{base['environment']['commit'] or 'base'} -> {head['environment']['commit'] or 'head'}")
+    regressed = False
+    for name, base_metric in base['results'].items():
+        if name not in head['results']:
+            continue
+        old, new = _value(base_metric), _value(head['results'][name])
+        if not old:
+            continue
+        change = (new - old) / old * 100
+        direction = _direction(name, base_metric)
+        flag = '' if direction is not None else '  (计数，不判定)'
+        if direction is not None and change * direction > args.threshold:
+            flag = '  <-- 退化'
+            regressed = True
+        print(f"{name:40s} {old:14.6f} {new:14.6f} {change:+8.1f}%{flag}")
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
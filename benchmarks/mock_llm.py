@@ -0,0 +1,74 @@
+"""
+进程内的模拟LLM后端
+
+实现LLMClient用到的 chat.completions.with_raw_response.create(stream=...) 接口子集，
+按固定的首token延迟与输出速率返回确定性的响应，用于在不消耗真实额度的情况下测量流水线吞吐。
+响应内容与 llm_utils.mock_server 一致；需要错误注入或跨进程压测时使用该HTTP模拟服务。
+"""
+import time
+from types import SimpleNamespace
+from typing import Iterator, List, Optional
+
+from llm_utils.mock_server import default_response
+
+
+def _chunk(content: Optional[str] = None, usage: Optional[SimpleNamespace] = None) -> SimpleNamespace:
+    choices = [] if content is None else [SimpleNamespace(delta=SimpleNamespace(content=content, reasoning_content=None))]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class _RawResponse:
+    def __init__(self, parsed):
+        self.headers = {}
+        self._parsed = parsed
+
+    def parse(self):
+        return self._parsed
+
+
+class _Completions:
+    def __init__(self, backend: "MockLLMBackend"):
+        self._backend = backend
+        self.with_raw_response = self
+
+    def create(self, model: str, messages: List[dict], stream: bool = False, **kwargs):
+        prompt = messages[-1]["content"]
+        self._backend.calls += 1
+        text = default_response(prompt)
+        if stream:
+            return _RawResponse(self._backend.stream(prompt, text))
+        time.sleep(self._backend.ttft + len(text) / self._backend.chars_per_second)
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 3, completion_tokens=len(text) // 3,
+                                total_tokens=(len(prompt) + len(text)) // 3)
+        message = SimpleNamespace(content=text)
+        return _RawResponse(SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage))
+
+
+class MockLLMBackend:
+    """
+    模拟OpenAI客户端，可直接赋值给LLMClient的_siliconflow_client或_openai_client
+    """
+
+    def __init__(self, ttft: float = 0.0, chars_per_second: float = 1e9, chunk_chars: int = 64):
+        """
+        :param ttft: 首token延迟（秒）
+        :param chars_per_second: 输出速率（字符/秒）
+        :param chunk_chars: 每个流式数据块的字符数
+        """
+        self.ttft = ttft
+        self.chars_per_second = chars_per_second
+        self.chunk_chars = chunk_chars
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def stream(self, prompt: str, text: str) -> Iterator[SimpleNamespace]:
+        if self.ttft:
+            time.sleep(self.ttft)
+        for i in range(0, len(text), self.chunk_chars):
+            piece = text[i:i + self.chunk_chars]
+            if self.chars_per_second < 1e9:
+                time.sleep(len(piece) / self.chars_per_second)
+            yield _chunk(piece)
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 3, completion_tokens=len(text) // 3,
+                                total_tokens=(len(prompt) + len(text)) // 3)
+        yield _chunk(usage=usage)
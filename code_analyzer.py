@@ -1,17 +1,282 @@
 import os
 import re
 import logging
-from typing import List, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+# 文件数少于该值时串行分析，避免进程池启动开销
+PARALLEL_ANALYZE_MIN_FILES = 16
+# 按修改时间缓存的文件索引数
+SYMBOL_INDEX_CACHE_SIZE = 64
+
+GO_KEYWORDS = frozenset((
+    'break', 'case', 'chan', 'const', 'continue', 'default', 'defer', 'else', 'fallthrough', 'for', 'func',
+    'go', 'goto', 'if', 'import', 'interface', 'map', 'package', 'range', 'return', 'select', 'struct',
+    'switch', 'type', 'var',
+))
+
+# Go词法单元，按顺序尝试匹配；块注释与原始字符串可以跨行
+_GO_TOKEN_PATTERN = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:\\.|[^"\\\n])*"|`[^`]*`)
+  | (?P<rune>'(?:\\.|[^'\\\n])+')
+  | (?P<number>\.?[0-9](?:[eEpP][+-]|[0-9a-zA-Z_.])*)
+  | (?P<ident>[^\W\d]\w*)
+  | (?P<newline>\n)
+  | (?P<space>[ \t\r\f\v]+)
+  | (?P<op>\.\.\.|<<=|>>=|&\^=|&&|\|\||<-|\+\+|--|==|!=|<=|>=|:=|<<|>>|&\^|[-+*/%&|^]=|[-+*/%&|^<>=!.,;:(){}\[\]~])
+  | (?P<error>.)
+''', re.VERBOSE | re.DOTALL)
+
+
+def tokenize_go(code: str, keep_space: bool = False) -> List[Tuple[str, str, int]]:
+    """
+    将Go源码切分为词法单元
+    :param code: Go源码
+    :param keep_space: 是否保留空白与换行
+    :return: (类别, 文本, 起始偏移)列表，类别为comment、string、rune、number、ident、keyword、op、newline、space、error之一
+    """
+    tokens = []
+    for match in _GO_TOKEN_PATTERN.finditer(code):
+        kind = match.lastgroup
+        text = match.group()
+        if kind in ('space', 'newline') and not keep_space:
+            continue
+        if kind == 'ident' and text in GO_KEYWORDS:
+            kind = 'keyword'
+        tokens.append((kind, text, match.start()))
+    return tokens
+
+
+# 顶层函数/方法声明的起始行，gofmt格式的代码中顶层声明总是从行首开始
+_FUNC_DECL_PATTERN = re.compile(r'^func\b', re.MULTILINE)
+
+
+def _matching_close(code: str, open_pos: int) -> int:
+    """
+    按词法单元查找与code[open_pos]处的左括号匹配的右括号，忽略字符串、字符与注释中的括号
+    :return: 右括号的偏移，未找到返回-1
+    """
+    depth = 0
+    for match in _GO_TOKEN_PATTERN.finditer(code, open_pos):
+        text = match.group()
+        if match.lastgroup != 'op':
+            continue
+        if text in '([{':
+            depth += 1
+        elif text in ')]}':
+            depth -= 1
+            if depth == 0:
+                return match.start()
+    return -1
+
+
+def _receiver_type(receiver: str) -> str:
+    """
+    :param receiver: 接收者声明，如"s *Service"、"Service"、"c *Cache[K, V]"
+    :return: 接收者类型名，如Service、Cache
+    """
+    receiver = receiver.split('[', 1)[0].strip()
+    return receiver.split()[-1].lstrip('*') if receiver else ''
+
+
+def _doc_comment(code: str, start: int) -> str:
+    """
+    :param start: 声明所在行的起始偏移
+    :return: 紧挨声明之前的文档注释（连续的//注释行或一个块注释），没有时返回空字符串
+    """
+    lines = []
+    end = start
+    while end > 0:
+        line_start = code.rfind('\n', 0, end - 1) + 1
+        line = code[line_start:end].strip()
+        if line.startswith('//'):
+            lines.append(line)
+            end = line_start
+            continue
+        if not lines and line.endswith('*/'):
+            open_pos = code.rfind('/*', 0, end)
+            if open_pos != -1:
+                return code[open_pos:end].strip()
+        break
+    return '\n'.join(reversed(lines))
+
+
+def parse_func_header(code: str, pos: int) -> Optional[Dict[str, Any]]:
+    """
+    解析从pos处func关键字开始的声明头，不读取函数体
+    :param code: Go源码
+    :param pos: func关键字的偏移
+    :return: 包含name、receiver、key、params、return_type、start与body_start（函数体{的偏移）的字典；
+             不是合法的声明头或没有函数体（如汇编实现）时返回None
+    """
+    tokens = _GO_TOKEN_PATTERN.finditer(code, pos + len('func'))
+
+    def next_token():
+        for match in tokens:
+            if match.lastgroup not in ('space', 'comment', 'newline'):
+                return match
+        return None
+
+    token = next_token()
+    receiver = ''
+    if token and token.group() == '(':
+        close = _matching_close(code, token.start())
+        if close == -1:
+            return None
+        receiver = code[token.start() + 1:close].strip()
+        tokens = _GO_TOKEN_PATTERN.finditer(code, close + 1)
+        token = next_token()
+    if not token or token.lastgroup != 'ident' or token.group() in GO_KEYWORDS:
+        return None
+    name = token.group()
+    token = next_token()
+    if token and token.group() == '[':
+        # 泛型函数的类型参数
+        close = _matching_close(code, token.start())
+        if close == -1:
+            return None
+        tokens = _GO_TOKEN_PATTERN.finditer(code, close + 1)
+        token = next_token()
+    if not token or token.group() != '(':
+        return None
+    params_end = _matching_close(code, token.start())
+    if params_end == -1:
+        return None
+    params = code[token.start() + 1:params_end]
+
+    # 返回值之后的第一个顶层{是函数体，interface{}、struct{}中的{属于类型
+    depth = 0
+    previous = None
+    for match in _GO_TOKEN_PATTERN.finditer(code, params_end + 1):
+        kind, text = match.lastgroup, match.group()
+        if kind in ('space', 'comment'):
+            continue
+        if kind == 'newline':
+            if depth == 0:
+                return None
+            continue
+        if text == '{' and depth == 0 and previous not in ('interface', 'struct'):
+            body_start = match.start()
+            break
+        if kind == 'op' and text in '([{':
+            depth += 1
+        elif kind == 'op' and text in ')]}':
+            depth -= 1
+        previous = text
+    else:
+        return None
+    receiver_type = _receiver_type(receiver)
+    return {
+        'name': name,
+        'receiver': receiver_type,
+        'key': f"{receiver_type}.{name}" if receiver_type else name,
+        'params': params.strip(),
+        'return_type': code[params_end + 1:body_start].strip(),
+        'start': pos,
+        'body_start': body_start,
+    }
+
+
+def _analyze_file_worker(file_path: str) -> List[Dict[str, Any]]:
+    """
+    进程池工作函数：在子进程中分析单个Go文件
+    :param file_path: Go文件路径
+    :return: 函数信息列表
+    """
+    return GoCodeAnalyzer().analyze_file(file_path)
 
 class GoCodeAnalyzer:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        # Go函数定义正则表达式
-        self.func_pattern = re.compile(r'func\s+(\w+)\s*\((.*?)\)\s*(.*?)\{', re.DOTALL)
-        # Go文档注释正则表达式
-        self.doc_comment_pattern = re.compile(r'(/\*\*.*?\*/|/\*.*?\*/|//.*?)(?=\s*func)', re.DOTALL|re.MULTILINE)
         # 匹配@apitags标签的正则表达式
         self.api_tags_pattern = re.compile(r'@apitags\s+([\w,]+)', re.MULTILINE)
+        # 文件路径 -> (修改时间, 文件大小, 源码, 声明头索引)
+        self._index_cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def build_index(self, code: str) -> Dict[str, Dict[str, Any]]:
+        """
+        只解析顶层函数与方法的声明头，建立符号索引
+        :param code: Go源码
+        :return: 符号到声明头的有序映射，函数的键为函数名，方法的键为"接收者类型.方法名"；
+                 声明头见parse_func_header，不包含函数体
+        """
+        index = {}
+        for header in self._iter_headers(code):
+            # 只有init与_可以重复声明，索引中保留第一个
+            index.setdefault(header['key'], header)
+        return index
+
+    @staticmethod
+    def _iter_headers(code: str):
+        """
+        按出现顺序产出所有顶层函数与方法的声明头
+        """
+        for match in _FUNC_DECL_PATTERN.finditer(code):
+            header = parse_func_header(code, match.start())
+            if header is not None:
+                yield header
+
+    def get_index(self, file_path: str) -> Tuple[str, Dict[str, Dict[str, Any]]]:
+        """
+        获取文件的源码与符号索引，文件未修改时直接使用缓存
+        :param file_path: Go文件路径
+        :return: (源码, 符号索引)
+        """
+        stat = os.stat(file_path)
+        with self._cache_lock:
+            cached = self._index_cache.get(file_path)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                self._index_cache.move_to_end(file_path)
+                return cached[2], cached[3]
+        with open(file_path, 'r', encoding='utf-8') as f:
+            code = f.read()
+        index = self.build_index(code)
+        with self._cache_lock:
+            self._index_cache[file_path] = (stat.st_mtime_ns, stat.st_size, code, index)
+            self._index_cache.move_to_end(file_path)
+            while len(self._index_cache) > SYMBOL_INDEX_CACHE_SIZE:
+                self._index_cache.popitem(last=False)
+        return code, index
+
+    def _function_info(self, code: str, header: Dict[str, Any], file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        按声明头切出函数体，生成函数信息
+        :return: 函数信息，函数体缺少匹配的花括号时返回None
+        """
+        end_pos = _matching_close(code, header['body_start'])
+        if end_pos == -1:
+            self.logger.warning(f"文件{file_path}中函数{header['key']}缺少匹配的花括号")
+            return None
+        doc_comment = _doc_comment(code, header['start'])
+        return {
+            'name': header['name'],
+            'receiver': header['receiver'],
+            'params': header['params'],
+            'return_type': header['return_type'],
+            'body': code[header['body_start'] + 1:end_pos].strip(),
+            'full_code': code[header['start']:end_pos + 1],
+            'file_path': file_path,
+            'doc_comment': doc_comment,
+            'api_tags': self._extract_api_tags(doc_comment),
+            'start_line': code.count('\n', 0, header['start']) + 1,
+            'end_line': code.count('\n', 0, end_pos) + 1
+        }
+
+    def get_function(self, file_path: str, function_name: str) -> Optional[Dict[str, Any]]:
+        """
+        通过符号索引获取单个函数的信息，只切出该函数的函数体
+        :param file_path: 文件路径
+        :param function_name: 函数名，方法使用"接收者类型.方法名"
+        :return: 函数信息，未找到时返回None
+        """
+        code, index = self.get_index(file_path)
+        header = index.get(function_name)
+        if header is None:
+            return None
+        return self._function_info(code, header, file_path)
 
     def analyze_file(self, file_path: str) -> List[Dict[str, Any]]:
         """
@@ -35,55 +300,13 @@ class GoCodeAnalyzer:
         :return: 函数信息列表
         """
         functions = []
-        # 使用正则表达式提取函数
-        matches = self.func_pattern.finditer(code)
-        
-        # 首先找到所有的文档注释
-        doc_comments = {}  # 存储位置到注释的映射
-        for doc_match in self.doc_comment_pattern.finditer(code):
-            doc_comments[doc_match.end()] = doc_match.group(1).strip()
-
-        for match in matches:
-            func_name = match.group(1)
-            params = match.group(2).strip()
-            return_type = match.group(3).strip()
-            
-            # 提取函数体
-            start_pos = match.end()
-            end_pos = self._find_matching_brace(code, start_pos)
-            if end_pos == -1:
-                self.logger.warning(f"文件{file_path}中函数{func_name}缺少匹配的花括号")
+        for header in self._iter_headers(code):
+            # 测试以Test{函数名}命名，方法的同名冲突尚无约定，批量生成只处理顶层函数
+            if header['receiver']:
                 continue
-            
-            func_body = code[start_pos:end_pos].strip()
-            
-            # 提取完整函数代码
-            full_func_code = code[match.start():end_pos+1]
-            
-            # 查找函数对应的文档注释
-            doc_comment = ""
-            # 寻找距离函数定义最近的文档注释
-            closest_pos = -1
-            for pos in doc_comments.keys():
-                if pos < match.start() and pos > closest_pos:
-                    closest_pos = pos
-            if closest_pos != -1:
-                doc_comment = doc_comments[closest_pos]
-            
-            # 提取@apitags标签
-            api_tags = self._extract_api_tags(doc_comment)
-            
-            functions.append({
-                'name': func_name,
-                'params': params,
-                'return_type': return_type,
-                'body': func_body,
-                'full_code': full_func_code,
-                'file_path': file_path,
-                'doc_comment': doc_comment,
-                'api_tags': api_tags
-            })
-        
+            func_info = self._function_info(code, header, file_path)
+            if func_info is not None:
+                functions.append(func_info)
         return functions
 
     def _extract_api_tags(self, doc_comment: str) -> str:
@@ -97,23 +320,6 @@ class GoCodeAnalyzer:
             return match.group(1)
         return ''
 
-    def _find_matching_brace(self, code: str, start_pos: int) -> int:
-        """
-        查找匹配的花括号
-        :param code: 代码字符串
-        :param start_pos: 开始位置
-        :return: 匹配的花括号位置，未找到返回-1
-        """
-        brace_count = 1
-        for i in range(start_pos, len(code)):
-            if code[i] == '{':
-                brace_count += 1
-            elif code[i] == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    return i
-        return -1
-
     def find_go_files(self, directory: str) -> List[str]:
         """
         查找目录下所有Go文件
@@ -131,31 +337,41 @@ class GoCodeAnalyzer:
         """
         获取指定文件中指定函数的完整代码
         :param file_path: 文件路径
-        :param function_name: 函数名
+        :param function_name: 函数名，方法使用"接收者类型.方法名"
         :return: 函数完整代码
         """
         try:
-            functions = self.analyze_file(file_path)
-            for func in functions:
-                if func['name'] == function_name:
-                    return func['full_code']
+            func_info = self.get_function(file_path, function_name)
+            if func_info is not None:
+                return func_info['full_code']
             self.logger.warning(f"在文件{file_path}中未找到函数{function_name}")
             return ''
         except Exception as e:
             self.logger.error(f"获取函数{function_name}代码失败: {str(e)}")
             return ''
 
-    def analyze_directory(self, directory: str) -> List[Dict[str, Any]]:
+    def analyze_directory(self, directory: str, workers: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         分析目录下所有Go文件
         :param directory: 目录路径
-        :return: 函数信息列表
+        :param workers: 并行分析的进程数，为None时取CPU核数，为1时串行分析
+        :return: 函数信息列表，顺序与文件查找顺序一致
         """
         all_functions = []
         go_files = self.find_go_files(directory)
-        
-        for file in go_files:
-            functions = self.analyze_file(file)
-            all_functions.extend(functions)
+        workers = workers or os.cpu_count() or 1
+
+        if workers <= 1 or len(go_files) < PARALLEL_ANALYZE_MIN_FILES:
+            for file in go_files:
+                functions = self.analyze_file(file)
+                all_functions.extend(functions)
+            return all_functions
+
+        # 文件较多时按进程并行分析，正则匹配是CPU密集型操作，线程无法并行
+        from concurrent.futures import ProcessPoolExecutor
+        chunksize = max(1, len(go_files) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for functions in executor.map(_analyze_file_worker, go_files, chunksize=chunksize):
+                all_functions.extend(functions)
         
         return all_functions
\ No newline at end of file
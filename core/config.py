@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -13,11 +13,122 @@ class Settings(BaseSettings):
     #  siliconflow_model: str = "Pro/deepseek-ai/DeepSeek-V3.1"
     siliconflow_url: str = "https://api.siliconflow.cn/v1"
     
+    # 分阶段模型配置：阶段包括 fail_case、success_case、merge、debug
+    # 未配置的阶段使用对应供应商的默认模型（openai_model / siliconflow_model）
+    # 合并模板和修复编译错误是机械性工作，默认交给响应更快的非推理模型
+    openai_stage_models: Dict[str, str] = {"merge": "gpt-4o-mini", "debug": "gpt-4o-mini"}
+    siliconflow_stage_models: Dict[str, str] = {
+        "merge": "Pro/deepseek-ai/DeepSeek-V3",
+        "debug": "Pro/deepseek-ai/DeepSeek-V3",
+    }
+    llm_stage_escalation: bool = True  # 廉价模型输出未通过校验时，改用默认的强模型重试
+    
+    # 多供应商路由配置
+    llm_provider_order: List[str] = ["siliconflow", "openai"]  # 供应商优先级，首个可用者为主供应商
+    llm_request_timeout: float = 30.0  # 单次请求超时（秒）
+    llm_max_retries: int = 2  # 全部供应商失败后的重试次数
+    llm_backoff_base: float = 1.0  # 退避基数（秒），实际等待时间带随机抖动
+    llm_backoff_max: float = 10.0  # 单次退避上限（秒）
+    llm_hedge_enabled: bool = False  # 主供应商超过p95延迟时向备用供应商发送对冲请求
+    llm_hedge_min_samples: int = 5  # 计算p95所需的最少样本数，不足时使用默认对冲延迟
+    llm_hedge_default_delay: float = 20.0  # 样本不足时的对冲延迟（秒）
+    llm_circuit_failure_threshold: int = 3  # 连续失败多少次后熔断
+    llm_circuit_reset_seconds: float = 60.0  # 熔断后多久放行探测请求
+    
+    # 限流配置：同一主机上使用同一API密钥的进程共享额度，请按账号等级调整
+    llm_rate_limit_enabled: bool = True
+    openai_rpm: int = 500  # 每分钟请求数
+    openai_tpm: int = 30000  # 每分钟token数
+    siliconflow_rpm: int = 1000
+    siliconflow_tpm: int = 100000
+    llm_rate_limit_output_tokens: int = 1024  # 每次请求预扣的输出token数，响应后按实际用量校正
+    llm_rate_limit_dir: str = ""  # 共享状态文件目录，为空时使用系统临时目录
+    
+    # 统计配置
+    llm_stream_include_usage: bool = True  # 流式请求时要求服务端返回token用量
+    # 模型单价：每百万token的输入/输出价格（按供应商计价货币），用于估算费用
+    llm_model_prices: Dict[str, Dict[str, float]] = {
+        "Pro/deepseek-ai/DeepSeek-R1": {"input": 4.0, "output": 16.0},
+        "Pro/deepseek-ai/DeepSeek-V3": {"input": 2.0, "output": 8.0},
+        "gpt-4o": {"input": 2.5, "output": 10.0},
+        "gpt-4o-mini": {"input": 0.15, "output": 0.6},
+    }
+    
+    # 用量预算：按整次运行(run)、包(package)与函数(function)限制输入/输出token(input_tokens/output_tokens)与估算费用(cost)，
+    # 如 {"run": {"cost": 50}, "package": {"input_tokens": 2000000}, "function": {"output_tokens": 20000}}，未配置的项不限制
+    llm_budgets: Dict[str, Dict[str, float]] = {}
+    # 用量达到预算的这些比例时依次降级：不再生成成功用例、改用廉价模型、只生成测试模板；计入本次调用后将超出预算时直接只生成模板
+    llm_budget_degrade_ratios: List[float] = [0.6, 0.8, 0.95]
+    # 降级为廉价模型时各供应商使用的模型
+    llm_budget_fallback_models: Dict[str, str] = {"siliconflow": "Pro/deepseek-ai/DeepSeek-V3", "openai": "gpt-4o-mini"}
+    
+    # 调试修复方式：patch 先让LLM返回局部修改（JSON），无法应用时再完整重写；rewrite 每次都完整重写
+    llm_repair_mode: str = "patch"
+    
+    # 提示词压缩配置：发送给LLM前去掉函数体内的注释、不可达语句与多余空白，文档注释保留
+    llm_prompt_compaction: bool = True
+    llm_prompt_elide_logs: bool = False  # 是否同时去掉日志调用语句
+    llm_prompt_log_pattern: str = ""  # 日志调用的正则，为空时使用内置规则（log./logger./fmt.Print等）
+    
+    # go test执行池配置
+    go_test_jobs: int = 0  # 同时执行的go test数，0表示按CPU数与可用内存自动计算
+    go_test_gomaxprocs: int = 0  # 每个go test任务的GOMAXPROCS，0表示使用默认值2
+    go_test_cache_dir: str = ""  # 所有任务共享的GOCACHE，为空时使用go的默认缓存目录
+    go_test_flags: str = ""  # 所有任务共享的GOFLAGS，为空时沿用当前环境
+    go_test_timeout: int = 30  # 单次go test超时（秒），超时后杀死整个进程组
+    go_test_output_head_lines: int = 200  # 输出保留的开头行数
+    go_test_output_tail_lines: int = 200  # 输出保留的结尾行数
+    go_test_output_matched_lines: int = 300  # 输出中间部分最多保留的失败信息行数
+    go_test_output_dir: str = ".autounittest/go_test_output"  # 被截断输出的完整内容（gzip）保存目录，为空时不保存
+    
+    # 相似函数测试复用配置
+    test_reuse_enabled: bool = True  # LLM模式下先尝试复用结构相似函数已验证的测试
+    test_reuse_dir: str = ".autounittest/reuse"
+    test_reuse_threshold: float = 0.85  # MinHash估算的最低相似度
+    
+    # 录制/回放配置：record 录制每次LLM调用，replay 从录制记录回放而不请求任何供应商
+    llm_transcript_mode: str = ""  # 为空时关闭
+    llm_transcript_dir: str = ".llm_transcripts"
+    llm_replay_latency: bool = False  # 回放时按录制的耗时等待
+    llm_replay_fallback_live: bool = False  # 回放未命中时是否回退为真实调用
+    
+    # 日志正文配置：超过长度的函数代码、LLM响应等按阶段采样后保存到内容寻址目录，日志中只记录sha256
+    log_payload_dir: str = ".autounittest/log_payloads"  # 为空时不保存
+    log_payload_inline_chars: int = 200  # 不超过该长度的正文直接写在日志中
+    log_payload_sample_rates: Dict[str, float] = {}  # 阶段到采样比例的映射，如{"llm_response": 0.1}，未配置的阶段全部保存
+    
     # 项目配置
     go_project_path: str = "/Users/zhangliyu/Documents/codellm/autoUnitTestPro"
     services_dir: str = "."
     test_template_dir: str = "templates"
     
+    def model_for_stage(self, provider: str, stage: Optional[str], escalate: bool = False) -> str:
+        """
+        获取指定供应商在指定阶段使用的模型
+        :param provider: 供应商 (openai 或 siliconflow)
+        :param stage: 阶段名，为None时使用默认模型
+        :param escalate: 是否升级到默认的强模型
+        :return: 模型名
+        """
+        default_model = self.openai_model if provider == "openai" else self.siliconflow_model
+        if escalate or not stage:
+            return default_model
+        stage_models = self.openai_stage_models if provider == "openai" else self.siliconflow_stage_models
+        return stage_models.get(stage) or default_model
+
+    def estimate_cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """
+        估算一次调用的费用
+        :param model: 模型名
+        :param prompt_tokens: 输入token数
+        :param completion_tokens: 输出token数（含推理token）
+        :return: 费用，未配置单价的模型返回0
+        """
+        price = self.llm_model_prices.get(model)
+        if not price:
+            return 0.0
+        return (prompt_tokens * price.get("input", 0.0) + completion_tokens * price.get("output", 0.0)) / 1_000_000
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
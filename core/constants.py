@@ -85,5 +85,11 @@ func Test{function_name}(t *testing.T) {{
 
 }}"""
 
+# LLM调用阶段，用于按阶段选择模型
+STAGE_FAIL_CASE = "fail_case"
+STAGE_SUCCESS_CASE = "success_case"
+STAGE_MERGE = "merge"
+STAGE_DEBUG = "debug"
+
 # 从llm_utils导入提示模板
 from llm_utils.prompts import LLM_SUPPPLY_FAILCASE_ARGS_PROMPT, LLM_SUPPPLY_SUCCESS_ARGS_PROMPT
\ No newline at end of file
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# 函数处理过程中的持久化阶段，按先后顺序排列
+JOURNAL_STAGE_TEMPLATE = "template"  # 基础模板已写入测试文件
+JOURNAL_STAGE_ENRICHED = "enriched"  # LLM补充参数后的代码已写入测试文件
+JOURNAL_STAGE_DEBUGGED = "debugged"  # 某一轮调试后的代码已写入测试文件
+JOURNAL_STAGE_DONE = "done"  # 处理结束，记录最终结果
+
+
+class JobJournal:
+    """
+    只追加的任务日志（JSONL），每条记录写入后fsync
+
+    每行记录一个函数的一次阶段转换及其产物（模板代码、补充后的代码、最近一次测试输出等），
+    进程崩溃时最多丢失正在写的那一行，打开时截掉末尾不完整的行后再追加。已有记录从不清空：
+    恢复时每个函数取最后一条记录，已完成的直接复用结果，未完成的从最后一个持久化阶段继续；
+    不恢复时只追加新记录，之前中断的批量运行仍可在之后恢复。
+    内存中只保留每个函数最后一条记录的阶段与文件偏移，代码、测试输出等产物在恢复该函数时才从文件读取。
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        """
+        :param path: 日志文件路径
+        :param resume: 是否加载已有记录跳过已完成的函数；为False时不加载，新记录仍追加在已有记录之后
+        """
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self._lock = threading.Lock()
+        # 函数标识 -> (最后一个阶段, 该记录在文件中的偏移)
+        self._index: Dict[str, Tuple[str, int]] = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._truncate_torn_tail()
+        if resume:
+            self._load()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _truncate_torn_tail(self) -> None:
+        """
+        截掉崩溃时写了一半的最后一行，新记录才能从完整的行开始
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - 65536)
+                f.seek(start)
+                chunk = f.read(position - start)
+                newline = chunk.rfind(b'\n')
+                if newline != -1:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                f.truncate(position)
+                self.logger.warning("任务日志末尾有不完整的记录，已截断")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        skipped = 0
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                line_offset = offset
+                offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                self._index[entry['key']] = (entry['stage'], line_offset)
+        if skipped:
+            self.logger.warning(f"任务日志中有{skipped}行不完整，已跳过")
+        done = sum(1 for stage, _ in self._index.values() if stage == JOURNAL_STAGE_DONE)
+        self.logger.info(f"已加载任务日志{self.path}: {len(self._index)}个函数，其中{done}个已完成")
+
+    def record(self, key: str, stage: str, **artifacts: Any) -> None:
+        """
+        持久化一次阶段转换
+        :param key: 函数标识，通常为"文件路径:函数名"
+        :param stage: 阶段名，见JOURNAL_STAGE_*
+        :param artifacts: 该阶段的产物，如code、test_output、result
+        """
+        entry = {'key': key, 'stage': stage, 'ts': time.time(), **artifacts}
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            # 本次运行中每个函数只在开始处理时查询一次，之后的记录只用于下次恢复，不再保留在内存中
+            self._index.pop(key, None)
+
+    def checkpoint(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        获取函数最后一个持久化阶段
+        :param key: 函数标识
+        :return: 最后一条记录（含该阶段的产物），没有记录时返回None
+        """
+        with self._lock:
+            indexed = self._index.pop(key, None)
+        if indexed is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(indexed[1])
+            return json.loads(f.readline())
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,117 @@
+import atexit
+import gzip
+import hashlib
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from typing import Optional
+
+DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# 当前安装的日志监听线程，未安装时正文在调用线程中写入
+_listener: Optional['PayloadQueueListener'] = None
+_setup_lock = threading.Lock()
+
+
+def payload_path(directory: str, digest: str) -> str:
+    """
+    :return: 正文在内容寻址目录中的路径，相同内容只存一份
+    """
+    return os.path.join(directory, digest[:2], f"{digest}.gz")
+
+
+def write_payload(path: str, text: str) -> None:
+    """
+    写入gzip压缩的正文，文件已存在时跳过
+    """
+    if os.path.exists(path):
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(text.encode('utf-8'))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.getLogger(__name__).warning(f"保存日志正文{path}失败: {str(e)}")
+
+
+class PayloadQueueListener(logging.handlers.QueueListener):
+    """
+    日志监听线程：处理记录前先把附带的大段正文写入产物目录，写文件与输出日志都不占用调用线程
+    """
+
+    def handle(self, record: logging.LogRecord) -> None:
+        payload = getattr(record, 'payload', None)
+        if payload is not None:
+            write_payload(record.payload_path, payload)
+            # 正文已落盘，不再随记录传给各个handler
+            record.payload = None
+        super().handle(record)
+
+
+def setup_logging(level: int = logging.INFO, fmt: str = DEFAULT_FORMAT) -> PayloadQueueListener:
+    """
+    配置异步日志：根logger只挂一个QueueHandler，格式化后的记录由监听线程输出到标准错误，
+    并发很高时业务线程也只做一次入队；进程退出时监听线程输出剩余记录后停止
+    :param level: 日志级别
+    :param fmt: 日志格式
+    :return: 日志监听线程
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(fmt))
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        root.setLevel(level)
+        _listener = PayloadQueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
+
+
+def _sampled(digest: str, rate: float) -> bool:
+    """
+    按内容哈希决定是否采样，相同内容的决定总是一致
+    """
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    return int(digest[:8], 16) < rate * 0x100000000
+
+
+def log_payload(logger: logging.Logger, stage: str, label: str, text: str, level: int = logging.INFO) -> None:
+    """
+    记录大段正文（函数代码、LLM响应等）：短正文直接写入日志，长正文按阶段采样后保存到内容寻址的产物目录，
+    日志中只保留长度与sha256
+    :param logger: 记录日志的logger
+    :param stage: 采样阶段，如function_code、llm_response
+    :param label: 日志说明
+    :param text: 正文
+    :param level: 日志级别
+    """
+    if not logger.isEnabledFor(level):
+        return
+    from core.config import settings
+    if len(text) <= settings.log_payload_inline_chars:
+        logger.log(level, f"{label}: {text}")
+        return
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    if not settings.log_payload_dir or not _sampled(digest, settings.log_payload_sample_rates.get(stage, 1.0)):
+        logger.log(level, f"{label}: {len(text)}字符, sha256={digest[:16]}（未保存）")
+        return
+    path = payload_path(settings.log_payload_dir, digest)
+    if _listener is None:
+        write_payload(path, text)
+        logger.log(level, f"{label}: {len(text)}字符, sha256={digest[:16]}, 已保存到{path}")
+    else:
+        logger.log(level, f"{label}: {len(text)}字符, sha256={digest[:16]}, 已保存到{path}",
+                   extra={'payload': text, 'payload_path': path})
@@ -0,0 +1,329 @@
+import contextvars
+import json
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# 当前正在处理的函数，使用contextvars以便在对冲请求等线程池任务中传递
+_current_function: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_function', default=None)
+
+# 需要按函数与整体汇总的数值型属性
+SUMMED_ATTRS = ('prompt_tokens', 'completion_tokens', 'cached_tokens', 'reasoning_tokens', 'cost', 'tokens_saved')
+# 计算分位数时每个阶段最多保留的耗时样本数
+RESERVOIR_SIZE = 2048
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    计算分位数（最近秩法）
+    :param values: 数值列表
+    :param q: 分位数，取值0~1
+    :return: 分位数，列表为空时返回0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Reservoir:
+    """
+    固定容量的均匀抽样（水塘抽样），样本数不超过容量时分位数是精确值
+    """
+
+    def __init__(self, size: int = RESERVOIR_SIZE):
+        self.size = size
+        self.count = 0
+        self.samples: List[float] = []
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+            return
+        index = random.randrange(self.count)
+        if index < self.size:
+            self.samples[index] = value
+
+    def percentile(self, q: float) -> float:
+        return percentile(self.samples, q)
+
+
+def _new_stage() -> Dict[str, Any]:
+    return {'count': 0, 'total': 0.0, 'max': 0.0, 'errors': 0, 'durations': Reservoir(), 'ttfts': Reservoir(),
+            **{attr: 0 for attr in SUMMED_ATTRS}}
+
+
+class RunMetrics:
+    """
+    单次运行的阶段耗时、token与费用统计
+    各阶段通过span()记录，函数归属由function_scope()自动关联
+
+    阶段记录不逐条保留：每个阶段只维护计数、合计与有界的耗时样本，
+    函数的增量汇总在function_stats(forget=True)取出后并入整体统计，运行时间再长内存也不会增长。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._totals = {attr: 0 for attr in SUMMED_ATTRS}
+        self.results: Dict[str, Dict[str, Any]] = {}
+        # 已取出并释放的函数的耗时样本与状态计数
+        self._finished_durations = Reservoir()
+        self._finished_status_counts: Dict[str, int] = {}
+        # 每条阶段记录的订阅者，如按go_test耗时学习的成本估算器
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        # 正在执行的各阶段数，供进度显示
+        self._in_flight: Dict[str, int] = {}
+        # 按函数增量汇总的阶段耗时与数值属性，取出后即释放
+        self._function_totals: Dict[str, Dict[str, Any]] = {}
+        self.started_at = time.time()
+
+    @contextmanager
+    def function_scope(self, function_key: str) -> Iterator[None]:
+        """
+        标记当前上下文正在处理的函数
+        :param function_key: 函数标识，通常为"文件路径:函数名"
+        """
+        token = _current_function.set(function_key)
+        try:
+            yield
+        finally:
+            _current_function.reset(token)
+
+    @staticmethod
+    def current_function() -> Optional[str]:
+        return _current_function.get()
+
+    @contextmanager
+    def span(self, stage: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """
+        记录一个阶段的耗时
+        :param stage: 阶段名，如analyze、template、llm、go_test、save
+        :param attrs: 附加属性，可在with块内继续向yield出的字典写入（如token数）
+        """
+        record = dict(attrs)
+        with self._lock:
+            self._in_flight[stage] = self._in_flight.get(stage, 0) + 1
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record.setdefault('error', type(e).__name__)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight[stage] -= 1
+            self.record(stage, time.perf_counter() - start, **record)
+
+    def in_flight(self, stage: str) -> int:
+        """
+        :param stage: 阶段名
+        :return: 该阶段当前正在执行的数量
+        """
+        with self._lock:
+            return self._in_flight.get(stage, 0)
+
+    def record(self, stage: str, duration: float, **attrs: Any) -> None:
+        """
+        直接记录一个阶段
+        :param stage: 阶段名
+        :param duration: 耗时（秒）
+        :param attrs: 附加属性
+        """
+        span = {'stage': stage, 'duration': duration, 'function': _current_function.get()}
+        span.update(attrs)
+        with self._lock:
+            aggregate = self._stages.get(stage)
+            if aggregate is None:
+                aggregate = self._stages[stage] = _new_stage()
+            aggregate['count'] += 1
+            aggregate['total'] += duration
+            aggregate['max'] = max(aggregate['max'], duration)
+            aggregate['durations'].add(duration)
+            if span.get('ttft') is not None:
+                aggregate['ttfts'].add(span['ttft'])
+            if span.get('error'):
+                aggregate['errors'] += 1
+            for attr in SUMMED_ATTRS:
+                aggregate[attr] += span.get(attr) or 0
+                self._totals[attr] += span.get(attr) or 0
+            listeners = list(self._listeners)
+            if span['function']:
+                totals = self._function_totals.setdefault(span['function'], {'stages': {}, **{attr: 0 for attr in SUMMED_ATTRS}})
+                totals['stages'][stage] = totals['stages'].get(stage, 0.0) + duration
+                for attr in SUMMED_ATTRS:
+                    totals[attr] += span.get(attr) or 0
+        for listener in listeners:
+            listener(span)
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """
+        订阅之后的每条阶段记录
+        :param listener: 回调，参数为阶段记录（stage、duration、function与附加属性）
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def function_stats(self, function_key: str, forget: bool = False) -> Dict[str, Any]:
+        """
+        获取单个函数的统计，不需要遍历全部阶段记录
+        :param function_key: 函数标识
+        :param forget: 取出后是否释放该函数的增量汇总，批量运行中逐个写出结果时使用
+        :return: 与summary()['functions']中单项相同结构的字典，没有记录时为空字典
+        """
+        with self._lock:
+            if forget:
+                totals = self._function_totals.pop(function_key, None)
+                result = self.results.pop(function_key, None)
+            else:
+                totals = self._function_totals.get(function_key)
+                result = self.results.get(function_key)
+            if totals is None and result is None:
+                return {}
+            stats = {'stages': {}, **{attr: 0 for attr in SUMMED_ATTRS}}
+            if totals:
+                stats.update(totals, stages=dict(totals['stages']))
+            stats.update(result or {})
+            # function阶段覆盖整个处理过程，缺失时退化为各阶段之和
+            stats['duration'] = stats['stages'].get('function', sum(stats['stages'].values()))
+            if forget:
+                # 释放前并入整体的函数耗时与状态统计
+                self._finished_durations.add(stats['duration'])
+                if stats.get('status'):
+                    self._finished_status_counts[stats['status']] = self._finished_status_counts.get(stats['status'], 0) + 1
+        return stats
+
+    def record_result(self, function_key: str, status: str) -> None:
+        """
+        记录函数的最终生成状态
+        :param function_key: 函数标识
+        :param status: 生成状态
+        """
+        with self._lock:
+            self.results[function_key] = {'status': status}
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        汇总统计
+        :return: 包含整体、各阶段与各函数统计的字典；functions只包含尚未通过function_stats(forget=True)释放的函数
+        """
+        with self._lock:
+            stage_summary = {}
+            for name, aggregate in self._stages.items():
+                stage = {key: value for key, value in aggregate.items() if key not in ('durations', 'ttfts')}
+                stage['p50'] = aggregate['durations'].percentile(0.5)
+                stage['p95'] = aggregate['durations'].percentile(0.95)
+                if aggregate['ttfts'].count:
+                    stage['ttft_p50'] = aggregate['ttfts'].percentile(0.5)
+                    stage['ttft_p95'] = aggregate['ttfts'].percentile(0.95)
+                stage_summary[name] = stage
+            totals = dict(self._totals)
+            functions: Dict[str, Dict[str, Any]] = {}
+            for key, func_totals in self._function_totals.items():
+                functions[key] = dict(func_totals, stages=dict(func_totals['stages']))
+            for key, result in self.results.items():
+                functions.setdefault(key, {'stages': {}, **{attr: 0 for attr in SUMMED_ATTRS}}).update(result)
+            finished_durations = Reservoir()
+            finished_durations.samples = list(self._finished_durations.samples)
+            finished_count = self._finished_durations.count
+            status_counts = dict(self._finished_status_counts)
+
+        for func in functions.values():
+            # function阶段覆盖整个处理过程，缺失时退化为各阶段之和
+            func['duration'] = func['stages'].get('function', sum(func['stages'].values()))
+            finished_durations.samples.append(func['duration'])
+            if func.get('status'):
+                status_counts[func['status']] = status_counts.get(func['status'], 0) + 1
+
+        return {
+            'started_at': self.started_at,
+            'elapsed': time.time() - self.started_at,
+            'function_count': finished_count + len(functions),
+            'function_p50': finished_durations.percentile(0.5),
+            'function_p95': finished_durations.percentile(0.95),
+            'status_counts': status_counts,
+            'totals': totals,
+            'stages': stage_summary,
+            'functions': functions,
+        }
+
+    def write_json(self, path: str) -> None:
+        """
+        写出JSON报告
+        :param path: 报告路径
+        """
+        _atomic_write(path, json.dumps(self.summary(), ensure_ascii=False, indent=2))
+
+    def write_prometheus(self, path: str, prefix: str = 'autounittest') -> None:
+        """
+        写出Prometheus textfile格式的指标，供node_exporter的textfile collector采集
+        :param path: 指标文件路径，应以.prom结尾
+        :param prefix: 指标名前缀
+        """
+        summary = self.summary()
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Duration of pipeline stages.",
+            f"# TYPE {prefix}_stage_duration_seconds summary",
+        ]
+        for name, stage in summary['stages'].items():
+            lines.append(f'{prefix}_stage_duration_seconds{{stage="{name}",quantile="0.5"}} {stage["p50"]:.6f}')
+            lines.append(f'{prefix}_stage_duration_seconds{{stage="{name}",quantile="0.95"}} {stage["p95"]:.6f}')
+            lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{name}"}} {stage["total"]:.6f}')
+            lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{name}"}} {stage["count"]}')
+        lines += [
+            f"# HELP {prefix}_stage_errors_total Failed stage executions.",
+            f"# TYPE {prefix}_stage_errors_total counter",
+        ]
+        for name, stage in summary['stages'].items():
+            lines.append(f'{prefix}_stage_errors_total{{stage="{name}"}} {stage["errors"]}')
+        lines += [
+            f"# HELP {prefix}_llm_tokens_total LLM tokens by type.",
+            f"# TYPE {prefix}_llm_tokens_total counter",
+        ]
+        for attr in ('prompt_tokens', 'completion_tokens', 'cached_tokens', 'reasoning_tokens'):
+            lines.append(f'{prefix}_llm_tokens_total{{type="{attr[:-len("_tokens")]}"}} {summary["totals"][attr]}')
+        lines += [
+            f"# HELP {prefix}_llm_cost_total Estimated LLM cost.",
+            f"# TYPE {prefix}_llm_cost_total counter",
+            f"{prefix}_llm_cost_total {summary['totals']['cost']:.6f}",
+            f"# HELP {prefix}_prompt_tokens_saved_total Prompt tokens saved by code compaction.",
+            f"# TYPE {prefix}_prompt_tokens_saved_total counter",
+            f"{prefix}_prompt_tokens_saved_total {summary['totals']['tokens_saved']}",
+            f"# HELP {prefix}_functions_total Processed functions by final status.",
+            f"# TYPE {prefix}_functions_total counter",
+        ]
+        for status, count in summary['status_counts'].items():
+            lines.append(f'{prefix}_functions_total{{status="{status}"}} {count}')
+        lines += [
+            f"# HELP {prefix}_run_elapsed_seconds Wall time of the run.",
+            f"# TYPE {prefix}_run_elapsed_seconds gauge",
+            f"{prefix}_run_elapsed_seconds {summary['elapsed']:.3f}",
+        ]
+        _atomic_write(path, '\n'.join(lines) + '\n')
+
+
+def _atomic_write(path: str, content: str) -> None:
+    """
+    先写临时文件再替换，避免采集方读到半截文件
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+# 全局运行统计实例
+metrics = RunMetrics()
@@ -0,0 +1,137 @@
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from core.metrics import metrics
+from llm_utils.rate_limiter import estimate_tokens
+
+# coverprofile中的一行: 文件:起始行.起始列,结束行.结束列 语句数 执行次数
+_PROFILE_LINE = re.compile(r'^(?P<file>.+):(?P<start_line>\d+)\.(?P<start_col>\d+),(?P<end_line>\d+)\.(?P<end_col>\d+) (?P<statements>\d+) (?P<count>\d+)$')
+
+
+def parse_cover_profile(text: str) -> List[Dict[str, Any]]:
+    """
+    解析go test -coverprofile输出
+    :param text: 覆盖率文件内容
+    :return: 代码块列表，每项包含file、start_line、end_line、statements、count
+    """
+    blocks = []
+    for line in text.splitlines():
+        match = _PROFILE_LINE.match(line.strip())
+        if not match:
+            continue
+        blocks.append({
+            'file': match.group('file'),
+            'start_line': int(match.group('start_line')),
+            'end_line': int(match.group('end_line')),
+            'statements': int(match.group('statements')),
+            'count': int(match.group('count')),
+        })
+    return blocks
+
+
+def estimate_statements(body: str) -> int:
+    """
+    没有覆盖率数据时粗略估算函数的语句数：去掉空行、注释与只有括号的行
+    """
+    count = 0
+    for line in body.splitlines():
+        stripped = line.strip()
+        if stripped and not stripped.startswith('//') and stripped.strip('{}()') != '':
+            count += 1
+    return max(1, count)
+
+
+class CoverageSelector:
+    """
+    按覆盖率挑选最值得生成测试的函数
+
+    每个包执行一次go test -coverprofile，把未覆盖的代码块按行号归属到函数，
+    按"未覆盖语句数/估算token数"排序，只取前N个函数进入生成流程。
+    """
+
+    def __init__(self, go_test_pool, timeout: float = 300):
+        """
+        :param go_test_pool: GoTestPool实例，覆盖率测试与验证共用同一个执行池
+        :param timeout: 单个包的测试超时（秒）
+        """
+        self.logger = logging.getLogger(__name__)
+        self.go_test_pool = go_test_pool
+        self.timeout = timeout
+
+    def package_blocks(self, package_dir: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        执行一次包内全部测试并收集覆盖率
+        :param package_dir: 包目录
+        :return: 文件名到代码块列表的映射，包内没有测试或执行失败时为空
+        """
+        fd, profile_path = tempfile.mkstemp(prefix='autounittest_cover_', suffix='.out')
+        os.close(fd)
+        try:
+            with metrics.span("coverage", package_dir=package_dir) as span:
+                result = self.go_test_pool.run(
+                    package_dir, ['test', '-count=1', '-covermode=set', f'-coverprofile={profile_path}', '.'],
+                    timeout=self.timeout)
+                span.update(returncode=result['returncode'], timed_out=result['timed_out'])
+            if result['timed_out']:
+                self.logger.warning(f"包{package_dir}覆盖率测试超时，按未覆盖处理")
+            with open(profile_path, 'r', encoding='utf-8') as f:
+                blocks = parse_cover_profile(f.read())
+        except OSError as e:
+            self.logger.warning(f"读取包{package_dir}覆盖率失败: {str(e)}")
+            blocks = []
+        finally:
+            if os.path.exists(profile_path):
+                os.remove(profile_path)
+        # 覆盖率文件中是导入路径，一个目录对应一个包，按文件名归属即可
+        by_file: Dict[str, List[Dict[str, Any]]] = {}
+        for block in blocks:
+            by_file.setdefault(os.path.basename(block['file']), []).append(block)
+        return by_file
+
+    def annotate(self, functions: List[Dict[str, Any]]) -> None:
+        """
+        为每个函数附加coverage字段: statements、uncovered、tokens与score
+        :param functions: GoCodeAnalyzer输出的函数信息列表
+        """
+        package_dirs = sorted({os.path.dirname(func['file_path']) for func in functions})
+        with ThreadPoolExecutor(max_workers=self.go_test_pool.max_jobs, thread_name_prefix="coverage") as executor:
+            package_blocks = dict(zip(package_dirs, executor.map(self.package_blocks, package_dirs)))
+
+        for func in functions:
+            file_blocks = package_blocks[os.path.dirname(func['file_path'])].get(os.path.basename(func['file_path']))
+            if file_blocks:
+                blocks = [block for block in file_blocks
+                          if func['start_line'] <= block['start_line'] <= func['end_line']]
+                statements = sum(block['statements'] for block in blocks)
+                uncovered = sum(block['statements'] for block in blocks if block['count'] == 0)
+            else:
+                # 包内没有测试或测试无法编译，整个函数视为未覆盖
+                statements = uncovered = estimate_statements(func['body'])
+            tokens = estimate_tokens(func['full_code'])
+            func['coverage'] = {
+                'statements': statements,
+                'uncovered': uncovered,
+                'tokens': tokens,
+                'score': uncovered / tokens,
+            }
+
+    def select(self, functions: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+        """
+        挑选单位token成本下未覆盖语句最多的函数
+        :param functions: GoCodeAnalyzer输出的函数信息列表
+        :param top_n: 最多选取的函数数
+        :return: 按得分降序排列的函数列表，已完全覆盖的函数不会入选
+        """
+        self.annotate(functions)
+        candidates = [func for func in functions if func['coverage']['uncovered'] > 0]
+        candidates.sort(key=lambda func: (-func['coverage']['score'], func['file_path'], func['name']))
+        selected = candidates[:top_n]
+        uncovered = sum(func['coverage']['uncovered'] for func in candidates)
+        gained = sum(func['coverage']['uncovered'] for func in selected)
+        self.logger.info(f"覆盖率选择: {len(functions)}个函数中{len(candidates)}个有未覆盖语句，"
+                         f"选取{len(selected)}个，覆盖其中{gained}/{uncovered}条未覆盖语句")
+        return selected
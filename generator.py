@@ -1,22 +1,145 @@
 # 在文件顶部导入必要的模块
 import os
 import subprocess
+import threading
 import time
 import re
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 from code_analyzer import GoCodeAnalyzer
+from go_syntax import GoSyntaxChecker, format_issue
 import core.constants
-from llm_utils.llm import LLMClient
-from core.config import settings
-from llm_utils.prompts import LLM_SUPPPLY_FAILCASE_ARGS_PROMPT, LLM_MERGE_TEST_TEMPLATE, LLM_DEBUG_TEST_TEMPLATE  # 导入新模板
+from core.constants import STAGE_MERGE, STAGE_DEBUG
+from core.journal import JOURNAL_STAGE_TEMPLATE, JOURNAL_STAGE_ENRICHED, JOURNAL_STAGE_DEBUGGED, JOURNAL_STAGE_DONE
+from core.logs import log_payload
+from core.metrics import metrics
+from llm_utils.budget import DEGRADE_FAIL_ONLY, DEGRADE_TEMPLATE_ONLY
+from llm_utils.prompts import LLM_SUPPPLY_FAILCASE_ARGS_PROMPT, LLM_MERGE_TEST_TEMPLATE, LLM_DEBUG_TEST_TEMPLATE, LLM_DEBUG_PATCH_TEMPLATE  # 导入新模板
+from repair_patch import PatchError, apply_edits, parse_edits
 
 class TestTemplateGenerator:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.code_analyzer = GoCodeAnalyzer()
-        self.llm_client = LLMClient()
-        self.logger.info("LLM客户端初始化完成")
+        self.syntax_checker = GoSyntaxChecker()
+        self._llm_client = None
+        self._go_test_pool = None
+        self._test_reuse = None
+        self._package_metadata = None
+        self._init_lock = threading.Lock()
+        self.go_test_timeout = 30
+        # 可选的任务日志（core.journal.JobJournal），用于崩溃后断点续跑
+        self.journal = None
+
+    @property
+    def llm_client(self):
+        """
+        按需创建LLM客户端，仅模板模式下不会加载openai等网络依赖
+        :return: LLMClient实例
+        """
+        with self._init_lock:
+            if self._llm_client is None:
+                from llm_utils.llm import LLMClient
+                self._llm_client = LLMClient()
+                self.logger.info("LLM客户端初始化完成")
+        return self._llm_client
+
+    @property
+    def go_test_pool(self):
+        """
+        按需创建go test执行池，仅在需要验证测试时加载配置
+        :return: GoTestPool实例
+        """
+        with self._init_lock:
+            if self._go_test_pool is None:
+                from core.config import settings
+                from go_test_pool import GoTestPool
+                self.go_test_timeout = settings.go_test_timeout
+                self._go_test_pool = GoTestPool(settings.go_test_jobs, settings.go_test_gomaxprocs,
+                                                settings.go_test_cache_dir, settings.go_test_flags,
+                                                (settings.go_test_output_head_lines, settings.go_test_output_tail_lines,
+                                                 settings.go_test_output_matched_lines),
+                                                settings.go_test_output_dir)
+        return self._go_test_pool
+
+    @property
+    def test_reuse(self):
+        """
+        按需加载已验证测试的近似重复索引，配置关闭时返回None
+        :return: TestReuseStore实例或None
+        """
+        with self._init_lock:
+            if self._test_reuse is None:
+                from core.config import settings
+                if not settings.test_reuse_enabled:
+                    self._test_reuse = False
+                else:
+                    from test_reuse import TestReuseStore
+                    self._test_reuse = TestReuseStore(settings.test_reuse_dir, settings.test_reuse_threshold)
+        return self._test_reuse or None
+
+    @property
+    def package_metadata(self):
+        """
+        按需创建Go包元数据缓存，只依赖go命令，仅模板模式下也可使用
+        :return: PackageMetadata实例
+        """
+        with self._init_lock:
+            if self._package_metadata is None:
+                from package_metadata import PackageMetadata
+                self._package_metadata = PackageMetadata()
+        return self._package_metadata
+
+    def _package_name(self, dir_path: str) -> str:
+        """
+        :param dir_path: 包目录
+        :return: go list给出的包名，不在Go模块中或go命令不可用时退回目录名
+        """
+        return self.package_metadata.package_name(dir_path) or os.path.basename(os.path.abspath(dir_path))
+
+    def _has_test_main(self, dir_path: str) -> bool:
+        """
+        :param dir_path: 包目录
+        :return: 包内（含外部测试包）是否已有TestMain，包元数据不可用时扫描目录下的测试文件
+        """
+        has_test_main = self.package_metadata.has_test(dir_path, 'TestMain')
+        if has_test_main is None:
+            return self._has_test_main_in_folder(dir_path)
+        return has_test_main
+
+    def _try_reuse_test(self, func_info: Dict[str, Any], test_file_path: str, template_code: str) -> Optional[Dict[str, Any]]:
+        """
+        用相似函数已验证的测试改写出当前函数的测试并验证
+        :param func_info: 函数信息
+        :param test_file_path: 测试文件路径
+        :param template_code: 基础模板代码，验证失败时恢复
+        :return: 验证通过时返回生成结果，否则返回None
+        """
+        function_name = func_info['name']
+        match = self.test_reuse.find(func_info)
+        if not match:
+            return None
+        source = match['entry']['key']
+        self.logger.info(f"发现相似函数{source}（相似度{match['similarity']:.2f}），尝试复用其测试: {function_name}")
+        with metrics.span("reuse", source=source, similarity=match['similarity']) as span:
+            adapted_code = self.test_reuse.adapt(match['entry'], func_info)
+            self._save_test_file(test_file_path, adapted_code, function_name, mode="update")
+            test_result = self._run_go_test(os.path.dirname(test_file_path), function_name)
+            span['success'] = test_result['success']
+        if not test_result['success']:
+            self.logger.info(f"复用的测试未通过验证，改用LLM生成: {function_name}")
+            self._save_test_file(test_file_path, template_code, function_name, mode="update")
+            return None
+        self.test_reuse.add(func_info, adapted_code)
+        return {
+            'function_name': function_name,
+            'file_path': func_info['file_path'],
+            'test_file_path': test_file_path,
+            'status': 'success',
+            'message': '复用相似函数的测试，已通过验证',
+            'reused_from': source,
+            'similarity': match['similarity'],
+        }
 
     def generate_test_case(self, file_path: str, function_name: str, use_llm: bool = True, test_case_type: str = "both") -> Dict[str, Any]:
         """
@@ -27,6 +150,34 @@ class TestTemplateGenerator:
         :param test_case_type: 测试用例类型，可选值: "fail"、"success"、"both"（默认）
         :return: 生成的测试模板信息
         """
+        # 记录整个处理过程的耗时，期间各阶段的统计自动归属到该函数
+        function_key = f"{file_path}:{function_name}"
+        checkpoint = self.journal.checkpoint(function_key) if self.journal else None
+        if checkpoint and checkpoint['stage'] == JOURNAL_STAGE_DONE:
+            self.logger.info(f"任务日志中已完成，跳过: {function_key}")
+            result = dict(checkpoint['result'], resumed=True)
+            metrics.record_result(function_key, result['status'])
+            return result
+        with metrics.function_scope(function_key), metrics.span("function"):
+            result = self._generate_test_case(file_path, function_name, use_llm, test_case_type, checkpoint)
+        self._journal(function_key, JOURNAL_STAGE_DONE, result=result)
+        metrics.record_result(function_key, result['status'])
+        return result
+
+    def _journal(self, function_key: str, stage: str, **artifacts: Any) -> None:
+        """
+        向任务日志写入一次阶段转换，未启用任务日志时忽略
+        """
+        if self.journal is not None:
+            self.journal.record(function_key, stage, **artifacts)
+
+    def _generate_test_case(self, file_path: str, function_name: str, use_llm: bool, test_case_type: str,
+                            checkpoint: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        generate_test_case的具体实现
+        :param checkpoint: 任务日志中该函数最后一个未完成的阶段，有值时从该阶段继续
+        """
+        function_key = f"{file_path}:{function_name}"
         if not os.path.exists(file_path):
             self.logger.error(f"文件不存在: {file_path}")
             return {
@@ -36,9 +187,10 @@ class TestTemplateGenerator:
                 'error': f"文件不存在: {file_path}"
             }
         
-        # 分析指定文件
+        # 通过声明头索引查找指定函数，只切出该函数的函数体
         try:
-            functions = self.code_analyzer.analyze_file(file_path)
+            with metrics.span("analyze"):
+                target_func = self.code_analyzer.get_function(file_path, function_name)
         except Exception as e:
             self.logger.error(f"分析文件{file_path}失败: {str(e)}")
             return {
@@ -48,13 +200,6 @@ class TestTemplateGenerator:
                 'error': f"分析文件失败: {str(e)}"
             }
         
-        # 查找指定函数
-        target_func = None
-        for func in functions:
-            if func['name'] == function_name:
-                target_func = func
-                break
-        
         if not target_func:
             self.logger.error(f"在文件{file_path}中未找到函数{function_name}")
             return {
@@ -63,27 +208,82 @@ class TestTemplateGenerator:
                 'status': 'failed',
                 'error': f"未找到函数{function_name}"
             }
-        
+
+        if target_func['receiver']:
+            # 测试按Test{函数名}命名并以普通函数调用，方法的测试命名与调用方式尚未约定，暂不支持
+            self.logger.error(f"暂不支持为方法生成测试: {function_name}")
+            return {
+                'function_name': function_name,
+                'file_path': file_path,
+                'status': 'failed',
+                'error': f"暂不支持为方法生成测试: {function_name}，请指定包级函数名"
+            }
+
+        test_template_code = None
+        resume_stage = checkpoint['stage'] if checkpoint else None
         try:
-            # 1.生成基础测试模板
-            test_template_code = self.generate_test_case_template(target_func)
-             # 保存测试代码
             test_file_path = self._get_test_file_path(file_path)
-            self._save_test_file(test_file_path, test_template_code, function_name)
+            if resume_stage:
+                # 从最后一个持久化阶段继续，重新写入该阶段的代码，防止崩溃时测试文件未写完
+                self.logger.info(f"从任务日志恢复: 函数名={function_name}, 阶段={resume_stage}")
+                test_template_code = checkpoint['code']
+                self._save_test_file(test_file_path, test_template_code, function_name, mode="update")
+            else:
+                # 1.生成基础测试模板
+                with metrics.span("template"):
+                    test_template_code = self.generate_test_case_template(target_func)
+                # 保存测试代码
+                self._save_test_file(test_file_path, test_template_code, function_name)
+                self._journal(function_key, JOURNAL_STAGE_TEMPLATE, code=test_template_code)
+
+            if not use_llm:
+                # 仅模板模式：不调用LLM，也不进入依赖LLM的调试流程
+                self.logger.info(f"未启用LLM，仅生成测试模板: 函数名={function_name}")
+                return {
+                    'function_name': function_name,
+                    'file_path': file_path,
+                    'test_file_path': test_file_path,
+                    'status': 'success',
+                    'message': '测试模板生成成功（未启用LLM）'
+                }
             
-            # 2. 调用LLM补充测试参数
-            test_case_type = "fail"
-            self.logger.info(f"启用LLM，开始补充测试参数: 函数名={function_name}, 测试类型={test_case_type}")
-            test_template_code = self.enhance_test_with_params(file_path, function_name, test_template_code, test_case_type)
-            # 保存测试代码
-            test_file_path = self._get_test_file_path(file_path)
-            self._save_test_file(test_file_path, test_template_code, function_name, mode="update")
+            if resume_stage in (None, JOURNAL_STAGE_TEMPLATE) and self.llm_client.budget_level(function_key) >= DEGRADE_TEMPLATE_ONLY:
+                # 用量预算即将耗尽，降级为只生成模板，不中断整个运行
+                self.logger.warning(f"LLM用量预算不足，仅生成测试模板: 函数名={function_name}")
+                return {
+                    'function_name': function_name,
+                    'file_path': file_path,
+                    'test_file_path': test_file_path,
+                    'status': 'success',
+                    'message': '测试模板生成成功（LLM用量预算不足，未调用LLM）',
+                    'degraded': 'template_only'
+                }
+
+            if resume_stage is None and self.test_reuse is not None:
+                # 2. 先尝试复用相似函数已验证的测试，通过验证则不再调用LLM
+                reuse_result = self._try_reuse_test(target_func, test_file_path, test_template_code)
+                if reuse_result:
+                    return reuse_result
+
+            if resume_stage in (None, JOURNAL_STAGE_TEMPLATE):
+                # 3. 调用LLM补充测试参数
+                test_case_type = "fail"
+                self.logger.info(f"启用LLM，开始补充测试参数: 函数名={function_name}, 测试类型={test_case_type}")
+                test_template_code = self.enhance_test_with_params(file_path, function_name, test_template_code, test_case_type)
+                # 保存测试代码
+                self._save_test_file(test_file_path, test_template_code, function_name, mode="update")
+                self._journal(function_key, JOURNAL_STAGE_ENRICHED, code=test_template_code)
             
-            # 3. 验证测试代码并进行自动调试
+            # 4. 验证测试代码并进行自动调试
             self.logger.info(f"开始验证测试代码: {test_file_path}")
-            debug_result = self._validate_and_debug_test(test_file_path, function_name, test_template_code)
+            first_attempt = checkpoint.get('attempt', 0) if resume_stage == JOURNAL_STAGE_DEBUGGED else 0
+            debug_result = self._validate_and_debug_test(test_file_path, function_name, test_template_code,
+                                                         journal_key=function_key, first_attempt=first_attempt)
+            final_code = debug_result.pop('final_code', test_template_code)
             if debug_result['status'] == 'success':
                 self.logger.info(f"测试验证和调试成功: 函数名={function_name}")
+                if self.test_reuse is not None:
+                    self.test_reuse.add(target_func, final_code)
                 return {
                     'function_name': function_name,
                     'file_path': file_path,
@@ -115,6 +315,153 @@ class TestTemplateGenerator:
                 'error': f"保存测试文件失败: {str(e)}",
                 'test_template_code': test_template_code
             }
+
+    def generate_templates_for_directory(self, directory: str, function_pattern: Optional[str] = None, workers: Optional[int] = None, run_go_vet: bool = False) -> List[Dict[str, Any]]:
+        """
+        仅模板模式批量生成：分析整个目录树，为所有匹配的函数渲染测试模板并按测试文件分组写入
+        每个测试文件只读写一次，不调用LLM，也不执行go test
+        :param directory: 目录路径
+        :param function_pattern: 函数名正则表达式，为空时匹配所有函数
+        :param workers: 并行分析的进程数，为None时取CPU核数
+        :param run_go_vet: 是否在写入完成后对每个包执行一次go vet
+        :return: 每个函数的生成结果列表
+        """
+        if not os.path.isdir(directory):
+            self.logger.error(f"目录不存在: {directory}")
+            return []
+
+        name_regex = re.compile(function_pattern) if function_pattern else None
+        with metrics.span("analyze", directory=directory):
+            functions = self.code_analyzer.analyze_directory(directory, workers=workers)
+        targets = [func for func in functions if not name_regex or name_regex.search(func['name'])]
+        self.logger.info(f"共分析到{len(functions)}个函数，匹配{len(targets)}个")
+
+        # 按测试文件分组，保持函数在源文件中的顺序
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for func in targets:
+            groups.setdefault(self._get_test_file_path(func['file_path']), []).append(func)
+
+        results = []
+        # 本次运行中已写入TestMain的目录，避免同一包的多个测试文件重复生成
+        dirs_with_test_main = set()
+        written_dirs = set()
+        for test_file_path, funcs in groups.items():
+            try:
+                with metrics.span("template", test_file_path=test_file_path, functions=len(funcs)):
+                    content, file_results = self._render_test_file(test_file_path, funcs, dirs_with_test_main)
+                if content is not None:
+                    with metrics.span("save", test_file_path=test_file_path):
+                        with open(test_file_path, 'w', encoding='utf-8') as f:
+                            f.write(content)
+                    self.package_metadata.record_test_file(test_file_path, content)
+                    written_dirs.add(os.path.dirname(test_file_path))
+                    self.logger.info(f"已保存测试文件到{test_file_path}")
+                results.extend(file_results)
+            except Exception as e:
+                self.logger.error(f"保存测试文件{test_file_path}失败: {str(e)}")
+                results.extend({
+                    'function_name': func['name'],
+                    'file_path': func['file_path'],
+                    'test_file_path': test_file_path,
+                    'status': 'failed',
+                    'error': f"保存测试文件失败: {str(e)}"
+                } for func in funcs)
+
+        for result in results:
+            metrics.record_result(f"{result['file_path']}:{result['function_name']}", result['status'])
+
+        if run_go_vet:
+            vet_results = {dir_path: self._run_go_vet(dir_path) for dir_path in sorted(written_dirs)}
+            for result in results:
+                vet_result = vet_results.get(os.path.dirname(result.get('test_file_path', '')))
+                if vet_result and result['status'] == 'success':
+                    result['vet_info'] = vet_result
+                    if not vet_result['success']:
+                        result['status'] = 'success_with_warning'
+                        result['message'] = '测试模板生成成功，但go vet检查未通过'
+                        metrics.record_result(f"{result['file_path']}:{result['function_name']}", result['status'])
+
+        return results
+
+    def _render_test_file(self, test_file_path: str, funcs: List[Dict[str, Any]], dirs_with_test_main: set) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """
+        在内存中将多个函数的测试模板合并为一个测试文件的内容
+        :param test_file_path: 测试文件路径
+        :param funcs: 属于该测试文件的函数信息列表
+        :param dirs_with_test_main: 已确认存在TestMain的目录集合，会被就地更新
+        :return: (合并后的文件内容，无需写入时为None, 每个函数的生成结果列表)
+        """
+        dir_path = os.path.dirname(test_file_path)
+        content = ''
+        if os.path.exists(test_file_path):
+            with open(test_file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+
+        if dir_path not in dirs_with_test_main and self._has_test_main(dir_path):
+            dirs_with_test_main.add(dir_path)
+
+        results = []
+        changed = False
+        for func in funcs:
+            function_name = func['name']
+            result = {
+                'function_name': function_name,
+                'file_path': func['file_path'],
+                'test_file_path': test_file_path,
+                'status': 'success',
+                'message': '测试模板生成成功（未启用LLM）'
+            }
+            if f"func Test{function_name}(" in content or self.package_metadata.has_test(dir_path, f"Test{function_name}"):
+                self.logger.warning(f"函数{function_name}的测试已存在于{test_file_path}或同一包的其他测试文件")
+                result['message'] = '测试已存在，跳过生成'
+                results.append(result)
+                continue
+
+            test_template_code = self.generate_test_case_template(func)
+            if not content:
+                if dir_path in dirs_with_test_main:
+                    content = test_template_code
+                else:
+                    content = self._merge_imports(self._generate_test_main(self._package_name(dir_path)), test_template_code)
+                    dirs_with_test_main.add(dir_path)
+            else:
+                content = self._merge_imports(content, test_template_code)
+                if dir_path not in dirs_with_test_main:
+                    content = self._merge_imports(content, self._generate_test_main())
+                    dirs_with_test_main.add(dir_path)
+            changed = True
+            results.append(result)
+
+        return (content if changed else None), results
+
+    def _run_go_vet(self, package_dir: str) -> Dict[str, Any]:
+        """
+        对单个包执行go vet
+        :param package_dir: 包目录
+        :return: 检查结果
+        """
+        with metrics.span("go_vet", package_dir=package_dir):
+            self.logger.info(f"在目录 {package_dir} 执行go vet")
+            try:
+                result = subprocess.run(
+                    ['go', 'vet', '.'],
+                    cwd=package_dir,
+                    capture_output=True,
+                    text=True,
+                    timeout=120
+                )
+                return {
+                    'success': result.returncode == 0,
+                    'output': f"{result.stdout}\n{result.stderr}".strip(),
+                    'returncode': result.returncode
+                }
+            except subprocess.TimeoutExpired:
+                self.logger.error("go vet执行超时")
+                return {'success': False, 'output': 'go vet执行超时', 'returncode': -1}
+            except Exception as e:
+                self.logger.error(f"执行go vet失败: {str(e)}")
+                return {'success': False, 'output': f"执行go vet失败: {str(e)}", 'returncode': -1}
+
     def generate_test_case_template(self, func_info: Dict[str, Any]) -> str:
         """
         为单个函数生成基础测试用例模板
@@ -126,8 +473,7 @@ class TestTemplateGenerator:
         case_tags = func_info['api_tags']
         
         # 确定包名
-        target_dir = os.path.dirname(file_path)
-        package_name = os.path.basename(target_dir)
+        package_name = self._package_name(os.path.dirname(file_path))
         
         # 生成基础测试模板
         test_template = core.constants.TEST_FUNCTION_TEMPLATE.format(
@@ -150,25 +496,53 @@ class TestTemplateGenerator:
         try:
             # 获取函数的完整代码
             function_code = self.code_analyzer.get_function_code(file_path, function_name)
-            self.logger.info(f"函数代码: {function_code}")
+            log_payload(self.logger, 'function_code', "函数代码", function_code, logging.DEBUG)
+            function_code, line_map = self._compact_function_code(function_code)
             # 调用LLM补充测试参数
-            supplemented_test_template = self._supplement_test_params(function_code, function_name, test_template, test_case_type)
+            supplemented_test_template = self._supplement_test_params(function_code, function_name, test_template, test_case_type, line_map)
             return supplemented_test_template
         except Exception as e:
             self.logger.error(f"调用LLM补充测试参数失败，使用基础模板: {str(e)}")
             # 失败时返回基础模板
             return test_template
 
-    def _supplement_test_params(self, function_code: str, function_name: str, test_template: str, test_case_type: str = "both") -> str:
+    def _compact_function_code(self, function_code: str) -> Tuple[str, Optional[List[int]]]:
+        """
+        按配置压缩发送给LLM的函数代码
+        :param function_code: 函数完整代码
+        :return: (压缩后的代码, 压缩后行号到原始行号的映射)，未启用压缩时映射为None
+        """
+        from core.config import settings
+        if not settings.llm_prompt_compaction or not function_code.strip():
+            return function_code, None
+        from prompt_compactor import DEFAULT_LOG_PATTERN, GoCodeCompactor
+        compactor = GoCodeCompactor(settings.llm_prompt_elide_logs, settings.llm_prompt_log_pattern or DEFAULT_LOG_PATTERN)
+        with metrics.span("compact") as span:
+            compacted = compactor.compact(function_code)
+            span.update(original_tokens=compacted['original_tokens'], compacted_tokens=compacted['compacted_tokens'],
+                        tokens_saved=compacted['tokens_saved'])
+        self.logger.info(f"函数代码压缩: {compacted['original_tokens']} -> {compacted['compacted_tokens']} tokens")
+        log_payload(self.logger, 'function_code', "压缩后的函数代码", compacted['code'], logging.DEBUG)
+        return compacted['code'], compacted['line_map']
+
+    def _supplement_test_params(self, function_code: str, function_name: str, test_template: str, test_case_type: str = "both",
+                                line_map: Optional[List[int]] = None) -> str:
         """
         调用LLM补充测试用例参数并将结果更新到原始模板中
         :param function_code: 函数代码
         :param function_name: 函数名
         :param test_template: 测试模板
         :param test_case_type: 测试用例类型，可选值: "fail"、"success"、"both"（默认）
+        :param line_map: 函数代码经过压缩时，压缩后行号到原始行号的映射，用于换算用例注释中引用的行号
         :return: 补充参数并更新后的测试模板
         """
         try:
+            if test_case_type in ["success", "both"] and self.llm_client.budget_level() >= DEGRADE_FAIL_ONLY:
+                # 接近用量预算时先放弃成功用例
+                self.logger.warning(f"LLM用量接近预算，不再生成成功测试用例: 函数名={function_name}")
+                if test_case_type == "success":
+                    return test_template
+                test_case_type = "fail"
             self.logger.info(f"开始调用LLM补充测试参数: 函数名={function_name}, 测试类型={test_case_type}")
             
             # 初始化测试用例
@@ -179,7 +553,7 @@ class TestTemplateGenerator:
             if test_case_type in ["fail", "both"]:
                 # 生成失败测试用例
                 self.logger.info(f"生成失败测试用例: 函数名={function_name}")
-                fail_test = self.llm_client.generate_test(function_code, function_name, model_type="siliconflow", test_type="fail")
+                fail_test = self.llm_client.generate_test(function_code, function_name, test_type="fail")
                 
                 # 检查失败测试用例结果是否为空
                 if not fail_test.strip():
@@ -188,7 +562,7 @@ class TestTemplateGenerator:
             if test_case_type in ["success", "both"]:
                 # 生成成功测试用例
                 self.logger.info(f"生成成功测试用例: 函数名={function_name}")
-                success_test = self.llm_client.generate_test(function_code, function_name, model_type="siliconflow", test_type="success")
+                success_test = self.llm_client.generate_test(function_code, function_name, test_type="success")
                 
                 # 检查成功测试用例结果是否为空
                 if not success_test.strip():
@@ -206,6 +580,9 @@ class TestTemplateGenerator:
                 self.logger.warning(f"LLM返回空测试用例结果，使用基础模板")
                 return test_template
             
+            if line_map:
+                from prompt_compactor import restore_code_line_references
+                combined_test = restore_code_line_references(combined_test, line_map)
             self.logger.info(f"LLM调用成功，生成的测试代码总长度: {len(combined_test)}")
             
             # 使用从prompts.py导入的模板，而不是内联定义
@@ -214,17 +591,21 @@ class TestTemplateGenerator:
                 supplemented_test=combined_test
             )
             
-            # 调用LLM执行合并操作
-            merged_test_template = self.llm_client.generate_test(merge_prompt, function_name, model_type="siliconflow")
+            # 调用LLM执行合并操作，合并是机械性工作，先使用阶段配置的廉价模型
+            merged_test_template = self.llm_client.generate_test(merge_prompt, function_name, stage=STAGE_MERGE)
+            cleaned_test = self._gate_generated_code(merged_test_template, function_name)
+            
+            # 合并结果未通过校验时升级到强模型重试
+            if not self._is_valid_merge(cleaned_test, function_name) and self.llm_client.can_escalate(STAGE_MERGE):
+                self.logger.warning(f"廉价模型合并结果未通过校验，升级到强模型重试: 函数名={function_name}")
+                merged_test_template = self.llm_client.generate_test(merge_prompt, function_name, stage=STAGE_MERGE, escalate=True)
+                cleaned_test = self._gate_generated_code(merged_test_template, function_name)
             
             # 检查合并结果是否为空
-            if not merged_test_template.strip():
+            if not cleaned_test.strip():
                 self.logger.warning(f"LLM合并模板失败，使用生成的测试代码")
                 return combined_test
             
-            # 清理生成的代码，移除非代码内容
-            cleaned_test = self._clean_generated_code(merged_test_template)
-            
             self.logger.info(f"LLM成功将测试参数合并到模板中，合并后代码长度: {len(cleaned_test)}")
             return cleaned_test
         except Exception as e:
@@ -232,6 +613,36 @@ class TestTemplateGenerator:
             # 失败时返回原始模板
             return test_template
 
+    def _is_valid_merge(self, code: str, function_name: str) -> bool:
+        """
+        校验合并结果：必须包含目标测试函数且通过语法检查
+        :param code: 清理后的合并代码
+        :param function_name: 函数名
+        :return: 是否通过校验
+        """
+        if f"func Test{function_name}(" not in code:
+            return False
+        return self.syntax_checker.check(code) is None
+
+    def _gate_generated_code(self, code: str, function_name: str) -> str:
+        """
+        清理LLM输出并做语法快速检查，自动裁剪前后的说明文字与被截断的声明
+        :param code: LLM输出
+        :param function_name: 函数名
+        :return: 清理后的代码，输出为空时返回空字符串
+        """
+        if not code.strip():
+            return ""
+        cleaned = self._clean_generated_code(code)
+        with metrics.span("syntax_gate") as span:
+            trimmed, issue = self.syntax_checker.trim(cleaned)
+            span.update(trimmed=trimmed != cleaned, ok=issue is None)
+        if trimmed != cleaned:
+            self.logger.info(f"已自动裁剪LLM输出中的非代码内容: 函数名={function_name}")
+        if issue:
+            self.logger.warning(f"LLM输出未通过语法检查: 函数名={function_name}, {format_issue(issue)}")
+        return trimmed
+
     def _clean_generated_code(self, code: str) -> str:
         """
         清理生成的代码，移除非代码内容
@@ -286,12 +697,15 @@ class TestTemplateGenerator:
         return os.path.join(dir_name, f"{base_name}_test.go")
     
 
-    def _validate_and_debug_test(self, test_file_path: str, function_name: str, test_code: str) -> Dict[str, Any]:
+    def _validate_and_debug_test(self, test_file_path: str, function_name: str, test_code: str,
+                                 journal_key: Optional[str] = None, first_attempt: int = 0) -> Dict[str, Any]:
         """
         验证测试代码并在失败时进行自动调试
         :param test_file_path: 测试文件路径
         :param function_name: 函数名
         :param test_code: 初始测试代码
+        :param journal_key: 任务日志中的函数标识，每轮调试后的代码会写入任务日志
+        :param first_attempt: 起始轮次，从任务日志恢复时跳过已完成的调试轮次
         :return: 验证和调试结果
         """
         max_debug_attempts = 5  # 最大调试次数
@@ -300,28 +714,58 @@ class TestTemplateGenerator:
         # 获取测试文件所在目录
         test_dir = os.path.dirname(test_file_path)
         
-        for attempt in range(max_debug_attempts):
+        from core.config import settings
+        repair_mode = settings.llm_repair_mode
+        
+        # 首次修复使用廉价模型，修复后仍未通过测试则升级到强模型
+        escalate = False
+        test_result = {'output': ''}
+        failure_reason = '达到最大调试次数或调试过程中出错'
+        for attempt in range(first_attempt, max_debug_attempts):
             self.logger.info(f"第{attempt + 1}次测试验证尝试")
             
-            # 执行测试命令
-            test_result = self._run_go_test(test_dir, function_name)
+            # 先做语法快速检查，有问题时不执行go test，直接把解析错误交给调试
+            issue = self.syntax_checker.check(current_code)
+            if issue:
+                self.logger.warning(f"测试代码未通过语法检查，跳过go test: {format_issue(issue)}")
+                test_result = {
+                    'success': False,
+                    'output': f"语法检查失败（未执行go test）: {format_issue(issue)}",
+                    'returncode': -1
+                }
+            else:
+                # 执行测试命令
+                test_result = self._run_go_test(test_dir, function_name)
             
             if test_result['success']:
                 self.logger.info(f"测试通过: {function_name}")
                 return {
                     'status': 'success',
+                    'final_code': current_code,
                     'attempts': attempt + 1,
                     'last_output': test_result['output']
                 }
             
             # 测试失败，调用大模型进行调试
+            if self.llm_client.budget_level() >= DEGRADE_TEMPLATE_ONLY:
+                self.logger.warning(f"LLM用量预算不足，停止调试: {function_name}")
+                failure_reason = 'LLM用量预算不足，停止调试'
+                break
             self.logger.warning(f"测试失败，开始调试: {function_name}")
             try:
-                # 准备调试提示
-                debug_prompt = self._prepare_debug_prompt(function_name, current_code, test_result['output'])
-                
                 # 调用LLM进行调试
-                debugged_code = self.llm_client.generate_test(debug_prompt, function_name, model_type="siliconflow")
+                if attempt > 0 and not escalate and self.llm_client.can_escalate(STAGE_DEBUG):
+                    self.logger.info(f"廉价模型修复未通过测试，升级到强模型: {function_name}")
+                    escalate = True
+                # 优先让LLM只返回局部修改，无法应用时再要求重写完整代码
+                debugged_code = None
+                if repair_mode == "patch":
+                    debugged_code = self._repair_with_patch(function_name, current_code, test_result['output'], escalate)
+                if debugged_code is None:
+                    debug_prompt = self._prepare_debug_prompt(function_name, current_code, test_result['output'])
+                    debugged_code = self._gate_generated_code(
+                        self.llm_client.generate_test(debug_prompt, function_name, stage=STAGE_DEBUG, escalate=escalate),
+                        function_name)
                 
                 if not debugged_code.strip():
                     self.logger.error("大模型返回空的调试结果")
@@ -330,6 +774,9 @@ class TestTemplateGenerator:
                 # 更新当前代码并保存
                 current_code = debugged_code
                 self._save_test_file(test_file_path, current_code, function_name, mode="update")
+                if journal_key:
+                    self._journal(journal_key, JOURNAL_STAGE_DEBUGGED, code=current_code, attempt=attempt + 1,
+                                  test_output=test_result['output'])
                 
                 self.logger.info(f"大模型调试成功，已更新测试代码: {function_name}")
             except Exception as e:
@@ -341,7 +788,7 @@ class TestTemplateGenerator:
             'status': 'failed',
             'attempts': max_debug_attempts,
             'last_output': test_result['output'],
-            'error': '达到最大调试次数或调试过程中出错'
+            'error': failure_reason
         }
         
     def _run_go_test(self, test_dir: str, function_name: str) -> Dict[str, Any]:
@@ -351,48 +798,80 @@ class TestTemplateGenerator:
         :param function_name: 函数名
         :return: 测试结果
         """
-        test_func_name = f"Test{function_name}"
-        command = f"go test -timeout 30s -run {test_func_name} -v"
+        with metrics.span("go_test", test_dir=test_dir) as span:
+            pool = self.go_test_pool
+            test_func_name = f"Test{function_name}"
+            args = ['test', '-timeout', f"{self.go_test_timeout}s", '-run', test_func_name, '-v']
         
-        self.logger.info(f"在目录 {test_dir} 执行测试命令: {command}")
+            self.logger.info(f"在目录 {test_dir} 执行测试命令: go {' '.join(args)}")
         
-        try:
-            # 执行命令并捕获输出
-            result = subprocess.run(
-                command, 
-                shell=True, 
-                cwd=test_dir, 
-                capture_output=True, 
-                text=True, 
-                timeout=30  # 设置超时时间
-            )
-            
-            # 组合标准输出和标准错误
-            output = f"{result.stdout}\n{result.stderr}"
+            try:
+                # 只保留输出的开头、结尾与失败相关的行，完整输出被截断时另存为压缩文件
+                result = pool.run(test_dir, args, timeout=self.go_test_timeout,
+                                  keep_pattern=re.escape(test_func_name), output_name=test_func_name)
+                output = result['output']
+                span.update(queue_wait=result['queue_wait'], output_lines=result['output_lines'])
+                if result['output_path']:
+                    self.logger.info(f"go test输出共{result['output_lines']}行，完整输出已保存到{result['output_path']}")
+                    output = f"{output}\n（输出共{result['output_lines']}行，已省略部分内容）"
+                if result['timed_out']:
+                    self.logger.error("测试执行超时")
+                    span['error'] = 'timeout'
+                    return {
+                        'success': False,
+                        'output': f"测试执行超时\n{output}",
+                        'returncode': -1
+                    }
             
-            # 判断测试是否成功
-            success = result.returncode == 0 and "PASS" in output
+                # 判断测试是否成功
+                success = result['returncode'] == 0 and "PASS" in output
+                span.update(success=success, returncode=result['returncode'])
             
-            return {
-                'success': success,
-                'output': output,
-                'returncode': result.returncode
-            }
-        except subprocess.TimeoutExpired:
-            self.logger.error("测试执行超时")
-            return {
-                'success': False,
-                'output': '测试执行超时',
-                'returncode': -1
-            }
-        except Exception as e:
-            self.logger.error(f"执行测试命令失败: {str(e)}")
-            return {
-                'success': False,
-                'output': f"执行测试命令失败: {str(e)}",
-                'returncode': -1
-            }
+                return {
+                    'success': success,
+                    'output': output,
+                    'returncode': result['returncode']
+                }
+            except Exception as e:
+                self.logger.error(f"执行测试命令失败: {str(e)}")
+                return {
+                    'success': False,
+                    'output': f"执行测试命令失败: {str(e)}",
+                    'returncode': -1
+                }
             
+    def _repair_with_patch(self, function_name: str, current_code: str, test_output: str, escalate: bool) -> Optional[str]:
+        """
+        让LLM以JSON修改列表的形式给出修复，在本地应用并做语法检查
+        :param function_name: 函数名
+        :param current_code: 当前的测试代码
+        :param test_output: 测试输出结果
+        :param escalate: 是否使用强模型
+        :return: 修改后的代码，修改无法解析、无法应用或未通过语法检查时返回None
+        """
+        prompt = LLM_DEBUG_PATCH_TEMPLATE.format(
+            function_name=function_name,
+            current_code=current_code,
+            test_output=test_output
+        )
+        response = self.llm_client.generate_test(prompt, function_name, stage=STAGE_DEBUG, escalate=escalate)
+        with metrics.span("patch") as span:
+            try:
+                edits = parse_edits(response)
+                patched_code = apply_edits(current_code, edits, test_function=f"Test{function_name}")
+            except PatchError as e:
+                self.logger.warning(f"局部修改无法应用，改为完整重写: 函数名={function_name}, {str(e)}")
+                span['error'] = 'patch'
+                return None
+            span['edits'] = len(edits)
+            issue = self.syntax_checker.check(patched_code)
+            if issue:
+                self.logger.warning(f"应用局部修改后未通过语法检查，改为完整重写: 函数名={function_name}, {format_issue(issue)}")
+                span['error'] = 'syntax'
+                return None
+        self.logger.info(f"已应用{len(edits)}处局部修改: 函数名={function_name}")
+        return patched_code
+
     def _prepare_debug_prompt(self, function_name: str, current_code: str, test_output: str) -> str:
         """
         准备调试提示信息
@@ -524,73 +1003,75 @@ class TestTemplateGenerator:
         :param function_name: 函数名
         :param mode: 保存模式，可选值: "add"（默认，仅当测试不存在时添加）或 "update"（覆盖已存在的测试）
         """
-        # 检查文件是否存在
-        if os.path.exists(test_file_path):
-            # 文件存在，检查是否已有该函数的测试
-            with open(test_file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+        with metrics.span("save", test_file_path=test_file_path, mode=mode):
+            # 检查文件是否存在
+            if os.path.exists(test_file_path):
+                # 文件存在，检查是否已有该函数的测试
+                with open(test_file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
                 
-            # 检查是否已有该函数的测试
-            test_func_name = f"Test{function_name}"
-            has_test_func = f"func {test_func_name}(" in content
+                # 检查是否已有该函数的测试
+                test_func_name = f"Test{function_name}"
+                has_test_func = f"func {test_func_name}(" in content
             
-            if has_test_func and mode == "add":
-                self.logger.warning(f"函数{function_name}的测试已存在于{test_file_path}")
-                return
-            elif has_test_func and mode == "update":
-                # 移除已存在的测试函数
-                self.logger.info(f"更新函数{function_name}的测试用例")
-                # 找到函数的开始和结束位置
-                func_start_pos = content.find(f"func {test_func_name}(")
-                if func_start_pos != -1:
-                    # 查找函数的结束位置（需要找到匹配的花括号）
-                    brace_count = 0
-                    i = func_start_pos
-                    while i < len(content):
-                        if content[i] == '{':
-                            brace_count += 1
-                        elif content[i] == '}':
-                            brace_count -= 1
-                            if brace_count == 0:
-                                break
-                        i += 1
-                    # 移除旧的测试函数
-                    content = content[:func_start_pos] + content[i+1:]
+                if has_test_func and mode == "add":
+                    self.logger.warning(f"函数{function_name}的测试已存在于{test_file_path}")
+                    return
+                elif has_test_func and mode == "update":
+                    # 移除已存在的测试函数
+                    self.logger.info(f"更新函数{function_name}的测试用例")
+                    # 找到函数的开始和结束位置
+                    func_start_pos = content.find(f"func {test_func_name}(")
+                    if func_start_pos != -1:
+                        # 查找函数的结束位置（需要找到匹配的花括号）
+                        brace_count = 0
+                        i = func_start_pos
+                        while i < len(content):
+                            if content[i] == '{':
+                                brace_count += 1
+                            elif content[i] == '}':
+                                brace_count -= 1
+                                if brace_count == 0:
+                                    break
+                            i += 1
+                        # 移除旧的测试函数
+                        content = content[:func_start_pos] + content[i+1:]
             
-            # 检查文件夹下是否已有TestMain函数
-            dir_path = os.path.dirname(test_file_path)
-            has_test_main = self._has_test_main_in_folder(dir_path)
+                # 检查文件夹下是否已有TestMain函数
+                dir_path = os.path.dirname(test_file_path)
+                has_test_main = self._has_test_main(dir_path)
             
-            test_main_code = ""
-            if not has_test_main:
-                test_main_code = self._generate_test_main()
-            # 使用_merge_imports方法合并测试函数代码，确保import语句不重复
-            content = self._merge_imports(content, test_template_code)
+                test_main_code = ""
+                if not has_test_main:
+                    test_main_code = self._generate_test_main()
+                # 使用_merge_imports方法合并测试函数代码，确保import语句不重复
+                content = self._merge_imports(content, test_template_code)
             
-            # 如果需要添加TestMain函数
-            if test_main_code:
-                content = self._merge_imports(content, test_main_code)
-        else:
-            # 文件不存在，创建新文件
-            # 为新文件添加package声明
-            dir_path = os.path.dirname(test_file_path)
-            package_name = os.path.basename(dir_path)
+                # 如果需要添加TestMain函数
+                if test_main_code:
+                    content = self._merge_imports(content, test_main_code)
+            else:
+                # 文件不存在，创建新文件
+                # 为新文件添加package声明
+                dir_path = os.path.dirname(test_file_path)
+                package_name = self._package_name(dir_path)
             
-            # 检查文件夹下是否已有TestMain函数
-            has_test_main = self._has_test_main_in_folder(dir_path)
+                # 检查包内是否已有TestMain函数
+                has_test_main = self._has_test_main(dir_path)
             
-            test_main_code = ""
-            if not has_test_main:
-                test_main_code = self._generate_test_main(package_name)
-                content = self._merge_imports(test_main_code, test_template_code)
-            else:
-                content = test_template_code
+                test_main_code = ""
+                if not has_test_main:
+                    test_main_code = self._generate_test_main(package_name)
+                    content = self._merge_imports(test_main_code, test_template_code)
+                else:
+                    content = test_template_code
         
-        # 保存文件
-        with open(test_file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+            # 保存文件
+            with open(test_file_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            self.package_metadata.record_test_file(test_file_path, content)
         
-        self.logger.info(f"已保存测试文件到{test_file_path}")
+            self.logger.info(f"已保存测试文件到{test_file_path}")
 
     def _has_test_main_in_folder(self, folder_path: str) -> bool:
         """
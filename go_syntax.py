@@ -0,0 +1,146 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from code_analyzer import tokenize_go
+
+# 顶层只允许出现的声明关键字
+TOP_LEVEL_KEYWORDS = frozenset(('package', 'import', 'func', 'type', 'var', 'const'))
+# 行尾为这些词法单元时按Go规则自动插入分号，下一行开始新的语句/声明
+_SEMICOLON_KINDS = frozenset(('ident', 'number', 'string', 'rune'))
+_SEMICOLON_TEXTS = frozenset(('break', 'continue', 'fallthrough', 'return', '++', '--', ')', ']', '}'))
+_CLOSING = {')': '(', ']': '[', '}': '{'}
+_DECL_LINE = re.compile(r'^(package|import|func|type|var|const)\b', re.MULTILINE)
+
+
+def _fence_at(code: str, offset: int) -> bool:
+    """
+    :return: 偏移处是否为行首（允许前导空白）的Markdown代码块标记```
+    """
+    line_start = code.rfind('\n', 0, offset) + 1
+    return code.startswith('```', offset) and not code[line_start:offset].strip()
+
+
+def _find_fence(code: str) -> int:
+    """
+    查找字符串与注释之外的第一个代码块标记，注释中作为示例出现的```不算
+    :return: 标记的偏移，没有时返回-1
+    """
+    for _, text, offset in tokenize_go(code):
+        if text.startswith('`') and _fence_at(code, offset):
+            return offset
+    return -1
+
+
+def format_issue(issue: Dict[str, Any]) -> str:
+    """
+    :return: 形如"第3行第5列: 缺少匹配的}"的描述
+    """
+    return f"第{issue['line']}行第{issue['column']}列: {issue['message']}"
+
+
+class GoSyntaxChecker:
+    """
+    基于词法单元的Go语法快速检查
+
+    不是完整的Go解析器，只检查LLM输出中常见的问题：残留的Markdown代码块标记、
+    未闭合的字符串/注释、括号不配对或被截断、顶层混入说明文字等，毫秒级完成，不依赖Go工具链。
+    """
+
+    def check(self, code: str) -> Optional[Dict[str, Any]]:
+        """
+        检查代码
+        :param code: Go代码（完整文件或若干顶层声明）
+        :return: 第一个问题，包含line、column、offset、kind与message；没有问题时返回None
+        """
+        return self._scan(code)[0]
+
+    def _scan(self, code: str) -> Tuple[Optional[Dict[str, Any]], List[int]]:
+        """
+        :return: (第一个问题, 各顶层声明的起始偏移)
+        """
+        def issue(offset: int, kind: str, message: str) -> Tuple[Dict[str, Any], List[int]]:
+            line = code.count('\n', 0, offset) + 1
+            column = offset - (code.rfind('\n', 0, offset) + 1) + 1
+            return {'line': line, 'column': column, 'offset': offset, 'kind': kind, 'message': message}, decl_starts
+
+        decl_starts: List[int] = []
+        stack: List[Tuple[str, int]] = []
+        expect_decl = True
+        last = None
+        tokens = tokenize_go(code, keep_space=True)
+        for index, (kind, text, offset) in enumerate(tokens):
+            if kind == 'space' or kind == 'comment' and '\n' not in text:
+                continue
+            if kind == 'newline' or kind == 'comment':
+                # 换行（或跨行注释）处按Go规则插入分号，顶层的下一条必须是新的声明
+                if not stack and last is not None and (last[0] in _SEMICOLON_KINDS or last[1] in _SEMICOLON_TEXTS):
+                    expect_decl = True
+                continue
+            if text.startswith('`') and _fence_at(code, offset):
+                # 只有出现在词法单元边界上的```才是残留标记，字符串与注释内部的不算
+                return issue(offset, 'stray', "残留的Markdown代码块标记```")
+            if kind == 'error':
+                if text in '"`\'':
+                    return issue(offset, 'unterminated', f"未闭合的字面量{text}")
+                return issue(offset, 'stray', f"非法字符{text!r}")
+            if text == '/' and index + 1 < len(tokens) and tokens[index + 1][1] == '*' and tokens[index + 1][2] == offset + 1:
+                return issue(offset, 'unterminated', "未闭合的块注释/*")
+
+            if not stack:
+                if text == ';':
+                    expect_decl = True
+                    last = (kind, text)
+                    continue
+                if expect_decl:
+                    if text not in TOP_LEVEL_KEYWORDS:
+                        return issue(offset, 'stray', f"顶层应为声明，实际为{text!r}")
+                    decl_starts.append(offset)
+                    expect_decl = False
+
+            if text in '([{':
+                stack.append((text, offset))
+            elif text in _CLOSING:
+                if not stack:
+                    return issue(offset, 'unbalanced', f"多余的{text}")
+                opening, _ = stack.pop()
+                if opening != _CLOSING[text]:
+                    return issue(offset, 'unbalanced', f"{opening}与{text}不匹配")
+            last = (kind, text)
+
+        if stack:
+            opening, offset = stack[-1]
+            expected = {value: key for key, value in _CLOSING.items()}[opening]
+            return issue(len(code), 'eof', f"代码意外结束，第{code.count(chr(10), 0, offset) + 1}行的{opening}缺少匹配的{expected}")
+        return None, decl_starts
+
+    def trim(self, code: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        自动裁剪常见的输出问题：代码前的说明文字、代码块标记、代码后的说明文字、被截断的最后一个声明
+        :param code: Go代码
+        :return: (裁剪后的代码, 裁剪后仍存在的第一个问题)
+        """
+        # 去掉第一个顶层声明之前的说明文字与代码块标记
+        first_decl = _DECL_LINE.search(code)
+        if first_decl:
+            code = code[first_decl.start():]
+        # 代码块结束标记及其后的说明文字，字符串与注释中的```不是结束标记
+        fence = _find_fence(code)
+        if fence > 0:
+            code = code[:fence].rstrip() + '\n'
+        for _ in range(8):
+            problem, decl_starts = self._scan(code)
+            if problem is None:
+                return code, None
+            if problem['kind'] == 'stray' and decl_starts and problem['offset'] > decl_starts[-1]:
+                # 完整声明之后混入的说明文字，截掉其后的内容
+                cut = code.rfind('\n', 0, problem['offset']) + 1
+            elif problem['kind'] == 'eof' and len(decl_starts) > 1:
+                # 输出被截断，丢弃最后一个未写完的声明
+                cut = decl_starts[-1]
+            else:
+                return code, problem
+            trimmed = code[:cut].rstrip() + '\n'
+            if not trimmed.strip() or trimmed == code:
+                return code, problem
+            code = trimmed
+        return code, self.check(code)
@@ -0,0 +1,296 @@
+import collections
+import gzip
+import hashlib
+import logging
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# 单个go test任务（编译+运行）的内存估算，用于按可用内存限制并发数
+GO_TEST_JOB_MEMORY_MB = 1024
+# 未指定时每个任务使用的GOMAXPROCS，go build内部也按此并行编译
+DEFAULT_JOB_GOMAXPROCS = 2
+# go命令输出保留的开头行数、结尾行数与中间匹配失败模式的最多行数
+DEFAULT_HEAD_LINES = 200
+DEFAULT_TAIL_LINES = 200
+DEFAULT_MATCHED_LINES = 300
+# 保留的单行最大字符数，超长的日志行截断
+MAX_LINE_CHARS = 2000
+# 每次从管道读取的最大字节数，没有换行的超长输出也不会一次读入内存
+_READ_CHUNK = 64 * 1024
+# 输出中间部分需要保留的行：失败与panic、断言信息（编译错误很短，总在开头保留的部分中）
+FAILURE_PATTERN = r'--- FAIL|^FAIL\b|^(ok|PASS)\b|panic:|Error Trace:|Error:|(?i:\b(expected|actual|got|want)\b)'
+
+
+def available_cpus() -> int:
+    """
+    :return: 当前进程可用的CPU数（考虑CPU亲和性）
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def available_memory_mb() -> Optional[int]:
+    """
+    读取/proc/meminfo中的MemAvailable
+    :return: 可用内存（MB），无法获取时返回None
+    """
+    try:
+        with open('/proc/meminfo', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def default_pool_size(job_gomaxprocs: int = DEFAULT_JOB_GOMAXPROCS) -> int:
+    """
+    按CPU数与可用内存计算并发的go test任务数
+    :param job_gomaxprocs: 每个任务的GOMAXPROCS
+    :return: 并发数，至少为1
+    """
+    jobs = available_cpus() // max(1, job_gomaxprocs)
+    memory_mb = available_memory_mb()
+    if memory_mb is not None:
+        jobs = min(jobs, memory_mb // GO_TEST_JOB_MEMORY_MB)
+    return max(1, jobs)
+
+
+class BoundedOutput:
+    """
+    有界的命令输出
+
+    逐块读取管道，只保留开头、结尾以及中间匹配失败模式的行，内存占用与输出总量无关；
+    完整输出同时写入gzip压缩文件，输出没有被截断时删除该文件。
+    """
+
+    def __init__(self, head_lines: int = DEFAULT_HEAD_LINES, tail_lines: int = DEFAULT_TAIL_LINES,
+                 matched_lines: int = DEFAULT_MATCHED_LINES, keep_pattern: Optional[str] = None,
+                 spill_path: Optional[str] = None):
+        """
+        :param head_lines: 保留的开头行数
+        :param tail_lines: 保留的结尾行数
+        :param matched_lines: 中间部分最多保留的匹配行数
+        :param keep_pattern: 额外需要保留的行的正则，如目标测试函数名
+        :param spill_path: 完整输出的gzip文件路径，为None时不保存
+        """
+        self.head_lines = head_lines
+        self.matched_limit = matched_lines
+        self.pattern = re.compile(f"{FAILURE_PATTERN}|{keep_pattern}" if keep_pattern else FAILURE_PATTERN)
+        self.spill_path = spill_path
+        self.lines = 0
+        self.bytes = 0
+        self._head: List[Tuple[int, str]] = []
+        self._tail: Deque[Tuple[int, str]] = collections.deque(maxlen=tail_lines)
+        self._matched: List[Tuple[int, str]] = []
+        self._dropped_matches = 0
+        self._lock = threading.Lock()
+        self._spill = None
+        if spill_path:
+            os.makedirs(os.path.dirname(os.path.abspath(spill_path)), exist_ok=True)
+            self._spill = gzip.open(spill_path, 'wb', compresslevel=6)
+
+    def consume(self, stream) -> None:
+        """
+        读取二进制流直到结束
+        :param stream: 进程的stdout管道
+        """
+        partial = False
+        while True:
+            chunk = stream.readline(_READ_CHUNK)
+            if not chunk:
+                break
+            if self._spill:
+                try:
+                    self._spill.write(chunk)
+                except OSError as e:
+                    # 磁盘写满等情况下放弃完整输出，继续读取管道，避免子进程阻塞
+                    logging.getLogger(__name__).warning(f"保存完整输出失败: {str(e)}")
+                    self._spill.close()
+                    self._spill = None
+                    self.spill_path = None
+            # 超长行的后续部分只写入完整输出，保留的行中已截断
+            if not partial:
+                self._keep(chunk.decode('utf-8', errors='replace').rstrip('\r\n'))
+            with self._lock:
+                self.bytes += len(chunk)
+            partial = not chunk.endswith(b'\n')
+
+    def _keep(self, line: str) -> None:
+        if len(line) > MAX_LINE_CHARS:
+            line = f"{line[:MAX_LINE_CHARS]}...（该行共{len(line)}个字符，已截断）"
+        with self._lock:
+            entry = (self.lines, line)
+            self.lines += 1
+            if len(self._head) < self.head_lines:
+                self._head.append(entry)
+                return
+            # 即将移出结尾窗口的行按模式决定是否保留；不保留结尾时直接判断当前行
+            if not self._tail.maxlen:
+                evicted = entry
+            elif len(self._tail) == self._tail.maxlen:
+                evicted = self._tail[0]
+            else:
+                evicted = None
+            if evicted is not None and self.pattern.search(evicted[1]):
+                if len(self._matched) < self.matched_limit:
+                    self._matched.append(evicted)
+                else:
+                    self._dropped_matches += 1
+            self._tail.append(entry)
+
+    @property
+    def truncated(self) -> bool:
+        """
+        :return: 是否有行没有被保留
+        """
+        with self._lock:
+            return self.lines > len(self._head) + len(self._matched) + len(self._tail)
+
+    def text(self) -> str:
+        """
+        :return: 保留的输出，省略的部分以"... 省略N行 ..."标出
+        """
+        with self._lock:
+            kept = self._head + self._matched + list(self._tail)
+            dropped_matches = self._dropped_matches
+            total = self.lines
+        parts = []
+        previous = -1
+        for index, line in kept:
+            if index - previous > 1:
+                parts.append(f"... 省略{index - previous - 1}行 ...")
+            parts.append(line)
+            previous = index
+        if total - previous > 1:
+            parts.append(f"... 省略{total - previous - 1}行 ...")
+        if dropped_matches:
+            parts.append(f"... 另有{dropped_matches}行失败信息未保留 ...")
+        return '\n'.join(parts)
+
+    def close(self) -> Optional[str]:
+        """
+        关闭完整输出文件，输出没有被截断时删除
+        :return: 完整输出文件路径，未保存时返回None
+        """
+        if self._spill:
+            self._spill.close()
+            self._spill = None
+            if not self.truncated:
+                os.remove(self.spill_path)
+                self.spill_path = None
+        return self.spill_path
+
+
+class GoTestPool:
+    """
+    有界的go test执行池
+
+    - 并发数按CPU与内存限制，每个任务限制GOMAXPROCS，避免多个go test相互抢占CPU
+    - 所有任务共享同一个GOCACHE与GOFLAGS，编译产物可以复用
+    - 同一个包同时只有一个任务在编译/运行，其余任务按到达顺序排队
+    - 不经过shell直接执行，超时后杀死整个进程组（包括go build派生的编译器和测试二进制）
+    """
+
+    def __init__(self, max_jobs: int = 0, job_gomaxprocs: int = 0, gocache: str = "", goflags: str = "",
+                 output_limits: Tuple[int, int, int] = (DEFAULT_HEAD_LINES, DEFAULT_TAIL_LINES, DEFAULT_MATCHED_LINES),
+                 output_dir: str = ""):
+        """
+        :param max_jobs: 最大并发任务数，0表示按CPU与内存自动计算
+        :param job_gomaxprocs: 每个任务的GOMAXPROCS，0表示使用默认值
+        :param gocache: 共享的GOCACHE目录，为空时使用go的默认缓存目录
+        :param goflags: 共享的GOFLAGS，为空时沿用当前环境
+        :param output_limits: 输出保留的开头行数、结尾行数与中间匹配行数
+        :param output_dir: 被截断输出的完整内容（gzip）保存目录，为空时不保存
+        """
+        self.logger = logging.getLogger(__name__)
+        self.job_gomaxprocs = job_gomaxprocs or DEFAULT_JOB_GOMAXPROCS
+        self.output_limits = output_limits
+        self.output_dir = output_dir
+        self.max_jobs = max_jobs or default_pool_size(self.job_gomaxprocs)
+        self._slots = threading.BoundedSemaphore(self.max_jobs)
+        self._package_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.env = dict(os.environ)
+        self.env['GOMAXPROCS'] = str(self.job_gomaxprocs)
+        if gocache:
+            os.makedirs(gocache, exist_ok=True)
+            self.env['GOCACHE'] = os.path.abspath(gocache)
+        if goflags:
+            self.env['GOFLAGS'] = goflags
+        self.logger.info(f"go test执行池: 并发{self.max_jobs}, 每个任务GOMAXPROCS={self.job_gomaxprocs}")
+
+    def _package_lock(self, package_dir: str) -> threading.Lock:
+        key = os.path.abspath(package_dir)
+        with self._locks_guard:
+            return self._package_locks.setdefault(key, threading.Lock())
+
+    def run(self, package_dir: str, args: List[str], timeout: float, keep_pattern: Optional[str] = None,
+            output_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        在包目录执行一次go命令，stdout与stderr合并后逐块读取到有界缓冲
+        :param package_dir: 包目录
+        :param args: go之后的参数，如['test', '-run', 'TestX', '-v']
+        :param timeout: 超时时间（秒），超时后杀死整个进程组
+        :param keep_pattern: 输出中间部分额外保留的行的正则
+        :param output_name: 完整输出文件名的一部分，为None或未配置输出目录时不保存完整输出
+        :return: 包含output、returncode、timed_out、排队等待时间queue_wait、输出总行数output_lines、
+                 总字节数output_bytes与完整输出文件output_path（未截断时为None）的字典
+        """
+        spill_path = None
+        if self.output_dir and output_name:
+            digest = hashlib.sha1(os.path.abspath(package_dir).encode('utf-8')).hexdigest()[:10]
+            spill_path = os.path.join(self.output_dir, f"{output_name}-{digest}-{time.time_ns()}.log.gz")
+        head_lines, tail_lines, matched_lines = self.output_limits
+        wait_start = time.perf_counter()
+        with self._package_lock(package_dir), self._slots:
+            queue_wait = time.perf_counter() - wait_start
+            capture = BoundedOutput(head_lines, tail_lines, matched_lines, keep_pattern, spill_path)
+            process = subprocess.Popen(
+                ['go', *args],
+                cwd=package_dir,
+                env=self.env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+            reader = threading.Thread(target=capture.consume, args=(process.stdout,), name="go-output", daemon=True)
+            reader.start()
+            try:
+                process.wait(timeout=timeout)
+                timed_out = False
+            except subprocess.TimeoutExpired:
+                self._kill_group(process)
+                process.wait()
+                timed_out = True
+            except BaseException:
+                self._kill_group(process)
+                process.wait()
+                raise
+            finally:
+                reader.join()
+                process.stdout.close()
+                output_path = capture.close()
+        return {
+            'output': capture.text(),
+            'returncode': process.returncode,
+            'timed_out': timed_out,
+            'queue_wait': queue_wait,
+            'output_lines': capture.lines,
+            'output_bytes': capture.bytes,
+            'output_path': output_path,
+        }
+
+    def _kill_group(self, process: subprocess.Popen) -> None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
@@ -1,4 +1,10 @@
 # llm_utils包初始化文件
-from .llm import LLMClient
+# LLMClient按需导入：仅使用提示模板时不加载openai等重型依赖
+__all__ = ['LLMClient']
 
-__all__ = ['LLMClient']
\ No newline at end of file
+
+def __getattr__(name):
+    if name == 'LLMClient':
+        from .llm import LLMClient
+        return LLMClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
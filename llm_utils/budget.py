@@ -0,0 +1,163 @@
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# 预算的范围与计量项
+BUDGET_SCOPES = ('run', 'package', 'function')
+BUDGET_METRICS = ('input_tokens', 'output_tokens', 'cost')
+
+# 降级等级，数值越大越节省
+DEGRADE_NONE = 0
+DEGRADE_FAIL_ONLY = 1  # 不再生成成功用例
+DEGRADE_CHEAP_MODEL = 2  # 所有阶段改用廉价模型，不再升级到强模型
+DEGRADE_TEMPLATE_ONLY = 3  # 不再调用LLM，只生成测试模板
+DEGRADE_NAMES = {
+    DEGRADE_FAIL_ONLY: 'fail_only',
+    DEGRADE_CHEAP_MODEL: 'cheap_model',
+    DEGRADE_TEMPLATE_ONLY: 'template_only',
+}
+
+
+def has_limits(limits: Dict[str, Dict[str, float]]) -> bool:
+    """
+    :return: 是否配置了任意一项预算
+    """
+    return any(value and value > 0 for scope in limits.values() for value in scope.values())
+
+
+class BudgetTracker:
+    """
+    LLM用量预算
+
+    按整次运行、包（函数所在目录）与函数三个范围累计输入token、输出token与估算费用。
+    任一范围的任一计量项达到预算的对应比例时依次降级。调用前通过reserve按预估用量（含预估费用）判断并预留，
+    并发的调用不会同时占用同一份剩余预算；调用结束后以实际用量替换预留，实际用量超过预估时可能略超预算。
+    每次判断只是几次字典查找，不增加请求延迟。
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, float]], ratios: List[float]):
+        """
+        :param limits: 范围到各计量项预算的映射，如{"run": {"cost": 50}, "function": {"output_tokens": 20000}}
+        :param ratios: 三个降级等级对应的用量比例，从小到大
+        """
+        self.logger = logging.getLogger(__name__)
+        unknown = [scope for scope in limits if scope not in BUDGET_SCOPES]
+        if unknown:
+            raise ValueError(f"未知的预算范围: {', '.join(unknown)}，可选值: {', '.join(BUDGET_SCOPES)}")
+        self.limits = {scope: {metric: float(value) for metric, value in limits.get(scope, {}).items()
+                               if metric in BUDGET_METRICS and value and value > 0}
+                       for scope in BUDGET_SCOPES}
+        self.ratios = sorted(ratios)[:DEGRADE_TEMPLATE_ONLY]
+        self._usage: Dict[Tuple[str, str], Dict[str, float]] = {}
+        # 已预留但尚未结算的预估用量
+        self._reserved: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._announced = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _scope_keys(function_key: Optional[str]) -> List[Tuple[str, str]]:
+        """
+        :param function_key: 函数标识"文件路径:函数名"，为None时只计入整次运行
+        :return: 该函数所属的各范围标识
+        """
+        keys = [('run', '')]
+        if function_key:
+            file_path = function_key.rsplit(':', 1)[0]
+            keys.append(('package', os.path.dirname(file_path)))
+            keys.append(('function', function_key))
+        return keys
+
+    def _add(self, table: Dict[Tuple[str, str], Dict[str, float]], function_key: Optional[str],
+             amounts: Dict[str, float], sign: int = 1) -> None:
+        """
+        在持有锁时把用量加到各范围上
+        """
+        for key in self._scope_keys(function_key):
+            if not self.limits[key[0]]:
+                continue
+            usage = table.setdefault(key, {metric: 0.0 for metric in BUDGET_METRICS})
+            for metric in BUDGET_METRICS:
+                usage[metric] += sign * amounts.get(metric, 0.0)
+
+    def charge(self, function_key: Optional[str], input_tokens: int, output_tokens: int, cost: float) -> None:
+        """
+        记录一次调用的实际用量
+        :param function_key: 当前处理的函数
+        :param input_tokens: 输入token数
+        :param output_tokens: 输出token数（含推理token）
+        :param cost: 估算费用
+        """
+        with self._lock:
+            self._add(self._usage, function_key, {'input_tokens': input_tokens, 'output_tokens': output_tokens, 'cost': cost})
+
+    def reserve(self, function_key: Optional[str], input_tokens: int, output_tokens: int,
+                cost: float) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """
+        按预估用量判断降级等级，未达到DEGRADE_TEMPLATE_ONLY时原子地预留该用量
+        :param function_key: 当前处理的函数
+        :param input_tokens: 预估输入token数
+        :param output_tokens: 预估输出token数
+        :param cost: 预估费用
+        :return: (降级等级, 预留记录)，不允许调用时预留记录为None；调用结束后须用release释放
+        """
+        amounts = {'input_tokens': input_tokens, 'output_tokens': output_tokens, 'cost': cost}
+        with self._lock:
+            level = self._level(function_key, amounts)
+            if level >= DEGRADE_TEMPLATE_ONLY:
+                return level, None
+            self._add(self._reserved, function_key, amounts)
+        return level, {'function_key': function_key, **amounts}
+
+    def release(self, reservation: Optional[Dict[str, Any]]) -> None:
+        """
+        释放预留，实际用量由charge记录
+        :param reservation: reserve返回的预留记录
+        """
+        if reservation is None:
+            return
+        with self._lock:
+            self._add(self._reserved, reservation['function_key'], reservation, sign=-1)
+
+    def level(self, function_key: Optional[str], input_tokens: int = 0, output_tokens: int = 0, cost: float = 0.0) -> int:
+        """
+        计算当前的降级等级，已预留的用量计入已用量
+        :param function_key: 当前处理的函数
+        :param input_tokens: 即将发起的调用预估的输入token数
+        :param output_tokens: 即将发起的调用预估的输出token数
+        :param cost: 即将发起的调用预估的费用
+        :return: DEGRADE_*之一；计入预估用量后超出任一预算时返回DEGRADE_TEMPLATE_ONLY
+        """
+        with self._lock:
+            return self._level(function_key, {'input_tokens': input_tokens, 'output_tokens': output_tokens, 'cost': cost})
+
+    def _level(self, function_key: Optional[str], pending: Dict[str, float]) -> int:
+        """
+        在持有锁时计算降级等级
+        """
+        level = DEGRADE_NONE
+        for key in self._scope_keys(function_key):
+            limits = self.limits[key[0]]
+            if not limits:
+                continue
+            usage = self._usage.get(key, {})
+            reserved = self._reserved.get(key, {})
+            for metric, limit in limits.items():
+                used = usage.get(metric, 0.0) + reserved.get(metric, 0.0)
+                if used + pending[metric] >= limit:
+                    scope_level = DEGRADE_TEMPLATE_ONLY
+                else:
+                    scope_level = sum(1 for ratio in self.ratios if used >= ratio * limit)
+                if scope_level > DEGRADE_NONE and (key, scope_level) not in self._announced:
+                    self._announced.add((key, scope_level))
+                    self.logger.warning(f"{key[0]}预算{key[1] or ''}的{metric}已用{used:g}/{limit:g}，"
+                                        f"降级为{DEGRADE_NAMES[scope_level]}")
+                level = max(level, scope_level)
+        return level
+
+    def usage(self, scope: str = 'run', key: str = '') -> Dict[str, float]:
+        """
+        :return: 指定范围的累计用量
+        """
+        with self._lock:
+            return dict(self._usage.get((scope, key), {metric: 0.0 for metric in BUDGET_METRICS}))
@@ -1,58 +1,277 @@
 import logging
-import requests
-import json
+import time
+from functools import partial
 from typing import Dict, Any, Optional
+import openai
 from openai import OpenAI
 from core.config import settings
 import core.constants
+from core.logs import log_payload
+from core.metrics import metrics
+from core.constants import STAGE_FAIL_CASE, STAGE_SUCCESS_CASE, STAGE_MERGE, STAGE_DEBUG
+from llm_utils.budget import BudgetTracker, DEGRADE_CHEAP_MODEL, DEGRADE_NONE, DEGRADE_TEMPLATE_ONLY, has_limits
+from llm_utils.routing import ProviderRouter
+from llm_utils.rate_limiter import SharedRateLimiter, estimate_tokens
+from llm_utils.transcripts import TranscriptStore
+
+# 这些阶段的输入已是完整提示，直接发送
+RAW_PROMPT_STAGES = (STAGE_MERGE, STAGE_DEBUG)
 
 class LLMClient:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.openai_client = None
-        self.siliconflow_client = None
-        
-        # 初始化客户端
-        if settings.openai_api_key:
-            self.openai_client = OpenAI(api_key=settings.openai_api_key)
-        
-        if settings.siliconflow_api_key:
-            self.siliconflow_client = OpenAI(
+        # 客户端在首次使用时才创建，避免无谓的网络栈初始化
+        self._openai_client = None
+        self._siliconflow_client = None
+        self._rate_limiters: Dict[str, SharedRateLimiter] = {}
+        # 录制/回放模式下的调用记录存储
+        self.transcripts: Optional[TranscriptStore] = None
+        if settings.llm_transcript_mode in ("record", "replay"):
+            self.transcripts = TranscriptStore(settings.llm_transcript_dir)
+            self.logger.info(f"LLM调用{'录制' if settings.llm_transcript_mode == 'record' else '回放'}模式: {settings.llm_transcript_dir}")
+        self.router = ProviderRouter(
+            max_retries=settings.llm_max_retries,
+            backoff_base=settings.llm_backoff_base,
+            backoff_max=settings.llm_backoff_max,
+            hedge_enabled=settings.llm_hedge_enabled,
+            hedge_min_samples=settings.llm_hedge_min_samples,
+            hedge_default_delay=settings.llm_hedge_default_delay,
+            failure_threshold=settings.llm_circuit_failure_threshold,
+            reset_seconds=settings.llm_circuit_reset_seconds,
+        )
+        # 未配置预算时为None，正常路径上不做任何额外判断
+        self.budget: Optional[BudgetTracker] = None
+        if has_limits(settings.llm_budgets):
+            self.budget = BudgetTracker(settings.llm_budgets, settings.llm_budget_degrade_ratios)
+            self.logger.info(f"已启用LLM用量预算: {settings.llm_budgets}")
+
+    @property
+    def openai_client(self) -> Optional[OpenAI]:
+        """
+        按需创建OpenAI客户端
+        :return: 客户端实例，未配置API密钥时返回None
+        """
+        if self._openai_client is None and settings.openai_api_key:
+            # SDK自带重试关闭，由路由层统一负责重试与供应商切换
+            self._openai_client = OpenAI(api_key=settings.openai_api_key, max_retries=0)
+        return self._openai_client
+
+    @property
+    def siliconflow_client(self) -> Optional[OpenAI]:
+        """
+        按需创建硅基流动客户端
+        :return: 客户端实例，未配置API密钥时返回None
+        """
+        if self._siliconflow_client is None and settings.siliconflow_api_key:
+            self._siliconflow_client = OpenAI(
                 api_key=settings.siliconflow_api_key, # 从https://cloud.siliconflow.cn/account/ak获取
-                base_url=settings.siliconflow_url
+                base_url=settings.siliconflow_url,
+                max_retries=0
             )
-            
-    def generate_test(self, code: str, function_name: str, model_type: str = "openai", test_type: str = "fail") -> str:
+        return self._siliconflow_client
+
+    def _get_rate_limiter(self, provider: str) -> Optional[SharedRateLimiter]:
+        """
+        获取供应商的跨进程共享限流器
+        :param provider: 供应商 (openai 或 siliconflow)
+        :return: 限流器实例，未启用限流时返回None
+        """
+        if not settings.llm_rate_limit_enabled:
+            return None
+        if provider not in self._rate_limiters:
+            if provider == "openai":
+                api_key, rpm, tpm = settings.openai_api_key, settings.openai_rpm, settings.openai_tpm
+            else:
+                api_key, rpm, tpm = settings.siliconflow_api_key, settings.siliconflow_rpm, settings.siliconflow_tpm
+            self._rate_limiters[provider] = SharedRateLimiter.for_api_key(
+                provider, api_key or "", rpm, tpm, settings.llm_rate_limit_dir
+            )
+        return self._rate_limiters[provider]
+
+    def budget_level(self, function_key: Optional[str] = None) -> int:
+        """
+        获取函数当前的预算降级等级
+        :param function_key: 函数标识，为None时取当前正在处理的函数
+        :return: llm_utils.budget中的DEGRADE_*之一，未配置预算时为DEGRADE_NONE
+        """
+        if self.budget is None:
+            return DEGRADE_NONE
+        return self.budget.level(function_key or metrics.current_function())
+
+    def generate_test(self, code: str, function_name: str, model_type: Optional[str] = None, test_type: str = "fail",
+                      stage: Optional[str] = None, escalate: bool = False) -> str:
         """
         生成Go单元测试代码
-        :param code: Go函数代码
+        :param code: Go函数代码；stage为merge或debug时为完整提示
         :param function_name: 函数名
-        :param model_type: 模型类型 (openai 或 siliconflow)
+        :param model_type: 优先使用的模型类型 (openai 或 siliconflow)，为None时按settings.llm_provider_order路由；
+                           指定的供应商失败时仍会切换到其他已配置的供应商
         :param test_type: 测试类型 (fail 或 success)
+        :param stage: 调用阶段 (fail_case、success_case、merge、debug)，为None时由test_type推断
+        :param escalate: 是否跳过阶段模型，直接使用默认的强模型
         :return: 生成的测试代码
         """
-        prompt = self._create_prompt(code, function_name, test_type)
+        stage = stage or (STAGE_SUCCESS_CASE if test_type == "success" else STAGE_FAIL_CASE)
+        prompt = code if stage in RAW_PROMPT_STAGES else self._create_prompt(code, function_name, test_type)
+        label = f"{stage}{'+escalate' if escalate else ''}"
         
+        cheap = False
+        reservation = None
+        if self.budget is not None:
+            # 按预估用量判断并预留，并发调用不会同时占用同一份剩余预算；费用按候选供应商中最贵的模型估算
+            input_tokens = estimate_tokens(prompt)
+            output_tokens = settings.llm_rate_limit_output_tokens
+            cost = max((settings.estimate_cost(self._model_for(provider, stage, escalate), input_tokens, output_tokens)
+                        for provider in settings.llm_provider_order), default=0.0)
+            level, reservation = self.budget.reserve(metrics.current_function(), input_tokens, output_tokens, cost)
+            if level >= DEGRADE_TEMPLATE_ONLY:
+                self.logger.warning(f"LLM用量预算不足，跳过调用: 阶段={label}, 函数={function_name}")
+                metrics.record("llm", 0.0, llm_stage=label, error="budget_exhausted")
+                return ""
+            if level >= DEGRADE_CHEAP_MODEL:
+                cheap, escalate = True, False
+                label = f"{stage}+cheap"
         try:
-            if model_type == "openai" and self.openai_client:
-                return self._call_openai(prompt)
-            elif model_type == "siliconflow" and self.siliconflow_client:
-                return self._call_siliconflow(prompt)
-            else:
-                available_models = []
-                if self.openai_client:
-                    available_models.append("openai")
-                if self.siliconflow_client:
-                    available_models.append("siliconflow")
-                
-                error_msg = f"未配置有效的{model_type}客户端。可用的模型: {', '.join(available_models)}"
+            return self._generate(prompt, function_name, model_type, stage, label, escalate, cheap)
+        finally:
+            # 实际用量已在调用中计入预算，释放预留
+            if reservation is not None:
+                self.budget.release(reservation)
+
+    def _generate(self, prompt: str, function_name: str, model_type: Optional[str], stage: str, label: str,
+                  escalate: bool, cheap: bool) -> str:
+        """
+        回放或通过路由调用供应商
+        :return: 生成的测试代码，失败时返回空字符串
+        """
+        if settings.llm_transcript_mode == "replay":
+            replayed = self._replay(label, prompt)
+            if replayed is not None or not settings.llm_replay_fallback_live:
+                return replayed or ""
+
+        try:
+            providers = self._available_providers(stage, escalate, cheap)
+            if not providers:
+                error_msg = "未配置有效的LLM客户端，请检查API密钥配置"
                 self.logger.error(error_msg)
                 raise ValueError(error_msg)
+
+            order = list(settings.llm_provider_order)
+            if model_type:
+                if model_type not in providers:
+                    self.logger.warning(f"未配置有效的{model_type}客户端。可用的模型: {', '.join(providers)}")
+                order = [model_type] + [name for name in order if name != model_type]
+            # 未出现在优先级配置中的已配置供应商排在最后
+            order += [name for name in providers if name not in order]
+            self.logger.info(f"LLM调用阶段: {label}")
+            start = time.perf_counter()
+            provider, response = self.router.call(providers, order, prompt, label=label)
+            if settings.llm_transcript_mode == "record":
+                # 记录实际给出响应的供应商，切换或对冲时不一定是优先级最高的那个
+                self._record(label, prompt, response, time.perf_counter() - start, provider, stage, escalate, cheap)
+            return response
         except Exception as e:
             self.logger.error(f"LLM调用失败: {str(e)}")
             # 不抛出异常，返回空字符串，让调用者处理
             return ""
 
+    def _replay(self, label: str, prompt: str) -> Optional[str]:
+        """
+        从录制记录中回放一次调用
+        :param label: 调用阶段标签
+        :param prompt: 完整提示
+        :return: 录制的响应，未录制时返回None
+        """
+        entry = self.transcripts.replay(label, prompt)
+        if entry is None:
+            self.logger.warning(f"回放未命中: 阶段={label}")
+            metrics.record("llm", 0.0, llm_stage=label, replayed=True, error="replay_miss")
+            return None
+        duration = entry['timings'].get('duration', 0.0)
+        if settings.llm_replay_latency and duration:
+            # 保留原始耗时，使回放的吞吐与录制时可比
+            time.sleep(duration)
+        metrics.record("llm", duration if settings.llm_replay_latency else 0.0, llm_stage=label, replayed=True,
+                       model=entry.get('model'), recorded_duration=duration)
+        return entry['response']
+
+    def _record(self, label: str, prompt: str, response: str, duration: float, provider: str, stage: str, escalate: bool,
+                cheap: bool = False) -> None:
+        """
+        录制一次调用，写入失败不影响主流程
+        """
+        try:
+            self.transcripts.record(label, prompt, response, {'duration': duration},
+                                    provider=provider, model=self._model_for(provider, stage, escalate, cheap))
+        except Exception as e:
+            self.logger.warning(f"录制LLM调用失败: {str(e)}")
+
+    def can_escalate(self, stage: str) -> bool:
+        """
+        判断某阶段是否存在可升级的更强模型
+        :param stage: 调用阶段
+        :return: 启用升级且至少一个已配置供应商的阶段模型与默认模型不同时返回True
+        """
+        if not settings.llm_stage_escalation or self.budget_level() >= DEGRADE_CHEAP_MODEL:
+            return False
+        # 回放模式下可能没有配置API密钥，按配置的供应商判断以保证与录制时的调用序列一致
+        providers = settings.llm_provider_order if settings.llm_transcript_mode == "replay" else self._available_providers(stage)
+        return any(
+            settings.model_for_stage(provider, stage) != settings.model_for_stage(provider, stage, escalate=True)
+            for provider in providers
+        )
+
+    @staticmethod
+    def _model_for(provider: str, stage: Optional[str], escalate: bool = False, cheap: bool = False) -> str:
+        """
+        :param cheap: 预算降级时改用该供应商配置的廉价模型
+        :return: 本次调用使用的模型
+        """
+        if cheap and settings.llm_budget_fallback_models.get(provider):
+            return settings.llm_budget_fallback_models[provider]
+        return settings.model_for_stage(provider, stage, escalate)
+
+    def _available_providers(self, stage: Optional[str] = None, escalate: bool = False, cheap: bool = False) -> Dict[str, Any]:
+        """
+        获取已配置的供应商调用函数，调用函数已绑定该阶段使用的模型
+        :param stage: 调用阶段
+        :param escalate: 是否使用默认的强模型
+        :param cheap: 是否因预算降级改用廉价模型
+        :return: 供应商名称到调用函数的映射
+        """
+        providers = {}
+        if self.siliconflow_client:
+            providers["siliconflow"] = partial(self._call_siliconflow, model=self._model_for("siliconflow", stage, escalate, cheap), stage=stage or "")
+        if self.openai_client:
+            providers["openai"] = partial(self._call_openai, model=self._model_for("openai", stage, escalate, cheap), stage=stage or "")
+        return providers
+
+    def _charge_budget(self, span: Dict[str, Any]) -> None:
+        """
+        将一次成功调用的用量计入预算
+        :param span: 已写入token用量与费用的统计记录
+        """
+        if self.budget is not None:
+            # completion_tokens已包含推理token
+            self.budget.charge(metrics.current_function(), span.get('prompt_tokens', 0), span.get('completion_tokens', 0),
+                               span.get('cost', 0.0))
+
+    def _record_usage(self, span: Dict[str, Any], usage: Any, model: str) -> None:
+        """
+        将响应中的token用量与估算费用写入统计
+        :param span: metrics.span返回的记录字典
+        :param usage: 响应中的usage对象
+        :param model: 模型名，用于查找单价
+        """
+        span['prompt_tokens'] = getattr(usage, 'prompt_tokens', 0) or 0
+        span['completion_tokens'] = getattr(usage, 'completion_tokens', 0) or 0
+        prompt_details = getattr(usage, 'prompt_tokens_details', None)
+        completion_details = getattr(usage, 'completion_tokens_details', None)
+        # OpenAI放在prompt_tokens_details中，DeepSeek系列使用prompt_cache_hit_tokens
+        span['cached_tokens'] = (getattr(prompt_details, 'cached_tokens', 0) or getattr(usage, 'prompt_cache_hit_tokens', 0) or 0)
+        span['reasoning_tokens'] = getattr(completion_details, 'reasoning_tokens', 0) or 0
+        span['cost'] = settings.estimate_cost(model, span['prompt_tokens'], span['completion_tokens'])
+
     def _create_prompt(self, code: str, function_name: str, test_type: str = "fail") -> str:
         """
         创建生成测试的提示
@@ -75,82 +294,132 @@ class LLMClient:
                 function_name=function_name
             )
 
-    def _call_openai(self, prompt: str) -> str:
+    def _call_openai(self, prompt: str, model: Optional[str] = None, stage: str = "") -> str:
         """
         调用OpenAI模型
         :param prompt: 提示
-        :return: 生成的文本
+        :param model: 模型名，为None时使用settings.openai_model
+        :param stage: 调用阶段，仅用于统计
+        :return: 生成的文本，调用失败时抛出异常，由路由层决定重试或切换供应商
         """
-        try:
-            response = self.openai_client.chat.completions.create(
-                model=settings.openai_model,
-                messages=[
-                    {"role": "system", "content": "你是一名资深的Go开发工程师，擅长编写单元测试。"},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            self.logger.error(f"OpenAI调用失败: {str(e)}")
-            # 不抛出异常，返回空字符串
-            return ""
+        model = model or settings.openai_model
+        limiter = self._get_rate_limiter("openai")
+        estimated_tokens = estimate_tokens(prompt) + settings.llm_rate_limit_output_tokens
+        with metrics.span("llm", provider="openai", model=model, llm_stage=stage) as span:
+            try:
+                if limiter:
+                    span['rate_limit_wait'] = limiter.acquire(estimated_tokens)
+                request_start = time.perf_counter()
+                raw_response = self.openai_client.chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": "你是一名资深的Go开发工程师，擅长编写单元测试。"},
+                        {"role": "user", "content": prompt}
+                    ],
+                    timeout=settings.llm_request_timeout,
+                )
+                # 非流式调用的首token时间即整体响应时间
+                span['ttft'] = time.perf_counter() - request_start
+                if limiter:
+                    limiter.update_from_headers(raw_response.headers)
+                response = raw_response.parse()
+                if response.usage:
+                    self._record_usage(span, response.usage, model)
+                    if limiter:
+                        limiter.record_usage(estimated_tokens, response.usage.total_tokens)
+                else:
+                    span['prompt_tokens'] = estimate_tokens(prompt)
+                    span['completion_tokens'] = estimate_tokens(response.choices[0].message.content or "")
+                    span['tokens_estimated'] = True
+                    span['cost'] = settings.estimate_cost(model, span['prompt_tokens'], span['completion_tokens'])
+                self._charge_budget(span)
+                return response.choices[0].message.content or ""
+            except openai.APIStatusError as e:
+                self.logger.error(f"OpenAI HTTP错误: {str(e)}")
+                if limiter:
+                    limiter.update_from_headers(e.response.headers)
+                raise
+            except Exception as e:
+                self.logger.error(f"OpenAI调用失败: {str(e)}")
+                raise
 
-    def _call_siliconflow(self, prompt: str) -> str:
+    def _call_siliconflow(self, prompt: str, model: Optional[str] = None, stage: str = "") -> str:
         """
         调用硅基流动模型（流式）
         :param prompt: 提示
-        :return: 生成的文本
+        :param model: 模型名，为None时使用settings.siliconflow_model
+        :param stage: 调用阶段，仅用于统计
+        :return: 生成的文本，调用失败时抛出异常，由路由层决定重试或切换供应商
         """
-        import json
-        try:
-            self.logger.debug(f"硅基流动模型: {settings.siliconflow_model}")
-            self.logger.debug(f"硅基流动API URL: {settings.siliconflow_url}")
-            payload = {
-                "model": settings.siliconflow_model,
-                "messages": [
-                    {"role": "system", "content": "你是一名资深的Go开发工程师，擅长编写单元测试。"},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 4096,
-                "stream": True  # 启用流式响应
-            }
-            self.logger.debug(f"硅基流动请求参数: {payload}")
-            # response = self.siliconflow_client.post(settings.siliconflow_url, json=payload, stream=True)
-            response = self.siliconflow_client.chat.completions.create(
-                model= settings.siliconflow_model,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                stream=True,
-                temperature=0,
-                timeout=30,  # 设置30秒超时
-            )
-
-            full_response = ""
-            # 处理流式响应
+        model = model or settings.siliconflow_model
+        limiter = self._get_rate_limiter("siliconflow")
+        estimated_tokens = estimate_tokens(prompt) + settings.llm_rate_limit_output_tokens
+        with metrics.span("llm", provider="siliconflow", model=model, llm_stage=stage) as span:
             try:
-                for chunk in response:
-                    # 注释掉这行日志，取消流式响应块的打印
-                    # self.logger.debug(f"硅基流动响应块: {chunk}")
-                    
-                    # 处理数据块
-                    if chunk.choices and len(chunk.choices) > 0:
+                if limiter:
+                    span['rate_limit_wait'] = limiter.acquire(estimated_tokens)
+                self.logger.debug(f"硅基流动模型: {model}")
+                self.logger.debug(f"硅基流动API URL: {settings.siliconflow_url}")
+                extra_args = {}
+                if settings.llm_stream_include_usage:
+                    # 要求在最后一个数据块中返回token用量
+                    extra_args['stream_options'] = {"include_usage": True}
+                request_start = time.perf_counter()
+                raw_response = self.siliconflow_client.chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    stream=True,
+                    temperature=0,
+                    timeout=settings.llm_request_timeout,
+                    **extra_args,
+                )
+                if limiter:
+                    limiter.update_from_headers(raw_response.headers)
+                response = raw_response.parse()
+
+                content_parts = []
+                # 处理流式响应
+                try:
+                    for chunk in response:
+                        usage = getattr(chunk, 'usage', None)
+                        if usage:
+                            self._record_usage(span, usage, model)
+                        if not chunk.choices:
+                            continue
                         delta = chunk.choices[0].delta
+                        # 推理模型先输出reasoning_content，再输出正文
+                        reasoning = getattr(delta, 'reasoning_content', None)
+                        if (reasoning or delta.content) and 'ttft' not in span:
+                            span['ttft'] = time.perf_counter() - request_start
                         if delta.content:
-                            full_response += delta.content
+                            if 'first_content_time' not in span:
+                                span['first_content_time'] = time.perf_counter() - request_start
+                            content_parts.append(delta.content)
+                except Exception as e:
+                    self.logger.error(f"硅基流动流式响应处理失败: {str(e)}", exc_info=True)
+                    raise
+
+                full_response = ''.join(content_parts)
+                if 'prompt_tokens' not in span:
+                    # 服务端未返回用量时按字符数估算
+                    span['prompt_tokens'] = estimate_tokens(prompt)
+                    span['completion_tokens'] = estimate_tokens(full_response)
+                    span['tokens_estimated'] = True
+                    span['cost'] = settings.estimate_cost(model, span['prompt_tokens'], span['completion_tokens'])
+                if limiter:
+                    # completion_tokens已包含推理token，不能再单独加上
+                    limiter.record_usage(estimated_tokens, span['prompt_tokens'] + span['completion_tokens'])
+                self._charge_budget(span)
+                log_payload(self.logger, 'llm_response', "硅基流动完整响应", full_response)
+                return full_response
+            except openai.APIStatusError as e:
+                self.logger.error(f"硅基流动HTTP错误: {str(e)}")
+                self.logger.error(f"响应内容: {e.response.text}")
+                if limiter:
+                    limiter.update_from_headers(e.response.headers)
+                raise
             except Exception as e:
-                self.logger.error(f"硅基流动流式响应处理失败: {str(e)}", exc_info=True)
+                self.logger.error(f"硅基流动调用失败: {str(e)}", exc_info=True)
                 raise
-            
-            self.logger.info(f"硅基流动完整响应: {full_response}")
-            return full_response
-        except requests.exceptions.HTTPError as e:
-            self.logger.error(f"硅基流动HTTP错误: {str(e)}")
-            if 'response' in locals():
-                self.logger.error(f"响应内容: {response.text}")
-            # 不抛出异常，返回空字符串
-            return ""
-        except Exception as e:
-            self.logger.error(f"硅基流动调用失败: {str(e)}", exc_info=True)
-            # 不抛出异常，返回空字符串
-            return ""
\ No newline at end of file
@@ -0,0 +1,346 @@
+"""
+本地OpenAI兼容模拟服务，用于离线压测
+
+实现 /v1/chat/completions（流式与非流式）与 /v1/models，支持配置首token延迟、输出速率、
+429/5xx注入、流式中途断连，以及按提示哈希返回预置或脚本化的响应。
+将 SILICONFLOW_URL 指向该服务即可离线压测完整的生成→验证流水线：
+
+    python -m llm_utils.mock_server --port 8089 --profile deepseek-r1
+    SILICONFLOW_URL=http://127.0.0.1:8089/v1 SILICONFLOW_API_KEY=mock python main.py ... --llm
+
+响应文件为JSON对象，键为提示（最后一条消息内容）的sha256，值为字符串或字符串列表；
+列表表示脚本化响应，同一提示第n次请求返回第n项，超出后重复最后一项。
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Union
+
+# 预设的压测场景
+PROFILES: Dict[str, Dict[str, Any]] = {
+    'fast': {'ttft': 0.0, 'tokens_per_sec': 0.0},
+    'deepseek-v3': {'ttft': 0.6, 'tokens_per_sec': 60.0},
+    'deepseek-r1': {'ttft': 1.5, 'tokens_per_sec': 40.0, 'reasoning_tokens': 400},
+    'flaky': {'ttft': 0.8, 'tokens_per_sec': 50.0, 'error_429_rate': 0.1, 'error_5xx_rate': 0.05, 'disconnect_rate': 0.05},
+}
+
+# 从合并提示中提取原始模板
+_MERGE_TEMPLATE_PATTERN = re.compile(r'原始测试模板：\s*(.*?)\s*LLM生成的测试用例：', re.DOTALL)
+# 从调试提示中提取当前测试代码
+_DEBUG_CODE_PATTERN = re.compile(r'测试代码：\s*(.*?)\s*测试失败输出：', re.DOTALL)
+_TEST_FUNC_PATTERN = re.compile(r'func Test\w*\(t \*testing\.T\)')
+
+DEFAULT_CASE_RESPONSE = """失败返回值如下：
+```go
+        {
+            name: "fail_case",
+            args: args{
+                ctx: context.Background(),
+                args: &service.Args{
+                    Body: ucommon.GetHttpBodyBytes(map[string]interface{}{}),
+                },
+                reply: &service.Replies{},
+                wantReply: &service.Replies{Status: "fail"},
+            },
+        },
+```"""
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+def default_response(prompt: str) -> str:
+    """
+    未预置响应时按提示类型生成确定性的响应：合并提示原样返回模板，调试提示原样返回测试代码，
+    局部修改提示返回一个不改变代码的替换
+    :param prompt: 提示
+    :return: 响应文本
+    """
+    merge_match = _MERGE_TEMPLATE_PATTERN.search(prompt)
+    if merge_match:
+        return f"```go\n{merge_match.group(1)}\n```"
+    debug_match = _DEBUG_CODE_PATTERN.search(prompt)
+    if debug_match and '"edits"' in prompt:
+        test_func = _TEST_FUNC_PATTERN.search(debug_match.group(1))
+        anchor = test_func.group() if test_func else debug_match.group(1)
+        return json.dumps({'edits': [{'op': 'replace', 'old': anchor, 'new': anchor}]}, ensure_ascii=False)
+    if debug_match:
+        return debug_match.group(1)
+    return DEFAULT_CASE_RESPONSE
+
+
+def split_tokens(text: str, chars_per_token: int = 4) -> List[str]:
+    """
+    按固定字符数切分为伪token
+    """
+    return [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)] or ['']
+
+
+class MockLLMState:
+    """
+    模拟服务的配置与运行状态，供所有请求线程共享
+    """
+
+    def __init__(self, ttft: float = 0.0, tokens_per_sec: float = 0.0, reasoning_tokens: int = 0,
+                 error_429_rate: float = 0.0, error_5xx_rate: float = 0.0, disconnect_rate: float = 0.0,
+                 retry_after: float = 1.0, rpm: int = 0, responses: Optional[Dict[str, Union[str, List[str]]]] = None,
+                 seed: Optional[int] = None):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.reasoning_tokens = reasoning_tokens
+        self.error_429_rate = error_429_rate
+        self.error_5xx_rate = error_5xx_rate
+        self.disconnect_rate = disconnect_rate
+        self.retry_after = retry_after
+        self.rpm = rpm
+        self.responses = responses or {}
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._hit_counts: Dict[str, int] = {}
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+        self.stats = {'requests': 0, 'completed': 0, 'errors_429': 0, 'errors_5xx': 0, 'disconnects': 0, 'in_flight': 0}
+
+    def pick_response(self, prompt: str) -> str:
+        key = prompt_hash(prompt)
+        with self._lock:
+            count = self._hit_counts.get(key, 0)
+            self._hit_counts[key] = count + 1
+        scripted = self.responses.get(key)
+        if scripted is None:
+            return default_response(prompt)
+        if isinstance(scripted, list):
+            return scripted[min(count, len(scripted) - 1)] if scripted else ''
+        return scripted
+
+    def roll(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self.random.random() < rate
+
+    def check_rpm(self) -> Optional[float]:
+        """
+        服务端每分钟请求数限制
+        :return: 超限时返回距离窗口重置的秒数，否则返回None
+        """
+        if not self.rpm:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 60:
+                self._window_start = now
+                self._window_requests = 0
+            if self._window_requests >= self.rpm:
+                return 60 - (now - self._window_start)
+            self._window_requests += 1
+            return None
+
+    def remaining_requests(self) -> Optional[int]:
+        if not self.rpm:
+            return None
+        with self._lock:
+            return max(0, self.rpm - self._window_requests)
+
+    def incr(self, key: str, delta: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += delta
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    server_version = 'MockLLM/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def state(self) -> MockLLMState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug(format % args)
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _rate_limit_headers(self) -> Dict[str, str]:
+        remaining = self.state.remaining_requests()
+        if remaining is None:
+            return {}
+        return {'x-ratelimit-limit-requests': str(self.state.rpm), 'x-ratelimit-remaining-requests': str(remaining)}
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'mock', 'object': 'model'}]})
+        elif self.path.rstrip('/').endswith('/stats'):
+            self._send_json(200, dict(self.state.stats))
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        self.state.incr('requests')
+
+        retry_in = self.state.check_rpm()
+        if retry_in is not None or self.state.roll(self.state.error_429_rate):
+            self.state.incr('errors_429')
+            retry_after = retry_in if retry_in is not None else self.state.retry_after
+            self._send_json(429, {'error': {'message': 'rate limit exceeded', 'type': 'rate_limit'}},
+                            {'Retry-After': f"{retry_after:.3f}", 'x-ratelimit-remaining-requests': '0'})
+            return
+        if self.state.roll(self.state.error_5xx_rate):
+            self.state.incr('errors_5xx')
+            self._send_json(503, {'error': {'message': 'service unavailable', 'type': 'server_error'}})
+            return
+
+        messages = request.get('messages') or [{}]
+        prompt = messages[-1].get('content') or ''
+        text = self.state.pick_response(prompt)
+        model = request.get('model', 'mock')
+        self.state.incr('in_flight')
+        try:
+            if request.get('stream'):
+                include_usage = (request.get('stream_options') or {}).get('include_usage', False)
+                self._stream(model, prompt, text, include_usage)
+            else:
+                self._complete(model, prompt, text)
+        finally:
+            self.state.incr('in_flight', -1)
+
+    def _usage(self, prompt: str, text: str) -> Dict[str, int]:
+        prompt_tokens = len(split_tokens(prompt))
+        completion_tokens = len(split_tokens(text)) + self.state.reasoning_tokens
+        return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens}
+
+    def _pace(self, tokens: int) -> None:
+        if self.state.tokens_per_sec > 0:
+            time.sleep(tokens / self.state.tokens_per_sec)
+
+    def _complete(self, model: str, prompt: str, text: str) -> None:
+        time.sleep(self.state.ttft)
+        self._pace(len(split_tokens(text)) + self.state.reasoning_tokens)
+        self._send_json(200, {
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': self._usage(prompt, text),
+        }, self._rate_limit_headers())
+        self.state.incr('completed')
+
+    def _write_event(self, payload: Dict[str, Any]) -> None:
+        data = f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8')
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, model: str, prompt: str, text: str, include_usage: bool) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Cache-Control', 'no-cache')
+        for key, value in self._rate_limit_headers().items():
+            self.send_header(key, value)
+        self.end_headers()
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        base = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model}
+        tokens = split_tokens(text)
+        # 断连位置必须落在实际会发送的词元范围内，否则该次断连不会发生
+        disconnect_at = self.state.random.randrange(len(tokens)) if self.state.roll(self.state.disconnect_rate) and tokens else None
+
+        time.sleep(self.state.ttft)
+        try:
+            # 推理模型先输出思考过程
+            for _ in range(self.state.reasoning_tokens):
+                self._pace(1)
+                self._write_event({**base, 'choices': [{'index': 0, 'delta': {'reasoning_content': '…'}, 'finish_reason': None}]})
+            for index, token in enumerate(tokens):
+                if disconnect_at is not None and index == disconnect_at:
+                    # 模拟中途断连：不发送结束块直接关闭连接
+                    self.state.incr('disconnects')
+                    self.close_connection = True
+                    return
+                self._pace(1)
+                self._write_event({**base, 'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]})
+            self._write_event({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+            if include_usage:
+                self._write_event({**base, 'choices': [], 'usage': self._usage(prompt, text)})
+            data = b"data: [DONE]\n\n"
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n0\r\n\r\n")
+            self.wfile.flush()
+            self.state.incr('completed')
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端超时或取消（如对冲请求落败）
+            self.close_connection = True
+
+
+def create_server(host: str = '127.0.0.1', port: int = 8089, **options: Any) -> ThreadingHTTPServer:
+    """
+    创建模拟服务（未启动）
+    :param host: 监听地址
+    :param port: 监听端口，为0时随机分配
+    :param options: MockLLMState的配置项
+    :return: 服务实例，调用serve_forever()启动，server.state可读取统计
+    """
+    server = ThreadingHTTPServer((host, port), MockLLMHandler)
+    server.daemon_threads = True
+    server.state = MockLLMState(**options)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地OpenAI兼容模拟服务')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8089, help='监听端口')
+    parser.add_argument('--profile', type=str, choices=sorted(PROFILES), help='预设场景，显式参数优先')
+    parser.add_argument('--ttft', type=float, help='首token延迟（秒）')
+    parser.add_argument('--tokens-per-sec', type=float, help='输出速率（token/秒），为0时不限速')
+    parser.add_argument('--reasoning-tokens', type=int, help='正文前输出的推理token数')
+    parser.add_argument('--error-429-rate', type=float, help='随机返回429的概率')
+    parser.add_argument('--error-5xx-rate', type=float, help='随机返回503的概率')
+    parser.add_argument('--disconnect-rate', type=float, help='流式响应中途断连的概率')
+    parser.add_argument('--retry-after', type=float, help='随机429时返回的Retry-After秒数')
+    parser.add_argument('--rpm', type=int, help='服务端每分钟请求数上限，超出返回429')
+    parser.add_argument('--responses', type=str, help='按提示sha256预置响应的JSON文件')
+    parser.add_argument('--seed', type=int, help='随机种子，固定后错误注入可复现')
+    args = parser.parse_args()
+
+    options = dict(PROFILES.get(args.profile, {}))
+    for key in ('ttft', 'tokens_per_sec', 'reasoning_tokens', 'error_429_rate', 'error_5xx_rate',
+                'disconnect_rate', 'retry_after', 'rpm', 'seed'):
+        if getattr(args, key) is not None:
+            options[key] = getattr(args, key)
+    if args.responses:
+        with open(args.responses, 'r', encoding='utf-8') as f:
+            options['responses'] = json.load(f)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = create_server(args.host, args.port, **options)
+    logging.getLogger(__name__).info(f"模拟LLM服务已启动: http://{args.host}:{server.server_port}/v1 配置: {options}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
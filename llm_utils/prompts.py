@@ -101,4 +101,21 @@ LLM_DEBUG_TEST_TEMPLATE = """
     {test_output}
 
     请提供修复后的完整测试代码，不要添加任何额外的解释或说明。
-"""
\ No newline at end of file
+"""
+LLM_DEBUG_PATCH_TEMPLATE = """
+    以下是函数 {function_name} 的单元测试代码，但在执行时失败了。请分析测试失败的原因，只给出修复所需的最小修改，不要重写整个文件。
+
+    测试代码：
+    {current_code}
+
+    测试失败输出：
+    {test_output}
+
+    请只返回一个JSON对象，格式如下，不要添加任何额外的解释或说明：
+    {{"edits": [
+        {{"op": "replace_case", "name": "测试用例的name字段值", "code": "修改后的完整用例，从{{到}}"}},
+        {{"op": "replace", "old": "原代码中唯一出现的一段文本", "new": "替换后的文本"}},
+        {{"op": "add_import", "path": "需要新增的导入路径，如 \\"fmt\\""}}
+    ]}}
+    只列出需要的修改；修改某个测试用例时优先使用replace_case，其他位置使用replace，old必须与原代码逐字一致。
+"""
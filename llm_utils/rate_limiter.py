@@ -0,0 +1,208 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Mapping, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，退化为进程内限流
+    fcntl = None
+
+# 速率限制响应头中的时长格式，如 "1s"、"6m0s"、"20ms"
+_DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """
+    解析速率限制响应头中的时长
+    :param value: 时长字符串，支持纯数字秒数或 "6m0s"、"20ms" 形式
+    :return: 秒数，无法解析时返回None
+    """
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    matches = _DURATION_PATTERN.findall(value)
+    if not matches:
+        return None
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    return sum(float(number) * units[unit] for number, unit in matches)
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """
+    解析Retry-After响应头
+    :param value: 秒数或HTTP日期
+    :return: 需要等待的秒数，无法解析时返回None
+    """
+    seconds = parse_duration(value)
+    if seconds is not None:
+        return seconds
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数，中英文混合代码约3个字符一个token
+    :param text: 文本
+    :return: 估算的token数
+    """
+    return len(text) // 3 + 1
+
+
+class SharedRateLimiter:
+    """
+    同一主机上多个进程共享的令牌桶限流器
+    请求数/分钟与token数/分钟各一个桶，状态保存在文件中并通过文件锁互斥，
+    根据响应中的Retry-After与x-ratelimit-*头实时校正
+    """
+
+    def __init__(self, name: str, requests_per_minute: int, tokens_per_minute: int, state_dir: str = ""):
+        self.logger = logging.getLogger(__name__)
+        self.requests_per_minute = max(1, requests_per_minute)
+        self.tokens_per_minute = max(1, tokens_per_minute)
+        state_dir = state_dir or os.path.join(tempfile.gettempdir(), 'autounittest_ratelimit')
+        os.makedirs(state_dir, exist_ok=True)
+        self.state_path = os.path.join(state_dir, f"{name}.json")
+        self.lock_path = os.path.join(state_dir, f"{name}.lock")
+        self._thread_lock = threading.Lock()
+
+    @classmethod
+    def for_api_key(cls, provider: str, api_key: str, requests_per_minute: int, tokens_per_minute: int, state_dir: str = "") -> "SharedRateLimiter":
+        """
+        按供应商与API密钥创建限流器，使用同一密钥的进程共享额度
+        :param provider: 供应商名称
+        :param api_key: API密钥，仅取其哈希作为文件名
+        :return: 限流器实例
+        """
+        key_hash = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+        return cls(f"{provider}-{key_hash}", requests_per_minute, tokens_per_minute, state_dir)
+
+    @contextmanager
+    def _locked_state(self):
+        """
+        加锁读取状态，退出时写回
+        """
+        with self._thread_lock:
+            with open(self.lock_path, 'a+') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    state = self._load_state()
+                    self._refill(state)
+                    yield state
+                    self._save_state(state)
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {
+                'requests': float(self.requests_per_minute),
+                'tokens': float(self.tokens_per_minute),
+                'updated_at': time.time(),
+                'blocked_until': 0.0,
+            }
+
+    def _save_state(self, state: dict) -> None:
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _refill(self, state: dict) -> None:
+        now = time.time()
+        elapsed = max(0.0, now - state['updated_at'])
+        state['requests'] = min(float(self.requests_per_minute), state['requests'] + elapsed * self.requests_per_minute / 60)
+        state['tokens'] = min(float(self.tokens_per_minute), state['tokens'] + elapsed * self.tokens_per_minute / 60)
+        state['updated_at'] = now
+
+    def acquire(self, tokens: int) -> float:
+        """
+        阻塞直到请求数与token额度均可用，并预扣额度
+        :param tokens: 本次请求预估的token数（输入+输出）
+        :return: 实际等待的秒数
+        """
+        tokens = min(max(1, tokens), self.tokens_per_minute)
+        start = time.monotonic()
+        while True:
+            with self._locked_state() as state:
+                now = time.time()
+                if now < state['blocked_until']:
+                    wait_seconds = state['blocked_until'] - now
+                elif state['requests'] >= 1 and state['tokens'] >= tokens:
+                    state['requests'] -= 1
+                    state['tokens'] -= tokens
+                    waited = time.monotonic() - start
+                    if waited > 0.01:
+                        self.logger.info(f"限流等待{waited:.2f}秒")
+                    return waited
+                else:
+                    request_wait = max(0.0, 1 - state['requests']) * 60 / self.requests_per_minute
+                    token_wait = max(0.0, tokens - state['tokens']) * 60 / self.tokens_per_minute
+                    wait_seconds = max(request_wait, token_wait)
+            # 分段休眠，以便及时感知其他进程写入的Retry-After
+            time.sleep(min(max(wait_seconds, 0.01), 1.0))
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """
+        用实际token用量校正预扣额度
+        :param estimated_tokens: acquire时预扣的token数
+        :param actual_tokens: 实际消耗的token数
+        """
+        delta = actual_tokens - min(max(1, estimated_tokens), self.tokens_per_minute)
+        if delta == 0:
+            return
+        with self._locked_state() as state:
+            state['tokens'] = min(float(self.tokens_per_minute), state['tokens'] - delta)
+
+    def update_from_headers(self, headers: Optional[Mapping[str, Any]]) -> None:
+        """
+        根据响应头校正桶状态
+        :param headers: HTTP响应头，支持Retry-After与x-ratelimit-remaining/reset-requests/tokens
+        """
+        if not headers:
+            return
+        lowered = {str(k).lower(): str(v) for k, v in headers.items()}
+        retry_after = lowered.get('retry-after')
+        remaining_requests = lowered.get('x-ratelimit-remaining-requests')
+        remaining_tokens = lowered.get('x-ratelimit-remaining-tokens')
+        if retry_after is None and remaining_requests is None and remaining_tokens is None:
+            return
+
+        with self._locked_state() as state:
+            now = time.time()
+            if retry_after is not None:
+                seconds = parse_retry_after(retry_after)
+                if seconds is not None:
+                    state['blocked_until'] = max(state['blocked_until'], now + seconds)
+                    self.logger.warning(f"供应商要求{seconds:.2f}秒后重试")
+            for key, field in (('requests', remaining_requests), ('tokens', remaining_tokens)):
+                if field is None:
+                    continue
+                try:
+                    remaining = float(field)
+                except ValueError:
+                    continue
+                # 供应商侧的剩余额度更准确，只向下校正，避免多个进程互相抬高
+                state[key] = min(state[key], remaining)
+                reset = parse_duration(lowered.get(f'x-ratelimit-reset-{key}', ''))
+                if remaining <= 0 and reset:
+                    state['blocked_until'] = max(state['blocked_until'], now + reset)
@@ -0,0 +1,251 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class LLMUnavailableError(Exception):
+    """所有供应商均调用失败"""
+
+
+class ProviderStats:
+    """
+    单个供应商的延迟统计，保留最近若干次成功调用的耗时
+    """
+
+    def __init__(self, window: int = 100):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.success_count = 0
+        self.failure_count = 0
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+            self.success_count += 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failure_count += 1
+
+    @property
+    def sample_count(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        计算延迟分位数
+        :param q: 分位数，取值0~1
+        :return: 分位数延迟（秒），没有样本时返回None
+        """
+        with self._lock:
+            if not self._latencies:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后打开，冷却期过后进入半开状态，同一时间只放行一个探测请求，
+    探测成功则关闭，失败则重新打开；探测进行中的其他请求被拒绝
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_seconds: float = 60.0):
+        self._lock = threading.Lock()
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        # 半开状态下是否已有探测请求在进行
+        self._probing = False
+
+    def allow_request(self) -> bool:
+        """
+        判断当前是否可以发送请求，不占用探测名额，用于挑选候选供应商
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+            return self.state == self.HALF_OPEN and not self._probing
+
+    def acquire(self) -> bool:
+        """
+        实际发送请求前调用：关闭状态直接放行，半开状态只放行第一个请求作为探测
+        :return: 是否允许发送
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._probing = False
+            self._consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ProviderRouter:
+    """
+    多供应商路由：按优先级选择可用供应商，失败时带抖动退避重试并切换供应商，
+    可选对冲请求——主供应商耗时超过其p95延迟时向备用供应商发送相同请求，先完成者胜出
+    """
+
+    def __init__(self, max_retries: int = 2, backoff_base: float = 1.0, backoff_max: float = 10.0,
+                 hedge_enabled: bool = False, hedge_min_samples: int = 5, hedge_default_delay: float = 20.0,
+                 failure_threshold: int = 3, reset_seconds: float = 60.0):
+        self.logger = logging.getLogger(__name__)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_default_delay = hedge_default_delay
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.stats: Dict[str, ProviderStats] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        # 对冲请求的落败方无法中断，交由后台线程跑完
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-route")
+
+    def _get_stats(self, name: str) -> ProviderStats:
+        with self._lock:
+            if name not in self.stats:
+                self.stats[name] = ProviderStats()
+                self.breakers[name] = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+            return self.stats[name]
+
+    def _get_breaker(self, name: str) -> CircuitBreaker:
+        self._get_stats(name)
+        return self.breakers[name]
+
+    def call(self, providers: Dict[str, Callable[[str], str]], order: List[str], prompt: str, label: str = "") -> Tuple[str, str]:
+        """
+        通过路由调用LLM
+        :param providers: 供应商名称到调用函数的映射，调用函数失败时应抛出异常
+        :param order: 供应商优先级顺序
+        :param prompt: 提示
+        :param label: 延迟统计标签（如模型名），不同标签的延迟分开统计，熔断仍按供应商计算
+        :return: (实际给出响应的供应商, 第一个完整的非空响应)，发生切换或对冲时供应商不一定是order中的第一个
+        """
+        candidates = [name for name in order if name in providers]
+        if not candidates:
+            raise LLMUnavailableError("没有已配置的LLM供应商")
+
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            available = [name for name in candidates if self._get_breaker(name).allow_request()]
+            if not available:
+                last_error = LLMUnavailableError(f"所有供应商均处于熔断状态: {', '.join(candidates)}")
+            else:
+                try:
+                    return self._call_with_hedge(providers, available, prompt, label)
+                except Exception as e:
+                    last_error = e
+                    self.logger.warning(f"第{attempt + 1}次LLM调用失败: {str(e)}")
+
+            if attempt < self.max_retries:
+                # 全抖动指数退避，避免多个调用方同时重试
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                time.sleep(delay)
+
+        raise LLMUnavailableError(f"LLM调用在{self.max_retries + 1}次尝试后仍失败: {str(last_error)}")
+
+    def _invoke(self, name: str, func: Callable[[str], str], prompt: str, label: str = "") -> str:
+        stats = self._get_stats(self._stats_key(name, label))
+        breaker = self._get_breaker(name)
+        if not breaker.acquire():
+            # 熔断中或半开状态已有探测请求，不计入失败统计
+            raise LLMUnavailableError(f"{name}处于熔断状态")
+        start = time.monotonic()
+        try:
+            result = func(prompt)
+            if not result or not result.strip():
+                raise ValueError(f"{name}返回空响应")
+        except Exception:
+            stats.record_failure()
+            breaker.record_failure()
+            raise
+        stats.record_success(time.monotonic() - start)
+        breaker.record_success()
+        return result
+
+    @staticmethod
+    def _stats_key(name: str, label: str) -> str:
+        return f"{name}:{label}" if label else name
+
+    def _hedge_delay(self, name: str, label: str = "") -> float:
+        stats = self._get_stats(self._stats_key(name, label))
+        if stats.sample_count < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return stats.percentile(0.95)
+
+    def _submit(self, *args):
+        # 复制当前上下文，使统计等上下文变量在线程池中保持可见
+        return self._executor.submit(contextvars.copy_context().run, self._invoke, *args)
+
+    def _call_with_hedge(self, providers: Dict[str, Callable[[str], str]], available: List[str], prompt: str,
+                         label: str = "") -> Tuple[str, str]:
+        """
+        调用主供应商；主供应商失败时立即切换到备用供应商，启用对冲时超过p95延迟也会提前发出备用请求
+        :return: (给出响应的供应商, 响应)
+        """
+        primary = available[0]
+        secondary = available[1] if len(available) > 1 else None
+        if secondary is None:
+            return primary, self._invoke(primary, providers[primary], prompt, label)
+
+        futures = {self._submit(primary, providers[primary], prompt, label): primary}
+        hedge_sent = False
+        timeout = self._hedge_delay(primary, label) if self.hedge_enabled else None
+        errors = []
+
+        while futures:
+            done, _ = wait(list(futures), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # 主供应商超过p95延迟仍未返回，发送对冲请求
+                self.logger.info(f"{primary}超过p95延迟{timeout:.2f}s，向{secondary}发送对冲请求")
+                futures[self._submit(secondary, providers[secondary], prompt, label)] = secondary
+                hedge_sent = True
+                timeout = None
+                continue
+            for future in done:
+                name = futures.pop(future)
+                try:
+                    return name, future.result()
+                except Exception as e:
+                    errors.append(f"{name}: {str(e)}")
+            if not futures and not hedge_sent:
+                # 主供应商失败，立即切换到备用供应商
+                futures[self._submit(secondary, providers[secondary], prompt, label)] = secondary
+                hedge_sent = True
+                timeout = None
+
+        raise LLMUnavailableError("; ".join(errors))
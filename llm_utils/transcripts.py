@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+def request_key(stage: str, prompt: str) -> str:
+    """
+    计算请求的内容地址
+    :param stage: 调用阶段标签
+    :param prompt: 完整提示
+    :return: sha256十六进制串
+    """
+    return hashlib.sha256(f"{stage}\0{prompt}".encode('utf-8')).hexdigest()
+
+
+class TranscriptStore:
+    """
+    LLM调用记录的内容寻址存储
+
+    目录结构:
+        blobs/<前2位>/<sha256>.gz     gzip压缩的提示或响应正文，相同内容只存一份
+        entries/<前2位>/<请求key>.jsonl  同一(阶段, 提示)的调用记录，按录制顺序追加，只引用blob哈希
+
+    回放时同一请求第n次出现返回第n条记录，超出后重复最后一条，
+    因此多次调试同一代码得到不同修复结果的场景也能按原顺序重现。
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._replay_counts: Dict[str, int] = {}
+        os.makedirs(os.path.join(root, 'blobs'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'entries'), exist_ok=True)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'blobs', digest[:2], f"{digest}.gz")
+
+    def _entries_path(self, key: str) -> str:
+        return os.path.join(self.root, 'entries', key[:2], f"{key}.jsonl")
+
+    def put_blob(self, text: str) -> str:
+        """
+        写入正文
+        :param text: 正文
+        :return: 正文的sha256
+        """
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get_blob(self, digest: str) -> str:
+        with gzip.open(self._blob_path(digest), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def record(self, stage: str, prompt: str, response: str, timings: Dict[str, Any], **meta: Any) -> str:
+        """
+        录制一次调用
+        :param stage: 调用阶段标签
+        :param prompt: 完整提示
+        :param response: 响应正文
+        :param timings: 耗时信息，如duration
+        :param meta: 其他元数据，如模型名
+        :return: 请求key
+        """
+        key = request_key(stage, prompt)
+        entry = {
+            'stage': stage,
+            'prompt': self.put_blob(prompt),
+            'response': self.put_blob(response),
+            'timings': timings,
+            'recorded_at': time.time(),
+            **meta,
+        }
+        path = self._entries_path(key)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return key
+
+    def entries(self, stage: str, prompt: str) -> List[Dict[str, Any]]:
+        path = self._entries_path(request_key(stage, prompt))
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def replay(self, stage: str, prompt: str) -> Optional[Dict[str, Any]]:
+        """
+        回放一次调用
+        :param stage: 调用阶段标签
+        :param prompt: 完整提示
+        :return: 包含response与timings的记录，未录制时返回None
+        """
+        entries = self.entries(stage, prompt)
+        if not entries:
+            return None
+        key = request_key(stage, prompt)
+        with self._lock:
+            index = self._replay_counts.get(key, 0)
+            self._replay_counts[key] = index + 1
+        entry = dict(entries[min(index, len(entries) - 1)])
+        entry['response'] = self.get_blob(entry['response'])
+        return entry
@@ -1,15 +1,19 @@
 import argparse
+import re
 import time
 import logging
 
 from generator import TestTemplateGenerator
-from core.config import settings
+from core.logs import setup_logging
+from core.metrics import metrics
+from result_sink import ProgressReporter, ResultSink
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# 配置日志：记录经队列交给后台线程输出，业务线程不等待写终端
+setup_logging(level=logging.INFO)
+
+# 批量LLM模式下默认的任务日志与结果文件
+DEFAULT_JOURNAL_PATH = '.autounittest/journal.jsonl'
+DEFAULT_RESULTS_PATH = '.autounittest/results.jsonl'
 
 def main():
     # 记录开始时间
@@ -19,36 +23,92 @@ def main():
     parser.add_argument('--file-path', type=str, help='包含要测试函数的文件路径')
     parser.add_argument('--function-name', type=str, help='要生成测试的函数名')
     parser.add_argument('--llm', action='store_true', help='使用LLM补充测试用例参数')
+    parser.add_argument('--dir', type=str, help='批量模式：为目录树下所有匹配的函数生成测试')
+    parser.add_argument('--function-pattern', type=str, help='批量模式下的函数名正则表达式，默认匹配所有函数')
+    parser.add_argument('--workers', type=int, help='批量模式下并行分析的进程数，默认取CPU核数')
+    parser.add_argument('--go-vet', action='store_true', help='批量仅模板模式下，写入完成后对每个包执行一次go vet')
+    parser.add_argument('--concurrency', type=int, default=1, help='批量LLM模式下同时处理的函数数，同一个包内的函数始终串行')
+    parser.add_argument('--priority', action='append', default=[], metavar='NAME[=LEVEL]',
+                        help='批量LLM模式下提高指定函数的优先级（函数名或"文件路径:函数名"，LEVEL默认1），可重复指定')
+    parser.add_argument('--test-history', type=str, default='.autounittest/test_times.json',
+                        help='各包go test历史耗时文件，用于估算调度成本')
+    parser.add_argument('--coverage-top', type=int, metavar='N',
+                        help='批量LLM模式下每个包先执行一次go test -coverprofile，只为单位token成本下未覆盖语句最多的前N个函数生成测试')
+    parser.add_argument('--coverage-timeout', type=float, default=300.0, help='覆盖率测试中单个包的超时时间（秒）')
+    parser.add_argument('--queue', type=str, metavar='DB',
+                        help='批量LLM模式下使用共享任务队列（SQLite文件，可放在共享文件系统上），多个进程或机器执行同一命令即可分担工作')
+    parser.add_argument('--lease-seconds', type=float, default=300.0, help='共享队列中包租约的时长（秒），超时未续约的包会被重新分配')
+    parser.add_argument('--worker-id', type=str, help='共享队列中的worker标识，默认"主机名:进程号"')
+    parser.add_argument('--queue-report', type=str, help='将共享队列中所有worker的结果合并写入JSON报告')
+    parser.add_argument('--journal', type=str,
+                        help=f'LLM模式下的任务日志文件，记录每个函数的阶段与产物；批量模式默认{DEFAULT_JOURNAL_PATH}，单函数模式仅在指定时使用')
+    parser.add_argument('--resume', action='store_true', help='从任务日志恢复：跳过已完成的函数，未完成的从最后一个持久化阶段继续')
+    parser.add_argument('--record-llm', type=str, metavar='DIR', help='录制每次LLM调用到指定目录')
+    parser.add_argument('--replay-llm', type=str, metavar='DIR', help='从指定目录回放LLM调用，不请求任何供应商')
+    parser.add_argument('--replay-latency', action='store_true', help='回放时保留录制的调用耗时')
+    parser.add_argument('--results', type=str,
+                        help=f'结果文件（JSONL），每个函数处理完立即追加一行，代码与测试输出写入旁边的产物目录；'
+                             f'批量LLM模式默认{DEFAULT_RESULTS_PATH}，其他模式仅在指定时写入')
+    parser.add_argument('--no-progress', action='store_true', help='批量LLM模式下不显示实时进度')
+    parser.add_argument('--report', type=str, help='将各阶段耗时、token与费用统计写入JSON报告')
+    parser.add_argument('--prom-textfile', type=str, help='将统计写入Prometheus textfile格式的文件')
     args = parser.parse_args()
     
     print("开始自动生成Go单元测试...")
+    configure_transcripts(args)
     
+    journal = None
+    sink = None
     try:
         generator = TestTemplateGenerator()
+        # 共享队列模式下由队列记录完成状态，不使用本地任务日志；单函数运行不碰批量运行的任务日志
+        journal_path = args.journal or (DEFAULT_JOURNAL_PATH if args.dir else None)
+        if args.llm and not args.queue and journal_path:
+            from core.journal import JobJournal
+            journal = generator.journal = JobJournal(journal_path, resume=args.resume)
+        elif args.resume:
+            print("未使用任务日志，忽略--resume（单函数模式请通过--journal指定任务日志）")
+        # 只有批量LLM运行默认写结果文件，单函数与仅模板运行不覆盖、不混入批量运行的结果
+        results_path = args.results or (DEFAULT_RESULTS_PATH if args.dir and args.llm else None)
         if args.file_path and args.function_name:
             use_llm = args.llm
-            results = [generator.generate_test_case(args.file_path, args.function_name, use_llm)]
+            result = generator.generate_test_case(args.file_path, args.function_name, use_llm)
+            sink = ResultSink(results_path)
+            sink.write(result, metrics.function_stats(f"{args.file_path}:{args.function_name}", forget=True))
+        elif args.dir and not args.llm:
+            sink = ResultSink(results_path)
+            for result in generator.generate_templates_for_directory(args.dir, args.function_pattern, args.workers, args.go_vet):
+                sink.write(result)
+        elif args.dir and args.queue:
+            sink = ResultSink(results_path)
+            run_queue_worker(generator, args, sink)
+        elif args.dir:
+            sink = ResultSink(results_path)
+            run_scheduled(generator, args, sink)
         else:
-            print("参数错误：请提供有效的文件路径和函数名")
+            print("参数错误：请提供有效的文件路径和函数名，或通过--dir指定目录")
             parser.print_help()
         # 打印结果统计
-        # 检查results变量是否存在且有值
-        success_count = 0
-        failed_count = 0
-        
-        if 'results' in locals() and results:
-            success_count = sum(1 for r in results if r['status'] == 'success')
-            failed_count = sum(1 for r in results if r['status'] == 'failed')
+        if sink and sink.total:
+            success_count = sink.status_counts.get('success', 0)
+            failed_count = sink.status_counts.get('failed', 0)
+            warning_count = sink.status_counts.get('success_with_warning', 0)
             
             print(f"\n测试生成完成!")
             print(f"成功生成: {success_count}")
             print(f"生成失败: {failed_count}")
+            if warning_count:
+                print(f"生成但验证未通过: {warning_count}")
             
             if failed_count > 0:
                 print("\n失败的函数:")
-                for r in results:
-                    if r['status'] == 'failed':
-                        print(f"- {r['function_name']} ({r['file_path']}): {r['error']}")
+                for r in sink.failures:
+                    print(f"- {r['function_name']} ({r['file_path']}): {r['error']}")
+                if failed_count > len(sink.failures):
+                    print(f"... 其余{failed_count - len(sink.failures)}个见结果文件")
+            if sink.path:
+                print(f"结果文件: {sink.path}")
+        print_stage_summary()
         # 记录结束时间并计算耗时
         end_time = time.time()
         elapsed_time = end_time - start_time
@@ -60,6 +120,178 @@ def main():
         print(f"生成测试时发生错误: {str(e)}")
         print(f"总耗时: {elapsed_time:.2f}秒")
         logging.error(f"生成测试时发生错误: {str(e)}", exc_info=True)
+    finally:
+        if journal:
+            journal.close()
+        if sink:
+            sink.close()
+        write_reports(args.report, args.prom_textfile)
+
+def parse_priorities(values):
+    """
+    解析--priority参数
+    :param values: NAME或NAME=LEVEL列表
+    :return: 名称到优先级的字典
+    """
+    priorities = {}
+    for value in values:
+        name, sep, level = value.rpartition('=')
+        if not sep:
+            name, level = value, '1'
+        priorities[name] = int(level)
+    return priorities
+
+def collect_targets(generator, args):
+    """
+    批量LLM模式：分析目录并按函数名正则与覆盖率挑选目标
+    :param generator: 测试生成器
+    :param args: 命令行参数
+    :return: 函数信息列表
+    """
+    name_regex = re.compile(args.function_pattern) if args.function_pattern else None
+    functions = [
+        func for func in generator.code_analyzer.analyze_directory(args.dir, workers=args.workers)
+        if not name_regex or name_regex.search(func['name'])
+    ]
+    if args.coverage_top:
+        from coverage_selector import CoverageSelector
+        selector = CoverageSelector(generator.go_test_pool, timeout=args.coverage_timeout)
+        functions = selector.select(functions, args.coverage_top)
+        print(f"按覆盖率选取{len(functions)}个函数:")
+        for func in functions:
+            coverage = func['coverage']
+            print(f"- {func['name']} ({func['file_path']}): 未覆盖{coverage['uncovered']}/{coverage['statements']}条语句, 约{coverage['tokens']} tokens")
+    return functions
+
+def start_progress(args, total):
+    """
+    按命令行参数创建并启动实时进度
+    :param args: 命令行参数
+    :param total: 目标函数总数
+    :return: ProgressReporter实例，关闭进度显示时返回None
+    """
+    if args.no_progress:
+        return None
+    progress = ProgressReporter(total)
+    progress.start()
+    return progress
+
+def run_scheduled(generator, args, sink):
+    """
+    批量LLM模式：按最短作业优先调度目录下的所有函数
+    :param generator: 测试生成器
+    :param args: 命令行参数
+    :param sink: 结果文件，每个函数完成后立即写入
+    """
+    from scheduler import GenerationScheduler, TargetCostEstimator
+
+    functions = collect_targets(generator, args)
+    estimator = TargetCostEstimator(args.test_history)
+    scheduler = GenerationScheduler(estimator, parse_priorities(args.priority))
+    # 每次go test结束即更新包的测试耗时，不需要保留全部阶段记录
+    metrics.add_listener(estimator.learn_from_span)
+    # 提前创建客户端，避免多个工作线程同时初始化
+    generator.llm_client
+
+    progress = start_progress(args, len(functions))
+    try:
+        for result in scheduler.run(functions, lambda func: generator.generate_test_case(func['file_path'], func['name'], True),
+                                    args.concurrency):
+            sink.write(result, metrics.function_stats(f"{result['file_path']}:{result['function_name']}", forget=True))
+            if progress:
+                progress.advance(result)
+    finally:
+        if progress:
+            progress.stop()
+        metrics.remove_listener(estimator.learn_from_span)
+        estimator.save()
+
+def run_queue_worker(generator, args, sink):
+    """
+    共享队列模式：入队目录下的所有函数（已在队列中的保持原状态），然后领取包处理直到队列清空
+    :param generator: 测试生成器
+    :param args: 命令行参数
+    :param sink: 结果文件，只记录本worker完成的函数；所有worker的结果用--queue-report合并
+    """
+    from scheduler import TargetCostEstimator
+    from work_queue import QueueWorker, WorkQueue
+
+    functions = collect_targets(generator, args)
+    estimator = TargetCostEstimator(args.test_history)
+    queue = WorkQueue(args.queue, lease_seconds=args.lease_seconds)
+    added = queue.enqueue(functions, lambda func: estimator.estimate(func)['estimated_seconds'])
+    print(f"共享队列{args.queue}: 新加入{added}个函数, 当前进度{queue.progress()}")
+    metrics.add_listener(estimator.learn_from_span)
+    generator.llm_client
+
+    # 进度总数按开始时队列中的待处理函数计，其他worker分担时本worker会提前结束
+    progress = start_progress(args, queue.progress()['targets_pending'])
+
+    def on_result(target, result, stats):
+        sink.write(result, stats)
+        if progress:
+            progress.advance(result)
+
+    worker = QueueWorker(queue, lambda target: generator.generate_test_case(target['file_path'], target['name'], True),
+                         worker_id=args.worker_id, on_result=on_result)
+    try:
+        done = worker.run(args.concurrency)
+        print(f"worker {worker.worker_id} 完成{done}个函数")
+    finally:
+        if progress:
+            progress.stop()
+        metrics.remove_listener(estimator.learn_from_span)
+        estimator.save()
+        if args.queue_report:
+            queue.write_report(args.queue_report)
+            print(f"合并报告已写入: {args.queue_report}")
+
+def configure_transcripts(args):
+    """
+    根据命令行参数配置LLM录制/回放，仅在指定时才加载配置模块
+    :param args: 命令行参数
+    """
+    if not (args.record_llm or args.replay_llm):
+        return
+    from core.config import settings
+    if args.replay_llm:
+        settings.llm_transcript_mode = "replay"
+        settings.llm_transcript_dir = args.replay_llm
+        settings.llm_replay_latency = args.replay_latency
+    else:
+        settings.llm_transcript_mode = "record"
+        settings.llm_transcript_dir = args.record_llm
+
+def print_stage_summary():
+    """
+    打印各阶段耗时统计
+    """
+    stages = metrics.summary()['stages']
+    if not stages:
+        return
+    print("\n各阶段耗时:")
+    for name, stage in sorted(stages.items(), key=lambda kv: kv[1]['total'], reverse=True):
+        line = f"- {name}: {stage['count']}次, 合计{stage['total']:.2f}秒, p50 {stage['p50']:.3f}秒, p95 {stage['p95']:.3f}秒"
+        if stage.get('prompt_tokens') or stage.get('completion_tokens'):
+            line += f", 输入{stage['prompt_tokens']}/输出{stage['completion_tokens']} tokens"
+        if stage.get('tokens_saved'):
+            line += f", 节省{stage['tokens_saved']} tokens"
+        print(line)
+
+def write_reports(report_path, prom_textfile):
+    """
+    写出统计报告
+    :param report_path: JSON报告路径
+    :param prom_textfile: Prometheus textfile路径
+    """
+    try:
+        if report_path:
+            metrics.write_json(report_path)
+            print(f"统计报告已写入: {report_path}")
+        if prom_textfile:
+            metrics.write_prometheus(prom_textfile)
+    except Exception as e:
+        logging.error(f"写入统计报告失败: {str(e)}")
 
 if __name__ == "__main__":
     main()
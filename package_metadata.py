@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CACHE_DIR = ".autounittest/packages"
+# go list ./... 不会进入的目录
+_SKIPPED_DIRS = ('vendor', 'testdata')
+# 测试文件中go test识别的顶层函数
+_TEST_SYMBOL_PATTERN = re.compile(r'^func\s+((?:Test|Benchmark|Example|Fuzz)\w*)\s*\(', re.MULTILINE)
+
+
+def find_module_root(directory: str) -> Optional[str]:
+    """
+    向上查找包含go.mod的目录
+    :param directory: 起始目录
+    :return: 模块根目录的绝对路径，不在Go模块中时返回None
+    """
+    current = os.path.abspath(directory)
+    while True:
+        if os.path.isfile(os.path.join(current, 'go.mod')):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def test_symbols(content: str) -> List[str]:
+    """
+    :param content: 测试文件内容
+    :return: 文件中的Test*/Benchmark*/Example*/Fuzz*函数名
+    """
+    return _TEST_SYMBOL_PATTERN.findall(content)
+
+
+class PackageMetadata:
+    """
+    Go包元数据缓存
+
+    每个模块执行一次go list -e -json ./...，按目录索引包名、导入路径、源文件、测试文件以及测试文件中已有的Test*函数，
+    结果按go.mod与模块内目录、.go文件的修改时间持久化，未变化时下次运行直接加载。
+    运行中写入的测试文件通过record_test_file同步到内存，之后的查询都不再访问文件系统。
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, timeout: float = 120.0, env: Optional[Dict[str, str]] = None):
+        """
+        :param cache_dir: 持久化缓存目录
+        :param timeout: go list超时时间（秒）
+        :param env: 执行go list的环境变量，为None时沿用当前环境
+        """
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.env = env
+        self._lock = threading.Lock()
+        # 目录 -> 模块根目录（不在模块中时为None）
+        self._roots: Dict[str, Optional[str]] = {}
+        # 模块根目录 -> {目录: 包信息}，加载失败时为None
+        self._modules: Dict[str, Optional[Dict[str, Dict[str, Any]]]] = {}
+
+    def package(self, directory: str) -> Optional[Dict[str, Any]]:
+        """
+        查询目录对应的包
+        :param directory: 包目录
+        :return: 包含name、import_path、go_files、test_go_files、xtest_go_files与test_symbols的字典；
+                 目录不在Go模块中、go list不可用或目录不是包时返回None
+        """
+        directory = os.path.abspath(directory)
+        with self._lock:
+            if directory not in self._roots:
+                self._roots[directory] = find_module_root(directory)
+            root = self._roots[directory]
+            if root is None:
+                return None
+            if root not in self._modules:
+                self._modules[root] = self._load(root)
+            packages = self._modules[root]
+            return packages.get(directory) if packages is not None else None
+
+    def package_name(self, directory: str) -> Optional[str]:
+        """
+        :return: 包名（如main、带版本号目录中的实际包名），未知时返回None
+        """
+        package = self.package(directory)
+        return package['name'] if package else None
+
+    def has_test(self, directory: str, test_name: str) -> Optional[bool]:
+        """
+        包内（含外部测试包）是否已有指定的测试函数
+        :return: 是否存在，包信息未知时返回None
+        """
+        package = self.package(directory)
+        return test_name in package['test_symbols'] if package else None
+
+    def record_test_file(self, test_file_path: str, content: str) -> None:
+        """
+        同步本次运行写入的测试文件
+        :param test_file_path: 测试文件路径
+        :param content: 写入的内容
+        """
+        package = self.package(os.path.dirname(test_file_path))
+        if package is None:
+            return
+        file_name = os.path.basename(test_file_path)
+        with self._lock:
+            package['file_symbols'][file_name] = test_symbols(content)
+            package['test_symbols'] = {name for names in package['file_symbols'].values() for name in names}
+            if file_name not in package['test_go_files'] and file_name not in package['xtest_go_files']:
+                package['test_go_files'].append(file_name)
+
+    def _load(self, root: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        加载模块的包信息，指纹未变化时使用持久化缓存
+        """
+        fingerprint = self._fingerprint(root)
+        cache_path = os.path.join(self.cache_dir, f"{hashlib.sha1(root.encode('utf-8')).hexdigest()[:16]}.json")
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('root') == root and cached.get('fingerprint') == fingerprint:
+                packages = cached['packages']
+                for package in packages.values():
+                    package['test_symbols'] = {name for names in package['file_symbols'].values() for name in names}
+                self.logger.info(f"使用缓存的包元数据: {root}（{len(packages)}个包）")
+                return packages
+        except (OSError, ValueError, KeyError):
+            pass
+
+        packages = self._go_list(root)
+        if packages is None:
+            return None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            serializable = {directory: {key: value for key, value in package.items() if key != 'test_symbols'}
+                            for directory, package in packages.items()}
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'root': root, 'fingerprint': fingerprint, 'packages': serializable}, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            self.logger.warning(f"写入包元数据缓存失败: {str(e)}")
+        return packages
+
+    def _go_list(self, root: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        执行go list -e -json ./...并读取各包测试文件中的测试函数
+        """
+        self.logger.info(f"执行go list读取包元数据: {root}")
+        try:
+            completed = subprocess.run(['go', 'list', '-e', '-json', './...'], cwd=root, env=self.env,
+                                       capture_output=True, text=True, timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            self.logger.warning(f"go list执行失败，按目录推断包信息: {str(e)}")
+            return None
+        if completed.returncode != 0 and not completed.stdout.strip():
+            self.logger.warning(f"go list执行失败，按目录推断包信息: {completed.stderr.strip()[:500]}")
+            return None
+
+        packages = {}
+        decoder = json.JSONDecoder()
+        output = completed.stdout
+        position = 0
+        while True:
+            while position < len(output) and output[position].isspace():
+                position += 1
+            if position >= len(output):
+                break
+            try:
+                entry, position = decoder.raw_decode(output, position)
+            except ValueError as e:
+                self.logger.warning(f"解析go list输出失败: {str(e)}")
+                break
+            if not entry.get('Dir') or not entry.get('Name'):
+                continue
+            package = {
+                'name': entry['Name'],
+                'import_path': entry.get('ImportPath', ''),
+                'go_files': entry.get('GoFiles') or [],
+                'test_go_files': entry.get('TestGoFiles') or [],
+                'xtest_go_files': entry.get('XTestGoFiles') or [],
+                'file_symbols': {},
+            }
+            for file_name in package['test_go_files'] + package['xtest_go_files']:
+                try:
+                    with open(os.path.join(entry['Dir'], file_name), 'r', encoding='utf-8') as f:
+                        package['file_symbols'][file_name] = test_symbols(f.read())
+                except OSError as e:
+                    self.logger.warning(f"读取测试文件{file_name}失败: {str(e)}")
+            package['test_symbols'] = {name for names in package['file_symbols'].values() for name in names}
+            packages[os.path.abspath(entry['Dir'])] = package
+        return packages
+
+    @staticmethod
+    def _fingerprint(root: str) -> str:
+        """
+        :return: go.mod与模块内所有目录、.go文件修改时间的摘要，增删改文件都会改变目录或文件的修改时间
+        """
+        digest = hashlib.sha1()
+        for directory, dirs, files in os.walk(root):
+            # 与go list ./...一致，跳过vendor、testdata以及以.或_开头的目录，嵌套模块不属于当前模块
+            dirs[:] = sorted(name for name in dirs
+                             if name not in _SKIPPED_DIRS and not name.startswith(('.', '_'))
+                             and not os.path.isfile(os.path.join(directory, name, 'go.mod')))
+            digest.update(f"{os.path.relpath(directory, root)}:{os.stat(directory).st_mtime_ns}\n".encode('utf-8'))
+            for name in sorted(files):
+                if name.endswith('.go') or name == 'go.mod':
+                    stat = os.stat(os.path.join(directory, name))
+                    digest.update(f"{name}:{stat.st_mtime_ns}:{stat.st_size}\n".encode('utf-8'))
+        return digest.hexdigest()
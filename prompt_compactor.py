@@ -0,0 +1,238 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from code_analyzer import tokenize_go
+from llm_utils.rate_limiter import estimate_tokens
+
+# 默认视为日志语句的调用前缀
+DEFAULT_LOG_PATTERN = r'(log|logs|logger|glog|klog|zap|zlog|logrus)\.\w+|fmt\.(Print|Println|Printf)'
+# 之后的同级语句不可达的终止语句
+_TERMINATING = frozenset(('return', 'goto'))
+# 行尾为这些词法单元时语句在下一行继续
+_CONTINUATION = frozenset((',', '+', '-', '*', '/', '%', '&', '|', '^', '<<', '>>', '&^', '&&', '||', '.',
+                           '=', ':=', '==', '!=', '<', '<=', '>', '>=', '<-', '+=', '-=', '*=', '/=', '|=', '&='))
+# 回答中引用行号的写法：第12行、第12-15行、line 12、L12
+_LINE_REFERENCE = re.compile(r'(第\s*)(\d+)((?:\s*[-~至到]\s*)(\d+))?(\s*行)|(\b[Ll]ine\s+|\bL)(\d+)\b')
+
+
+def _indent_width(text: str) -> int:
+    """
+    :return: 行首空白的缩进层数，4个空格按一个制表符计
+    """
+    width = 0
+    for char in text:
+        if char == '\t':
+            width += 4
+        elif char == ' ':
+            width += 1
+        else:
+            break
+    return (width + 3) // 4
+
+
+class GoCodeCompactor:
+    """
+    发送给LLM前压缩Go函数代码
+
+    基于GoCodeAnalyzer的词法单元处理，不改变代码语义：去掉函数体内的注释（包括被注释掉的代码）、
+    return/goto之后不可达的语句、空行与多余空白，可选去掉日志调用语句；紧挨顶层声明的文档注释保留。
+    同时记录压缩后每一行对应的原始行号，LLM回答中引用的行号可以换算回原始代码。
+    """
+
+    def __init__(self, elide_logs: bool = False, log_pattern: str = DEFAULT_LOG_PATTERN):
+        """
+        :param elide_logs: 是否去掉日志调用语句
+        :param log_pattern: 日志调用的正则，匹配语句开头
+        """
+        self.elide_logs = elide_logs
+        self.log_pattern = re.compile(rf'(?:{log_pattern})\s*\(')
+
+    def compact(self, code: str) -> Dict[str, Any]:
+        """
+        压缩代码
+        :param code: Go代码，通常是一个函数的完整代码
+        :return: 包含code、line_map（压缩后第i行对应的原始行号，从1开始）、original_tokens、
+                 compacted_tokens与tokens_saved的字典
+        """
+        lines = self._logical_lines(code)
+        kept = self._drop_statements(lines)
+        compacted = '\n'.join('\t' * indent + text for _, indent, text, _ in kept)
+        original_tokens = estimate_tokens(code)
+        compacted_tokens = estimate_tokens(compacted)
+        return {
+            'code': compacted,
+            'line_map': [line_no for line_no, _, _, _ in kept],
+            'original_tokens': original_tokens,
+            'compacted_tokens': compacted_tokens,
+            'tokens_saved': original_tokens - compacted_tokens,
+        }
+
+    def _logical_lines(self, code: str) -> List[Tuple[int, int, str, List[Tuple[str, str]]]]:
+        """
+        按行重建代码：去掉非文档注释，词法单元之间的空白压缩为一个空格
+        :return: (原始行号, 缩进层数, 行文本, 行内有效词法单元)列表，不含空行
+        """
+        tokens = tokenize_go(code, keep_space=True)
+        doc_comments = self._doc_comment_indexes(tokens)
+        lines = []
+        parts: List[str] = []
+        significant: List[Tuple[str, str]] = []
+        line_start = 0
+        pending_space = False
+        for index, (kind, text, offset) in enumerate(tokens + [('newline', '\n', len(code))]):
+            if kind == 'newline':
+                if parts:
+                    line_no = code.count('\n', 0, line_start) + 1
+                    indent = _indent_width(code[code.rfind('\n', 0, line_start) + 1:line_start])
+                    lines.append((line_no, indent, ''.join(parts), significant))
+                parts, significant, pending_space = [], [], False
+                continue
+            if kind == 'space' or kind == 'comment' and index not in doc_comments:
+                pending_space = bool(parts)
+                continue
+            if not parts:
+                line_start = offset
+            elif pending_space:
+                parts.append(' ')
+            parts.append(text)
+            pending_space = False
+            if kind != 'comment':
+                significant.append((kind, text))
+        return lines
+
+    @staticmethod
+    def _doc_comment_indexes(tokens: List[Tuple[str, str, int]]) -> set:
+        """
+        :return: 顶层声明前连续注释的下标集合（包括@apitags等标签）
+        """
+        indexes = set()
+        depth = 0
+        run: List[int] = []
+        for index, (kind, text, _) in enumerate(tokens):
+            if kind in ('space', 'newline'):
+                continue
+            if kind == 'comment':
+                if depth == 0:
+                    run.append(index)
+                continue
+            if depth == 0 and kind == 'keyword' and text in ('func', 'type', 'var', 'const'):
+                indexes.update(run)
+            run = []
+            if text in '([{':
+                depth += 1
+            elif text in ')]}':
+                depth = max(0, depth - 1)
+        return indexes
+
+    def _drop_statements(self, lines: List[Tuple[int, int, str, List[Tuple[str, str]]]]) -> List[Tuple[int, int, str, List[Tuple[str, str]]]]:
+        """
+        去掉不可达语句与日志语句
+        """
+        kept = []
+        index = 0
+        while index < len(lines):
+            line = lines[index]
+            significant = line[3]
+            is_log = self.elide_logs and bool(self.log_pattern.match(line[2]))
+            terminating = bool(significant) and (significant[0][1] in _TERMINATING
+                                                 or significant[:2] == [('ident', 'panic'), ('op', '(')])
+            # 日志与终止语句中的{}属于复合字面量或函数字面量，需要一起配平
+            end = self._statement_end(lines, index, include_braces=is_log or terminating)
+            if is_log:
+                index = end + 1
+                continue
+            kept.extend(lines[index:end + 1])
+            index = end + 1
+            if terminating:
+                index = self._skip_unreachable(lines, index)
+        return kept
+
+    @staticmethod
+    def _statement_end(lines: List[Tuple[int, int, str, List[Tuple[str, str]]]], start: int, include_braces: bool) -> int:
+        """
+        :param include_braces: 是否把{}计入配平；普通语句以{结尾的行是代码块的开始，不属于同一条语句
+        :return: 从start行开始的语句的最后一行下标：括号配平且行尾不是续行符号
+        """
+        opening, closing = ('([{', ')]}') if include_braces else ('([', ')]')
+        balance = 0
+        for index in range(start, len(lines)):
+            significant = lines[index][3]
+            for _, text in significant:
+                if text in opening:
+                    balance += 1
+                elif text in closing:
+                    balance -= 1
+            if balance <= 0 and (not significant or significant[-1][1] not in _CONTINUATION):
+                return index
+        return len(lines) - 1
+
+    @staticmethod
+    def _skip_unreachable(lines: List[Tuple[int, int, str, List[Tuple[str, str]]]], index: int) -> int:
+        """
+        跳过终止语句之后、所在代码块结束之前的同级语句
+        :return: 第一条可达语句的下标：闭合当前代码块的}、case/default分支或标签
+        """
+        depth = 0
+        while index < len(lines):
+            significant = lines[index][3]
+            if not significant:
+                index += 1
+                continue
+            first = significant[0][1]
+            if depth == 0 and (first in ('}', 'case', 'default')
+                               or len(significant) >= 2 and significant[0][0] == 'ident' and significant[1][1] == ':'):
+                return index
+            for _, text in significant:
+                if text == '{':
+                    depth += 1
+                elif text == '}':
+                    depth -= 1
+            if depth < 0:
+                # 同一行里闭合了当前代码块，保守起见保留该行
+                return index
+            index += 1
+        return index
+
+
+def restore_line_references(text: str, line_map: Optional[List[int]]) -> str:
+    """
+    把LLM回答中引用的压缩后行号换算回原始行号
+    :param text: LLM回答
+    :param line_map: GoCodeCompactor.compact返回的line_map
+    :return: 替换后的文本，行号超出范围时保持不变
+    """
+    if not line_map:
+        return text
+
+    def original(number: str) -> str:
+        position = int(number)
+        return str(line_map[position - 1]) if 1 <= position <= len(line_map) else number
+
+    def replace(match: re.Match) -> str:
+        if match.group(2):
+            end = f"{match.group(3)[:-len(match.group(4))]}{original(match.group(4))}" if match.group(3) else ''
+            return f"{match.group(1)}{original(match.group(2))}{end}{match.group(5)}"
+        return f"{match.group(6)}{original(match.group(7))}"
+
+    return _LINE_REFERENCE.sub(replace, text)
+
+
+def restore_code_line_references(code: str, line_map: Optional[List[int]]) -> str:
+    """
+    把LLM生成的Go代码中注释里引用的压缩后行号换算回原始行号，标识符与字符串字面量保持不变
+    :param code: LLM生成的Go代码
+    :param line_map: GoCodeCompactor.compact返回的line_map
+    :return: 替换后的代码
+    """
+    if not line_map:
+        return code
+    parts = []
+    position = 0
+    for kind, text, offset in tokenize_go(code):
+        if kind != 'comment':
+            continue
+        parts.append(code[position:offset])
+        parts.append(restore_line_references(text, line_map))
+        position = offset + len(text)
+    parts.append(code[position:])
+    return ''.join(parts)
@@ -0,0 +1,176 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from code_analyzer import tokenize_go
+
+SUPPORTED_OPS = ('replace_case', 'replace', 'add_import')
+_JSON_BLOCK = re.compile(r'```(?:json)?\s*(\{.*?\})\s*```', re.DOTALL)
+_IMPORT_BLOCK = re.compile(r'^import\s*\(\s*\n', re.MULTILINE)
+_SINGLE_IMPORT = re.compile(r'^import\s+("[^"]+"|\w+\s+"[^"]+")\s*$', re.MULTILINE)
+
+
+class PatchError(Exception):
+    """
+    修改无法解析或无法应用到当前代码
+    """
+
+
+def parse_edits(text: str) -> List[Dict[str, Any]]:
+    """
+    从LLM输出中解析修改列表
+    :param text: LLM输出，可以带```json代码块标记
+    :return: 修改列表
+    :raises PatchError: 输出不是合法的修改JSON
+    """
+    match = _JSON_BLOCK.search(text)
+    if match:
+        payload = match.group(1)
+    else:
+        start, end = text.find('{'), text.rfind('}')
+        if start == -1 or end <= start:
+            raise PatchError("输出中没有JSON对象")
+        payload = text[start:end + 1]
+    try:
+        data = json.loads(payload)
+    except ValueError as e:
+        raise PatchError(f"JSON解析失败: {str(e)}")
+    edits = data.get('edits') if isinstance(data, dict) else data
+    if not isinstance(edits, list) or not edits:
+        raise PatchError("缺少edits列表")
+    for edit in edits:
+        if not isinstance(edit, dict) or edit.get('op') not in SUPPORTED_OPS:
+            raise PatchError(f"不支持的修改: {edit!r}")
+    return edits
+
+
+def _matching_close(tokens: List[Tuple[str, str, int]], start: int) -> Optional[int]:
+    """
+    :return: 与tokens[start]处的左括号匹配的右括号下标
+    """
+    depth = 0
+    for index in range(start, len(tokens)):
+        text = tokens[index][1]
+        if text in '([{':
+            depth += 1
+        elif text in ')]}':
+            depth -= 1
+            if depth == 0:
+                return index
+    return None
+
+
+def function_span(code: str, function_name: str) -> Optional[Tuple[int, int]]:
+    """
+    查找顶层函数的偏移区间
+    :param code: Go代码
+    :param function_name: 函数名
+    :return: 从func到函数体}（含）的偏移区间，未找到时返回None
+    """
+    tokens = [token for token in tokenize_go(code) if token[0] != 'comment']
+    for index in range(len(tokens) - 1):
+        if tokens[index][1] != 'func' or tokens[index + 1][1] != function_name:
+            continue
+        params_end = _matching_close(tokens, index + 2) if index + 2 < len(tokens) else None
+        # 跳过参数与返回值，找到函数体的{
+        body = params_end
+        while body is not None and body + 1 < len(tokens):
+            body += 1
+            if tokens[body][1] == '{':
+                end = _matching_close(tokens, body)
+                return (tokens[index][2], tokens[end][2] + 1) if end is not None else None
+            if tokens[body][1] in '([':
+                body = _matching_close(tokens, body)
+        return None
+    return None
+
+
+def find_case_span(code: str, name: str, within: Optional[Tuple[int, int]] = None) -> Tuple[int, int]:
+    """
+    查找表驱动测试中name字段为指定值的用例字面量
+    :param code: 测试代码
+    :param name: 用例名
+    :param within: 只在该偏移区间内查找，如目标测试函数的区间
+    :return: 用例从{到}（含）的偏移区间
+    :raises PatchError: 未找到或找到多个
+    """
+    tokens = [token for token in tokenize_go(code) if token[0] != 'comment']
+    spans = []
+    for index in range(2, len(tokens)):
+        kind, text, _ = tokens[index]
+        if kind != 'string' or tokens[index - 1][1] != ':' or tokens[index - 2][1] != 'name':
+            continue
+        if text[1:-1] != name and json.dumps(name, ensure_ascii=False) != text:
+            continue
+        # 向前找到包含该字段的未闭合的{，即用例字面量的起点
+        depth = 0
+        start = None
+        for back in range(index - 3, -1, -1):
+            back_text = tokens[back][1]
+            if back_text in ')]}':
+                depth += 1
+            elif back_text in '([{':
+                if depth == 0:
+                    if back_text == '{':
+                        start = back
+                    break
+                depth -= 1
+        end = _matching_close(tokens, start) if start is not None else None
+        if end is None:
+            continue
+        span = (tokens[start][2], tokens[end][2] + 1)
+        if within is None or within[0] <= span[0] and span[1] <= within[1]:
+            spans.append(span)
+    if not spans:
+        raise PatchError(f"未找到用例{name}")
+    if len(spans) > 1:
+        raise PatchError(f"用例{name}出现了{len(spans)}次")
+    return spans[0]
+
+
+def _add_import(code: str, path: str) -> str:
+    path = path.strip()
+    if not path.endswith('"'):
+        path = f'"{path}"'
+    if re.search(rf'^\s*(\w+\s+)?{re.escape(path)}\s*$', code, re.MULTILINE):
+        return code
+    block = _IMPORT_BLOCK.search(code)
+    if block:
+        return code[:block.end()] + f"\t{path}\n" + code[block.end():]
+    single = _SINGLE_IMPORT.search(code)
+    if single:
+        return code[:single.start()] + f"import (\n\t{single.group(1)}\n\t{path}\n)" + code[single.end():]
+    package = re.search(r'^package\s+\w+\s*$', code, re.MULTILINE)
+    if package:
+        return code[:package.end()] + f"\n\nimport {path}\n" + code[package.end():]
+    return f"import {path}\n\n" + code
+
+
+def apply_edits(code: str, edits: List[Dict[str, Any]], test_function: Optional[str] = None) -> str:
+    """
+    按顺序应用修改
+    :param code: 当前测试代码
+    :param edits: parse_edits返回的修改列表
+    :param test_function: 目标测试函数名，replace_case只在该函数内查找用例
+    :return: 修改后的代码
+    :raises PatchError: 任一修改无法应用
+    """
+    for edit in edits:
+        op = edit['op']
+        if op == 'replace_case':
+            if not edit.get('name') or not str(edit.get('code', '')).strip().startswith('{'):
+                raise PatchError(f"replace_case缺少name或code: {edit!r}")
+            within = function_span(code, test_function) if test_function else None
+            start, end = find_case_span(code, edit['name'], within)
+            code = code[:start] + edit['code'].strip().rstrip(',') + code[end:]
+        elif op == 'replace':
+            old = edit.get('old') or ''
+            count = code.count(old) if old else 0
+            if count != 1:
+                raise PatchError(f"replace的old在代码中出现{count}次，必须唯一: {old[:80]!r}")
+            code = code.replace(old, edit.get('new', ''), 1)
+        else:
+            if not edit.get('path'):
+                raise PatchError(f"add_import缺少path: {edit!r}")
+            code = _add_import(code, edit['path'])
+    return code
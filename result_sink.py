@@ -0,0 +1,200 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, TextIO
+
+from core.metrics import metrics
+
+# 写入结果记录的标量字段，其余字段（如代码、测试输出）不进入记录
+RECORD_FIELDS = ('function_name', 'file_path', 'test_file_path', 'status', 'message', 'error', 'degraded', 'resumed', 'reused_from',
+                 'similarity')
+# 最多保留的失败函数数，用于运行结束时打印
+MAX_KEPT_FAILURES = 200
+_UNSAFE_CHARS = re.compile(r'[^\w.-]+')
+
+
+class ResultSink:
+    """
+    批量运行的结果文件（JSONL）
+
+    每个函数处理完立即追加一行紧凑记录（状态、调试轮次、耗时、token与产物路径），写入后flush，
+    其他工具可以tail该文件跟踪进度；已有的结果文件不会被清空，新记录追加在后面。
+    代码与测试输出等大段文本写到产物目录，只在记录中保留路径，
+    内存中只保留各状态的计数与少量失败信息，运行时间再长内存也不会增长。
+    """
+
+    def __init__(self, path: Optional[str], artifact_dir: Optional[str] = None):
+        """
+        :param path: 结果文件路径，为None时只统计各状态的计数，不写文件
+        :param artifact_dir: 产物目录，默认为结果文件旁的"<文件名>_artifacts"目录
+        """
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.artifact_dir = artifact_dir or (f"{os.path.splitext(path)[0]}_artifacts" if path else None)
+        self.status_counts: Dict[str, int] = {}
+        self.failures: List[Dict[str, Any]] = []
+        self.total = 0
+        self._lock = threading.Lock()
+        self._file: Optional[TextIO] = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, result: Dict[str, Any], stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        写入一个函数的结果
+        :param result: generate_test_case等返回的结果字典
+        :param stats: RunMetrics.function_stats返回的统计
+        :return: 写入的记录
+        """
+        key = f"{result.get('file_path')}:{result.get('function_name')}"
+        record: Dict[str, Any] = {'ts': round(time.time(), 3), 'key': key}
+        record.update((field, result[field]) for field in RECORD_FIELDS if result.get(field) is not None)
+        debug_info = result.get('debug_info') or {}
+        if debug_info.get('attempts'):
+            record['attempts'] = debug_info['attempts']
+        if stats:
+            record['duration'] = round(stats.get('duration', 0.0), 3)
+            record['stages'] = {stage: round(duration, 3) for stage, duration in stats.get('stages', {}).items()}
+            for attr in ('prompt_tokens', 'completion_tokens', 'tokens_saved'):
+                if stats.get(attr):
+                    record[attr] = stats[attr]
+            if stats.get('cost'):
+                record['cost'] = round(stats['cost'], 6)
+
+        if self.artifact_dir is not None:
+            artifacts = {}
+            if result.get('test_template_code'):
+                artifacts['code'] = self._write_artifact(key, 'code.go', result['test_template_code'])
+            if debug_info.get('last_output') and result.get('status') != 'success':
+                artifacts['test_output'] = self._write_artifact(key, 'go_test.txt', debug_info['last_output'])
+            if artifacts:
+                record['artifacts'] = artifacts
+
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+            self.total += 1
+            status = record.get('status', 'unknown')
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            if status == 'failed' and len(self.failures) < MAX_KEPT_FAILURES:
+                self.failures.append({field: record.get(field) for field in ('function_name', 'file_path', 'error')})
+        return record
+
+    def _write_artifact(self, key: str, suffix: str, content: str) -> str:
+        """
+        :return: 产物文件路径，文件名由函数名与函数标识的哈希组成，不同文件中的同名函数不会冲突
+        """
+        name = _UNSAFE_CHARS.sub('_', key.rsplit(':', 1)[-1])
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]
+        path = os.path.join(self.artifact_dir, f"{name}-{digest}.{suffix}")
+        try:
+            os.makedirs(self.artifact_dir, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        except OSError as e:
+            self.logger.warning(f"写入产物{path}失败: {str(e)}")
+        return path
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+
+
+class ProgressReporter:
+    """
+    批量运行的实时进度行：已完成数、吞吐、预计剩余时间以及正在进行的LLM请求与go test数
+
+    输出到终端时原地刷新，重定向到文件时按较长间隔逐行输出。
+    """
+
+    def __init__(self, total: int, stream: Optional[TextIO] = None, interval: Optional[float] = None):
+        """
+        :param total: 目标函数总数
+        :param stream: 输出流，默认为标准错误
+        :param interval: 刷新间隔（秒），默认终端1秒、非终端30秒
+        """
+        self.total = total
+        self.stream = stream or sys.stderr
+        self.interactive = self.stream.isatty()
+        self.interval = interval or (1.0 if self.interactive else 30.0)
+        self.done = 0
+        self.resumed = 0
+        self.status_counts: Dict[str, int] = {}
+        self._started_at = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._started_at = time.time()
+        self._thread = threading.Thread(target=self._loop, name="progress", daemon=True)
+        self._thread.start()
+
+    def advance(self, result: Dict[str, Any]) -> None:
+        """
+        记录一个函数处理完成
+        :param result: 结果字典
+        """
+        with self._lock:
+            self.done += 1
+            if result.get('resumed'):
+                self.resumed += 1
+            status = result.get('status', 'unknown')
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def line(self) -> str:
+        """
+        :return: 当前进度描述
+        """
+        with self._lock:
+            done, resumed = self.done, self.resumed
+            succeeded = self.status_counts.get('success', 0)
+            failed = done - succeeded
+        elapsed = max(time.time() - self._started_at, 1e-6)
+        # 从任务日志恢复的函数瞬间完成，不计入吞吐
+        processed = done - resumed
+        rate = processed / elapsed
+        remaining = max(self.total - done, 0)
+        eta = _format_seconds(remaining / rate) if rate > 0 else '--:--'
+        return (f"[{done}/{self.total}] 成功{succeeded} 其他{failed} | {rate * 60:.1f}个/分钟 | 预计剩余{eta} | "
+                f"LLM进行中{metrics.in_flight('llm')} go test进行中{metrics.in_flight('go_test')}")
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._emit()
+
+    def _emit(self, final: bool = False) -> None:
+        text = self.line()
+        if self.interactive:
+            self.stream.write(f"\r\033[K{text}" + ('\n' if final else ''))
+        else:
+            self.stream.write(text + '\n')
+        self.stream.flush()
+
+    def stop(self) -> None:
+        """
+        停止刷新并输出最终进度
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._emit(final=True)
+
+
+def _format_seconds(seconds: float) -> str:
+    """
+    :return: 形如1:02:03或02:03的时长
+    """
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
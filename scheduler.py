@@ -0,0 +1,220 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from llm_utils.rate_limiter import estimate_tokens
+
+# 成本模型参数（秒），用于相对排序，不追求绝对准确
+LLM_BASE_SECONDS = 8.0  # 每次LLM调用的固定开销（排队、首token、推理）
+SECONDS_PER_PROMPT_TOKEN = 0.002  # 每个输入token带来的额外耗时
+LLM_CALLS_PER_FUNCTION = 2  # 补充用例与合并各一次
+DEFAULT_TEST_SECONDS = 10.0  # 没有历史记录时单次go test的耗时
+MAX_EXPECTED_TEST_RUNS = 5  # 与调试循环的最大次数一致
+
+# 返回失败的分支，分支越多，LLM越容易构造错参数，调试轮次越多
+_FAIL_BRANCH_PATTERN = re.compile(r'Status\s*=\s*"fail"')
+
+
+class TargetCostEstimator:
+    """
+    根据函数分析结果与历史go test耗时估算单个目标的处理成本
+    """
+
+    def __init__(self, history_path: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.history_path = history_path
+        self._lock = threading.Lock()
+        # 包目录 -> 单次go test耗时的指数移动平均
+        self.test_seconds: Dict[str, float] = {}
+        if history_path and os.path.exists(history_path):
+            try:
+                with open(history_path, 'r', encoding='utf-8') as f:
+                    self.test_seconds = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"读取go test耗时历史失败: {str(e)}")
+
+    def estimate(self, func_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        估算处理一个函数的成本
+        :param func_info: GoCodeAnalyzer输出的函数信息
+        :return: 包含各项特征与estimated_seconds的字典
+        """
+        full_code = func_info.get('full_code', '')
+        prompt_tokens = estimate_tokens(full_code)
+        fail_branches = len(_FAIL_BRANCH_PATTERN.findall(func_info.get('body', '')))
+        package_dir = os.path.dirname(func_info['file_path'])
+        test_seconds = self.test_seconds.get(package_dir, DEFAULT_TEST_SECONDS)
+        expected_test_runs = min(MAX_EXPECTED_TEST_RUNS, 1 + fail_branches * 0.2 + prompt_tokens / 2000)
+        llm_seconds = LLM_CALLS_PER_FUNCTION * (LLM_BASE_SECONDS + prompt_tokens * SECONDS_PER_PROMPT_TOKEN)
+        # 首次测试失败后每轮调试还要再调用一次LLM
+        debug_seconds = (expected_test_runs - 1) * (LLM_BASE_SECONDS + prompt_tokens * SECONDS_PER_PROMPT_TOKEN)
+        return {
+            'body_lines': func_info.get('body', '').count('\n') + 1,
+            'prompt_tokens': prompt_tokens,
+            'fail_branches': fail_branches,
+            'test_seconds': test_seconds,
+            'estimated_seconds': llm_seconds + debug_seconds + expected_test_runs * test_seconds,
+        }
+
+    def record_test_time(self, package_dir: str, seconds: float, alpha: float = 0.3) -> None:
+        """
+        记录一次go test耗时
+        :param package_dir: 包目录
+        :param seconds: 耗时
+        :param alpha: 指数移动平均的权重
+        """
+        with self._lock:
+            previous = self.test_seconds.get(package_dir)
+            self.test_seconds[package_dir] = seconds if previous is None else previous * (1 - alpha) + seconds * alpha
+
+    def learn_from_span(self, span: Dict[str, Any]) -> None:
+        """
+        从运行统计的go_test阶段中学习包的测试耗时，通过metrics.add_listener在每次go test结束时调用
+        :param span: 阶段记录
+        """
+        if span.get('stage') == 'go_test' and span.get('test_dir') and not span.get('error'):
+            self.record_test_time(span['test_dir'], span['duration'])
+
+    def save(self) -> None:
+        if not self.history_path:
+            return
+        with self._lock:
+            data = dict(self.test_seconds)
+        os.makedirs(os.path.dirname(os.path.abspath(self.history_path)), exist_ok=True)
+        tmp_path = f"{self.history_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.history_path)
+
+
+class GenerationScheduler:
+    """
+    最短作业优先调度器
+
+    按(优先级降序, 估算成本升序)出队；同一个包同时只处理一个函数，
+    避免并发写测试文件和并发编译同一个包，被占用的包中的目标会让位给其他包中的下一个最短作业。
+    """
+
+    def __init__(self, estimator: TargetCostEstimator, priorities: Optional[Dict[str, int]] = None):
+        """
+        :param estimator: 成本估算器
+        :param priorities: 优先级覆盖，键为函数名或"文件路径:函数名"，值越大越先执行，默认0
+        """
+        self.logger = logging.getLogger(__name__)
+        self.estimator = estimator
+        self.priorities = dict(priorities or {})
+        self._lock = threading.Condition()
+        self._heap: List[tuple] = []
+        self._counter = itertools.count()
+        self._busy_packages = set()
+
+    @staticmethod
+    def target_key(func_info: Dict[str, Any]) -> str:
+        return f"{func_info['file_path']}:{func_info['name']}"
+
+    def _priority(self, func_info: Dict[str, Any]) -> int:
+        return self.priorities.get(self.target_key(func_info), self.priorities.get(func_info['name'], 0))
+
+    def _push(self, func_info: Dict[str, Any]) -> None:
+        estimate = func_info.setdefault('cost', self.estimator.estimate(func_info))
+        entry = (-self._priority(func_info), estimate['estimated_seconds'], next(self._counter), func_info)
+        heapq.heappush(self._heap, entry)
+
+    def order(self, targets: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        返回调度顺序（不考虑包互斥），用于预览
+        :param targets: 函数信息列表
+        :return: 排序后的函数信息列表，每项附带cost字段
+        """
+        entries = []
+        for func_info in targets:
+            estimate = func_info.setdefault('cost', self.estimator.estimate(func_info))
+            entries.append((-self._priority(func_info), estimate['estimated_seconds'], func_info['file_path'], func_info['name'], func_info))
+        return [entry[-1] for entry in sorted(entries, key=lambda e: e[:4])]
+
+    def boost(self, key: str, priority: int) -> None:
+        """
+        运行中调整优先级，对尚未开始的目标生效
+        :param key: 函数名或"文件路径:函数名"
+        :param priority: 新优先级
+        """
+        with self._lock:
+            self.priorities[key] = priority
+            pending = [entry[-1] for entry in self._heap]
+            self._heap = []
+            for func_info in pending:
+                self._push(func_info)
+            self._lock.notify_all()
+
+    def _next(self) -> Optional[Dict[str, Any]]:
+        """
+        取出包未被占用的最短作业，全部被占用时等待
+        """
+        with self._lock:
+            while self._heap:
+                skipped = []
+                picked = None
+                while self._heap:
+                    entry = heapq.heappop(self._heap)
+                    package_dir = os.path.dirname(entry[-1]['file_path'])
+                    if package_dir in self._busy_packages:
+                        skipped.append(entry)
+                        continue
+                    picked = entry[-1]
+                    self._busy_packages.add(package_dir)
+                    break
+                for entry in skipped:
+                    heapq.heappush(self._heap, entry)
+                if picked is not None:
+                    return picked
+                self._lock.wait()
+            return None
+
+    def _release(self, func_info: Dict[str, Any]) -> None:
+        with self._lock:
+            self._busy_packages.discard(os.path.dirname(func_info['file_path']))
+            self._lock.notify_all()
+
+    def run(self, targets: Iterable[Dict[str, Any]], worker: Callable[[Dict[str, Any]], Dict[str, Any]],
+            concurrency: int = 1) -> Iterator[Dict[str, Any]]:
+        """
+        按调度顺序处理所有目标
+        :param targets: 函数信息列表
+        :param worker: 处理单个目标的函数，返回结果字典
+        :param concurrency: 并发数
+        :return: 按完成顺序产出的结果
+        """
+        with self._lock:
+            for func_info in targets:
+                self._push(func_info)
+        total = len(self._heap)
+        self.logger.info(f"调度{total}个目标，并发数{concurrency}")
+
+        def run_one() -> Optional[Dict[str, Any]]:
+            func_info = self._next()
+            if func_info is None:
+                return None
+            try:
+                return worker(func_info)
+            finally:
+                self._release(func_info)
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="gen") as executor:
+            pending = {executor.submit(run_one) for _ in range(total)}
+            try:
+                for future in as_completed(pending):
+                    # 产出后立即释放，长时间运行时不在内存中保留已完成的结果
+                    pending.discard(future)
+                    result = future.result()
+                    if result is not None:
+                        yield result
+            except BaseException:
+                # 中断（如Ctrl-C）或出错时不再启动尚未开始的目标
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
@@ -0,0 +1,264 @@
+import difflib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from code_analyzer import tokenize_go
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，多进程同时追加时依赖单次写入的原子性
+    fcntl = None
+
+# 预声明标识符与约定俗成的变量名不参与抽象，保留代码结构特征
+KEPT_IDENTIFIERS = frozenset((
+    'nil', 'true', 'false', 'iota', '_', 'err', 'ctx',
+    'bool', 'byte', 'rune', 'string', 'error', 'any', 'int', 'int8', 'int16', 'int32', 'int64',
+    'uint', 'uint8', 'uint16', 'uint32', 'uint64', 'uintptr', 'float32', 'float64', 'complex64', 'complex128',
+    'append', 'cap', 'close', 'copy', 'delete', 'len', 'make', 'new', 'panic', 'print', 'println', 'recover',
+))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# 替换标识符片段时忽略过短的差异，避免把Id、V1之类的公共片段替换掉
+MIN_CORE_LENGTH = 3
+_WORD_PATTERN = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+|_')
+
+
+def function_shape(code: str) -> Tuple[List[str], List[str]]:
+    """
+    将函数代码规范化为结构序列
+    :param code: 函数代码
+    :return: (结构序列, 标识符序列)；结构序列中的标识符统一为ID、字面量统一为STR/NUM/CHR，注释被丢弃，
+             标识符序列按出现顺序记录被抽象掉的原始标识符
+    """
+    shape = []
+    identifiers = []
+    for kind, text, _ in tokenize_go(code):
+        if kind == 'comment':
+            continue
+        if kind == 'ident' and text not in KEPT_IDENTIFIERS:
+            shape.append('ID')
+            identifiers.append(text)
+        elif kind == 'string':
+            shape.append('STR')
+        elif kind == 'number':
+            shape.append('NUM')
+        elif kind == 'rune':
+            shape.append('CHR')
+        else:
+            shape.append(text)
+    return shape, identifiers
+
+
+class MinHasher:
+    """
+    基于结构序列k-gram的MinHash签名
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        rng = random.Random(seed)
+        self.shingle_size = shingle_size
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, shape: List[str]) -> List[int]:
+        k = self.shingle_size
+        shingles = {zlib.crc32(' '.join(shape[i:i + k]).encode('utf-8')) for i in range(max(1, len(shape) - k + 1))}
+        return [min((a * h + b) % _MERSENNE_PRIME for h in shingles) for a, b in self._perms]
+
+    @staticmethod
+    def similarity(sig1: List[int], sig2: List[int]) -> float:
+        """
+        :return: 签名估算的Jaccard相似度
+        """
+        if not sig1 or len(sig1) != len(sig2):
+            return 0.0
+        return sum(1 for a, b in zip(sig1, sig2) if a == b) / len(sig1)
+
+
+class TestReuseStore:
+    """
+    已验证测试的近似重复索引
+
+    每个通过go test验证的函数按结构序列计算MinHash签名，并按LSH分桶；新函数只与同桶的候选比较。
+    命中后按两个函数结构序列的对齐关系建立标识符映射，把已知可用的测试改写成新函数的测试。
+    """
+
+    def __init__(self, root: str, threshold: float = 0.85, num_perm: int = 64, bands: int = 16):
+        """
+        :param root: 存储目录
+        :param threshold: 判定为近似重复的最低相似度
+        :param num_perm: MinHash签名长度
+        :param bands: LSH分段数，num_perm需能被其整除
+        """
+        self.logger = logging.getLogger(__name__)
+        self.path = os.path.join(root, 'tests.jsonl')
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        os.makedirs(root, exist_ok=True)
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self._index(json.loads(line))
+                    except ValueError:
+                        continue
+            self.logger.info(f"已加载{len(self._entries)}个已验证测试")
+
+    def _band_keys(self, signature: List[int]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [(band, tuple(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+    def _index(self, entry: Dict[str, Any]) -> None:
+        position = len(self._entries)
+        self._entries.append(entry)
+        for key in self._band_keys(entry['signature']):
+            self._buckets.setdefault(key, []).append(position)
+
+    def find(self, func_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        查找与函数最相似的已验证测试
+        :param func_info: GoCodeAnalyzer输出的函数信息
+        :return: 包含entry与similarity的字典，没有达到阈值的候选时返回None
+        """
+        key = f"{func_info['file_path']}:{func_info['name']}"
+        shape, _ = function_shape(func_info['full_code'])
+        signature = self.hasher.signature(shape)
+        best = None
+        with self._lock:
+            candidates = {position for band_key in self._band_keys(signature) for position in self._buckets.get(band_key, ())}
+            for position in candidates:
+                entry = self._entries[position]
+                if entry['key'] == key:
+                    continue
+                similarity = self.hasher.similarity(signature, entry['signature'])
+                if similarity >= self.threshold and (best is None or similarity > best['similarity']):
+                    best = {'entry': entry, 'similarity': similarity}
+        return best
+
+    def add(self, func_info: Dict[str, Any], test_code: str) -> None:
+        """
+        记录一个已通过验证的测试
+        :param func_info: 被测函数信息
+        :param test_code: 测试代码
+        """
+        shape, identifiers = function_shape(func_info['full_code'])
+        entry = {
+            'key': f"{func_info['file_path']}:{func_info['name']}",
+            'function_name': func_info['name'],
+            'shape': shape,
+            'identifiers': identifiers,
+            'signature': self.hasher.signature(shape),
+            'test_code': test_code,
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                f.write(line)
+            self._index(entry)
+
+    def identifier_mapping(self, entry: Dict[str, Any], func_info: Dict[str, Any]) -> Dict[str, str]:
+        """
+        按结构序列对齐建立旧标识符到新标识符的映射
+        :param entry: 已验证测试记录
+        :param func_info: 新函数信息
+        :return: 旧标识符到新标识符的映射，只包含发生变化的标识符
+        """
+        new_shape, new_identifiers = function_shape(func_info['full_code'])
+        old_shape, old_identifiers = entry['shape'], entry['identifiers']
+        old_positions = _identifier_positions(old_shape)
+        new_positions = _identifier_positions(new_shape)
+        votes: Dict[str, Counter] = {}
+        matcher = difflib.SequenceMatcher(None, old_shape, new_shape, autojunk=False)
+        for block in matcher.get_matching_blocks():
+            for offset in range(block.size):
+                old_index = old_positions.get(block.a + offset)
+                if old_index is None:
+                    continue
+                old_name = old_identifiers[old_index]
+                new_name = new_identifiers[new_positions[block.b + offset]]
+                votes.setdefault(old_name, Counter())[new_name] += 1
+        mapping = {}
+        for old_name, counter in votes.items():
+            new_name = counter.most_common(1)[0][0]
+            if new_name != old_name:
+                mapping[old_name] = new_name
+        return mapping
+
+    def adapt(self, entry: Dict[str, Any], func_info: Dict[str, Any]) -> str:
+        """
+        将已验证的测试改写为新函数的测试
+        :param entry: 已验证测试记录
+        :param func_info: 新函数信息
+        :return: 改写后的测试代码
+        """
+        mapping = self.identifier_mapping(entry, func_info)
+        mapping.setdefault(entry['function_name'], func_info['name'])
+        mapping.setdefault(f"Test{entry['function_name']}", f"Test{func_info['name']}")
+        # 标识符中变化的片段，如GetUser->GetOrder得到User->Order，用于改写TestGetUser、UserReq等组合名
+        cores = {}
+        for old_name, new_name in mapping.items():
+            old_core, new_core = _changed_core(old_name, new_name)
+            if len(old_core) >= MIN_CORE_LENGTH and new_core:
+                cores.setdefault(old_core, new_core)
+                cores.setdefault(old_core[0].lower() + old_core[1:], new_core[0].lower() + new_core[1:])
+        core_pattern = re.compile('|'.join(re.escape(core) for core in sorted(cores, key=len, reverse=True))) if cores else None
+
+        pieces = []
+        last = 0
+        code = entry['test_code']
+        # 字符串与注释中只改写被测函数名（如"GetUser() error"、@unitFunc TestGetUser），不改动其他数据
+        name_pattern = re.compile(rf"\b(Test)?{re.escape(entry['function_name'])}\b")
+        for kind, text, start in tokenize_go(code):
+            if kind in ('string', 'comment'):
+                replaced = name_pattern.sub(lambda m: (m.group(1) or '') + func_info['name'], text)
+            elif kind == 'ident':
+                replaced = mapping.get(text)
+                if replaced is None and core_pattern:
+                    replaced = core_pattern.sub(lambda m: cores[m.group()], text)
+            else:
+                continue
+            if replaced and replaced != text:
+                pieces.append(code[last:start])
+                pieces.append(replaced)
+                last = start + len(text)
+        pieces.append(code[last:])
+        return ''.join(pieces)
+
+
+def _identifier_positions(shape: List[str]) -> Dict[int, int]:
+    """
+    :return: 结构序列位置到标识符序号的映射
+    """
+    positions = {}
+    for position, token in enumerate(shape):
+        if token == 'ID':
+            positions[position] = len(positions)
+    return positions
+
+
+def _changed_core(old: str, new: str) -> Tuple[str, str]:
+    """
+    按驼峰/下划线分词后去掉两个标识符的公共前后缀，得到变化的片段
+    """
+    old_words = _WORD_PATTERN.findall(old)
+    new_words = _WORD_PATTERN.findall(new)
+    prefix = 0
+    while prefix < min(len(old_words), len(new_words)) and old_words[prefix] == new_words[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < min(len(old_words), len(new_words)) - prefix
+           and old_words[-1 - suffix] == new_words[-1 - suffix]):
+        suffix += 1
+    return ''.join(old_words[prefix:len(old_words) - suffix]), ''.join(new_words[prefix:len(new_words) - suffix])
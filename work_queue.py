@@ -0,0 +1,332 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from core.metrics import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    package_dir   TEXT PRIMARY KEY,
+    status        TEXT NOT NULL DEFAULT 'pending',  -- pending / leased / done
+    owner         TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    cost          REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS targets (
+    key           TEXT PRIMARY KEY,
+    package_dir   TEXT NOT NULL,
+    file_path     TEXT NOT NULL,
+    function_name TEXT NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'pending',  -- pending / done
+    worker        TEXT,
+    result        TEXT,
+    stats         TEXT,
+    finished_at   REAL
+);
+CREATE INDEX IF NOT EXISTS targets_package ON targets (package_dir, status);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    基于SQLite的共享任务队列，可放在多台机器都能访问的共享文件系统上
+
+    以包为单位租约：一个包同一时间只属于一个worker，保证同一个包的测试文件写入与go test集中在一处。
+    worker需要定期续约，超过租约时间未续约的包（进程崩溃、机器宕机）会被重新放回队列，
+    已完成的函数不会重复处理。每个函数的结果与统计写回队列，供合并成一份报告。
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0):
+        """
+        :param path: SQLite数据库文件路径
+        :param lease_seconds: 租约时长（秒）
+        """
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.lease_seconds = lease_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # 每次操作使用独立连接，线程间不共享；共享文件系统上不使用WAL（依赖共享内存）
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def enqueue(self, functions: List[Dict[str, Any]], estimate: Optional[Callable[[Dict[str, Any]], float]] = None) -> int:
+        """
+        将分析出的函数放入队列，已存在的函数保持原状态，多个worker重复入队是安全的
+        :param functions: GoCodeAnalyzer输出的函数信息列表
+        :param estimate: 估算单个函数成本的函数，包的成本为其函数成本之和，成本低的包先被领取
+        :return: 新加入的函数数
+        """
+        costs: Dict[str, float] = {}
+        rows = []
+        for func in functions:
+            package_dir = os.path.dirname(func['file_path'])
+            costs[package_dir] = costs.get(package_dir, 0.0) + (estimate(func) if estimate else 1.0)
+            rows.append((f"{func['file_path']}:{func['name']}", package_dir, func['file_path'], func['name']))
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO targets (key, package_dir, file_path, function_name) VALUES (?, ?, ?, ?)", rows)
+            added = conn.total_changes - before
+            conn.executemany("INSERT OR IGNORE INTO packages (package_dir, cost) VALUES (?, ?)", costs.items())
+            # 已完成的包如果加入了新函数，需要重新处理
+            conn.execute(
+                "UPDATE packages SET status = 'pending' WHERE status = 'done' AND package_dir IN "
+                "(SELECT DISTINCT package_dir FROM targets WHERE status = 'pending')")
+        return added
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        领取一个包，先回收过期租约
+        :param worker_id: worker标识
+        :return: 包含package_dir与待处理targets的字典，没有可领取的包时返回None
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            expired = conn.execute(
+                "UPDATE packages SET status = 'pending', owner = NULL WHERE status = 'leased' AND lease_expires < ?",
+                (now,)).rowcount
+            if expired:
+                self.logger.warning(f"回收{expired}个过期租约")
+            row = conn.execute(
+                "SELECT package_dir FROM packages WHERE status = 'pending' ORDER BY cost, package_dir LIMIT 1").fetchone()
+            if row is None:
+                return None
+            package_dir = row[0]
+            conn.execute(
+                "UPDATE packages SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE package_dir = ?", (worker_id, now + self.lease_seconds, package_dir))
+            targets = conn.execute(
+                "SELECT key, file_path, function_name FROM targets WHERE package_dir = ? AND status = 'pending' "
+                "ORDER BY key", (package_dir,)).fetchall()
+        return {
+            'package_dir': package_dir,
+            'targets': [{'key': key, 'file_path': file_path, 'name': name} for key, file_path, name in targets],
+        }
+
+    def heartbeat(self, worker_id: str, package_dir: str) -> bool:
+        """
+        续约
+        :return: 是否仍持有该包的租约
+        """
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE packages SET lease_expires = ? WHERE package_dir = ? AND owner = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, package_dir, worker_id)).rowcount == 1
+
+    def complete_target(self, worker_id: str, package_dir: str, key: str, result: Dict[str, Any],
+                        stats: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        写回单个函数的结果，租约已丢失时不写入
+        :return: 是否写入成功
+        """
+        with self._transaction() as conn:
+            owned = conn.execute(
+                "SELECT 1 FROM packages WHERE package_dir = ? AND owner = ? AND status = 'leased'",
+                (package_dir, worker_id)).fetchone()
+            if not owned:
+                return False
+            conn.execute(
+                "UPDATE targets SET status = 'done', worker = ?, result = ?, stats = ?, finished_at = ? WHERE key = ?",
+                (worker_id, json.dumps(result, ensure_ascii=False), json.dumps(stats or {}), time.time(), key))
+        return True
+
+    def complete_package(self, worker_id: str, package_dir: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE packages SET status = 'done', owner = NULL WHERE package_dir = ? AND owner = ?",
+                (package_dir, worker_id))
+
+    def release(self, worker_id: str, package_dir: str) -> None:
+        """
+        放弃租约，包中未完成的函数重新放回队列
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE packages SET status = 'pending', owner = NULL WHERE package_dir = ? AND owner = ?",
+                (package_dir, worker_id))
+
+    def progress(self) -> Dict[str, int]:
+        """
+        :return: 各状态的包数与函数数
+        """
+        with self._connect() as conn:
+            packages = dict(conn.execute("SELECT status, COUNT(*) FROM packages GROUP BY status").fetchall())
+            targets = dict(conn.execute("SELECT status, COUNT(*) FROM targets GROUP BY status").fetchall())
+        return {
+            'packages_pending': packages.get('pending', 0),
+            'packages_leased': packages.get('leased', 0),
+            'packages_done': packages.get('done', 0),
+            'targets_pending': targets.get('pending', 0),
+            'targets_done': targets.get('done', 0),
+        }
+
+    def results(self) -> List[Dict[str, Any]]:
+        """
+        :return: 所有worker写回的函数结果
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT result FROM targets WHERE status = 'done' ORDER BY key").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def report(self) -> Dict[str, Any]:
+        """
+        合并所有worker的结果与统计
+        :return: 包含进度、按状态与按worker汇总以及各函数明细的字典
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT key, worker, result, stats, finished_at FROM targets WHERE status = 'done' ORDER BY key").fetchall()
+        statuses: Dict[str, int] = {}
+        workers: Dict[str, Dict[str, Any]] = {}
+        functions = {}
+        for key, worker, result, stats, finished_at in rows:
+            result = json.loads(result)
+            stats = json.loads(stats or '{}')
+            statuses[result['status']] = statuses.get(result['status'], 0) + 1
+            worker_stats = workers.setdefault(worker, {'functions': 0, 'duration': 0.0, 'cost': 0.0})
+            worker_stats['functions'] += 1
+            worker_stats['duration'] += stats.get('duration', 0.0)
+            worker_stats['cost'] += stats.get('cost', 0.0)
+            functions[key] = {'status': result['status'], 'worker': worker, 'finished_at': finished_at, **stats}
+        return {'progress': self.progress(), 'statuses': statuses, 'workers': workers, 'functions': functions}
+
+    def write_report(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+
+class QueueWorker:
+    """
+    从共享队列领取包并逐个处理其中的函数，后台线程定期为持有的包续约
+    """
+
+    def __init__(self, queue: WorkQueue, handler: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 worker_id: Optional[str] = None, poll_seconds: float = 5.0,
+                 on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any], Dict[str, Any]], None]] = None):
+        """
+        :param queue: 共享队列
+        :param handler: 处理单个函数的函数，参数包含file_path与name，返回结果字典
+        :param worker_id: worker标识，默认"主机名:进程号"
+        :param poll_seconds: 其他worker仍持有租约时的轮询间隔
+        :param on_result: 结果写回队列后的回调，参数为(目标, 结果, 统计)，如写入结果文件
+        """
+        self.logger = logging.getLogger(__name__)
+        self.queue = queue
+        self.handler = handler
+        self.worker_id = worker_id or default_worker_id()
+        self.poll_seconds = poll_seconds
+        self.on_result = on_result
+        self._held: Dict[str, bool] = {}  # 持有的包 -> 租约是否仍有效
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _heartbeat_loop(self) -> None:
+        interval = max(1.0, self.queue.lease_seconds / 3)
+        while not self._stop.wait(interval):
+            with self._lock:
+                held = list(self._held)
+            for package_dir in held:
+                try:
+                    alive = self.queue.heartbeat(self.worker_id, package_dir)
+                except sqlite3.Error as e:
+                    self.logger.warning(f"续约失败: {package_dir}: {str(e)}")
+                    continue
+                if not alive:
+                    self.logger.warning(f"包{package_dir}的租约已丢失，放弃剩余函数")
+                    with self._lock:
+                        if package_dir in self._held:
+                            self._held[package_dir] = False
+
+    def _process_package(self, lease: Dict[str, Any]) -> int:
+        package_dir = lease['package_dir']
+        with self._lock:
+            self._held[package_dir] = True
+        done = 0
+        try:
+            for target in lease['targets']:
+                with self._lock:
+                    if not self._held[package_dir]:
+                        return done
+                result = self.handler(target)
+                stats = metrics.function_stats(target['key'], forget=True)
+                if not self.queue.complete_target(self.worker_id, package_dir, target['key'], result, stats):
+                    self.logger.warning(f"包{package_dir}的租约已丢失，结果未写回: {target['key']}")
+                    return done
+                if self.on_result:
+                    self.on_result(target, result, stats)
+                done += 1
+            self.queue.complete_package(self.worker_id, package_dir)
+            return done
+        except BaseException:
+            self.queue.release(self.worker_id, package_dir)
+            raise
+        finally:
+            with self._lock:
+                self._held.pop(package_dir, None)
+
+    def _work_loop(self) -> int:
+        done = 0
+        while not self._stop.is_set():
+            lease = self.queue.claim(self.worker_id)
+            if lease is None:
+                # 其他worker仍在处理时继续等待，以便接手它们过期的租约
+                if not self.queue.progress()['packages_leased']:
+                    break
+                self._stop.wait(self.poll_seconds)
+                continue
+            self.logger.info(f"领取包{lease['package_dir']}，待处理函数{len(lease['targets'])}个")
+            done += self._process_package(lease)
+        return done
+
+    def run(self, concurrency: int = 1) -> int:
+        """
+        处理队列直到没有剩余工作
+        :param concurrency: 同时处理的包数
+        :return: 本worker完成的函数数
+        """
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="lease-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            if concurrency <= 1:
+                return self._work_loop()
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="queue") as executor:
+                futures = [executor.submit(self._work_loop) for _ in range(concurrency)]
+                try:
+                    return sum(future.result() for future in futures)
+                except BaseException:
+                    self._stop.set()
+                    raise
+        finally:
+            self._stop.set()
+            heartbeat.join()